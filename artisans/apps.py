@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ArtisansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'artisans'
+
+    def ready(self):
+        # Tient à jour les clés de recherche des artisans
+        from . import search  # noqa: F401
+        from gestiart import images
+        from .models import Artisan
+        images.watch(Artisan, 'photo')
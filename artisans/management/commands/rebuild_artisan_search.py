@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from artisans.search import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les clés de recherche des artisans (noms et numéros de boutique), "
+        "par exemple après une modification directe en base."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} clés de recherche d'artisans indexées."))
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.22 on 2026-10-17 23:33
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_name(value):
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(WORD_RE.findall(value.casefold()))[:255]
+
+
+def populate_search_keys(apps, schema_editor):
+    Artisan = apps.get_model('artisans', 'Artisan')
+    ArtisanSearchKey = apps.get_model('artisans', 'ArtisanSearchKey')
+    keys = []
+    for pk, prenom, nom, numero in Artisan.objects.values_list('pk', 'prenom', 'nom', 'numero_boutique'):
+        prenom, nom = normalize_name(prenom), normalize_name(nom)
+        names = {prenom, nom, f'{prenom} {nom}'.strip(), f'{nom} {prenom}'.strip(), normalize_name(numero)}
+        keys.extend(ArtisanSearchKey(artisan_id=pk, key=key) for key in names if key)
+    ArtisanSearchKey.objects.bulk_create(keys, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artisans', '0003_artisan_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtisanSearchKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='Clé')),
+                ('artisan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_keys', to='artisans.artisan')),
+            ],
+            options={
+                'verbose_name': "Clé de recherche d'artisan",
+                'verbose_name_plural': "Clés de recherche d'artisans",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='artisansearchkey',
+            constraint=models.UniqueConstraint(fields=('key', 'artisan'), name='artisans_search_key_uniq'),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+    ]
@@ -111,4 +111,28 @@ class Artisan(models.Model):
             total=Sum('lignes_vente__quantity')
         )['total'] or 0
         
-        return total
\ No newline at end of file
+        return total
+
+class ArtisanSearchKey(models.Model):
+    """
+    Clé de recherche d'un artisan (prénom, nom, « prénom nom », « nom prénom »
+    ou numéro de boutique), en minuscules, sans accents ni ponctuation.
+    Tenue à jour par artisans.search.
+    """
+    artisan = models.ForeignKey(
+        Artisan,
+        on_delete=models.CASCADE,
+        related_name='search_keys'
+    )
+    key = models.CharField(_('Clé'), max_length=255)
+
+    class Meta:
+        verbose_name = _('Clé de recherche d\'artisan')
+        verbose_name_plural = _('Clés de recherche d\'artisans')
+        constraints = [
+            # Sert aussi d'index pour les recherches exactes et par préfixe
+            models.UniqueConstraint(fields=['key', 'artisan'], name='artisans_search_key_uniq'),
+        ]
+
+    def __str__(self):
+        return self.key
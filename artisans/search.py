@@ -0,0 +1,161 @@
+# artisans/search.py
+"""
+Résolution d'un artisan à partir d'un nom saisi (artisan_name des ventes).
+
+Chaque artisan a des clés normalisées (ArtisanSearchKey) : prénom, nom,
+« prénom nom », « nom prénom » et numéro de boutique, en minuscules, sans
+accents ni ponctuation. Un nom est d'abord cherché tel quel dans l'index des
+clés, puis comme préfixe (intervalle sur le même index) : « Dupont Jean »,
+« DUPONT », « jea » ou « b-001 » retrouvent le même artisan.
+
+Les correspondances nom -> artisan sont gardées dans le processus, avec la
+version de l'index lue dans le cache Django : l'enregistrement d'un artisan
+change la version (après le commit), et tous les processus oublient leurs
+correspondances.
+"""
+import re
+import threading
+import unicodedata
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Artisan, ArtisanSearchKey
+
+KEY_MAX_LENGTH = ArtisanSearchKey._meta.get_field('key').max_length
+
+VERSION_KEY = 'artisans:search:version'
+
+# Nombre maximal de noms gardés en mémoire par processus
+MAX_CACHED_NAMES = 1024
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_name(value):
+    """Minuscules, sans accents, mots séparés par une seule espace."""
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(WORD_RE.findall(value.casefold()))[:KEY_MAX_LENGTH]
+
+
+def artisan_keys(prenom, nom, numero_boutique):
+    prenom, nom = normalize_name(prenom), normalize_name(nom)
+    keys = {
+        prenom, nom, f'{prenom} {nom}'.strip(), f'{nom} {prenom}'.strip(),
+        normalize_name(numero_boutique)
+    }
+    return sorted(key for key in keys if key)
+
+
+def index_artisans(artisans):
+    """Remplace les clés des artisans donnés ; retourne le nombre de clés écrites."""
+    artisans = list(artisans)
+    keys = [
+        ArtisanSearchKey(artisan_id=artisan.pk, key=key)
+        for artisan in artisans
+        for key in artisan_keys(artisan.prenom, artisan.nom, artisan.numero_boutique)
+    ]
+    with transaction.atomic():
+        ArtisanSearchKey.objects.filter(artisan__in=[artisan.pk for artisan in artisans]).delete()
+        ArtisanSearchKey.objects.bulk_create(keys, batch_size=500)
+    return len(keys)
+
+
+def rebuild():
+    """Recalcule les clés de tous les artisans ; retourne leur nombre."""
+    with transaction.atomic():
+        ArtisanSearchKey.objects.all().delete()
+        count = index_artisans(Artisan.objects.only('prenom', 'nom', 'numero_boutique'))
+    bump_version()
+    return count
+
+
+def lookup_artisan_ids(key):
+    """Artisans dont une clé vaut `key`, sinon commence par `key` (deux au plus)."""
+    ids = list(ArtisanSearchKey.objects.filter(key=key).values_list('artisan_id', flat=True)[:2])
+    if not ids:
+        # Préfixe en intervalle plutôt qu'en LIKE : l'index sert sur tous les moteurs
+        ids = list(
+            ArtisanSearchKey.objects.filter(key__gte=key, key__lt=key + '\U0010ffff')
+            .values_list('artisan_id', flat=True).distinct()[:2]
+        )
+    return ids
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+class _NameCache:
+    """Correspondances nom normalisé -> identifiants d'artisans, par version de l'index."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.ids = {}
+
+    def get(self, key):
+        version = current_version()
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.ids = {}
+            ids = self.ids.get(key)
+        if ids is None:
+            ids = lookup_artisan_ids(key)
+            with self.lock:
+                if version == self.version:
+                    if len(self.ids) >= MAX_CACHED_NAMES:
+                        self.ids.clear()
+                    self.ids[key] = ids
+        return ids
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.ids = {}
+
+
+name_cache = _NameCache()
+
+
+def resolve_artisan(value):
+    """
+    Artisan désigné par le nom `value` ; lève Artisan.DoesNotExist si aucun
+    ne correspond et Artisan.MultipleObjectsReturned si plusieurs.
+    """
+    key = normalize_name(value)
+    ids = name_cache.get(key) if key else []
+    if not ids:
+        raise Artisan.DoesNotExist(f"Aucun artisan ne correspond à '{value}'.")
+    if len(ids) > 1:
+        raise Artisan.MultipleObjectsReturned(f"Plusieurs artisans correspondent à '{value}'.")
+    return Artisan.objects.get(pk=ids[0])
+
+
+@receiver(post_save, sender=Artisan, dispatch_uid='artisans_search_artisan_save')
+def index_artisan(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_artisans([instance])
+    name_cache.clear()
+    bump_version()
+
+
+@receiver(post_delete, sender=Artisan, dispatch_uid='artisans_search_artisan_delete')
+def unindex_artisan(sender, instance, **kwargs):
+    # Les clés sont supprimées en cascade
+    name_cache.clear()
+    bump_version()
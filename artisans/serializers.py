@@ -12,6 +12,7 @@ from rest_framework import serializers
 from .models import Artisan
 from users.models import User
 from django.contrib.auth.hashers import make_password
+from gestiart.images import variant_urls
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -41,11 +42,12 @@ class UserSerializer(serializers.ModelSerializer):
 class ArtisanSerializer(serializers.ModelSerializer):
     user = UserSerializer(required=False)
     photo_url = serializers.SerializerMethodField()
+    photo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Artisan
         fields = '__all__'
-        read_only_fields = ('photo_url',)
+        read_only_fields = ('photo_url', 'photo_variants')
 
     def get_photo_url(self, obj):
         if obj.photo:
@@ -55,6 +57,10 @@ class ArtisanSerializer(serializers.ModelSerializer):
             return obj.photo.url
         return None
 
+    def get_photo_variants(self, obj):
+        # Miniatures WebP/JPEG (voir gestiart/images.py), None tant qu'elles ne sont pas calculées
+        return variant_urls(obj.photo, self.context.get('request'))
+
     def create(self, validated_data):
         user_data = validated_data.pop('user', None)
         user = None
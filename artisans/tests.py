@@ -1,3 +1,97 @@
-from django.test import TestCase
+# artisans/tests.py
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from produits.models import Produit
+from ventes.models import Vente
+from .models import Artisan, ArtisanSearchKey
+from .search import name_cache, resolve_artisan
+
+User = get_user_model()
+
+
+def creer_artisan(numero, prenom, nom):
+    user = User.objects.create_user(
+        email=f'{numero.lower()}@example.com',
+        password='testpass123',
+        user_type='artisan'
+    )
+    return Artisan.objects.create(
+        user=user,
+        numero_boutique=numero,
+        prenom=prenom,
+        nom=nom,
+        telephone='000000000',
+        specialite='Poterie'
+    )
+
+
+class ResolutionArtisanTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        name_cache.clear()
+        self.helene = creer_artisan('B-001', 'Hélène', 'Dupont')
+        self.jean = creer_artisan('B-002', 'Jean', 'Dupont')
+        self.marc = creer_artisan('B-010', 'Marc', 'Lefèvre')
+
+    def test_noms_prefixes_et_numero_de_boutique(self):
+        for nom in ('Hélène Dupont', 'DUPONT helene', 'helene', 'hél', '  b-001 '):
+            self.assertEqual(resolve_artisan(nom), self.helene, nom)
+        self.assertEqual(resolve_artisan('lefevre'), self.marc)
+        self.assertEqual(resolve_artisan('B 010'), self.marc)
+        # Le nom exact l'emporte sur les préfixes plus longs
+        self.assertEqual(resolve_artisan('Jean'), self.jean)
+
+        for nom in ('Dupont', 'b-0', 'dup'):
+            with self.assertRaises(Artisan.MultipleObjectsReturned):
+                resolve_artisan(nom)
+        for nom in ('Martin', '', '  -  '):
+            with self.assertRaises(Artisan.DoesNotExist):
+                resolve_artisan(nom)
+
+    def test_cache_invalide_a_l_enregistrement(self):
+        self.assertEqual(resolve_artisan('Marc Lefèvre'), self.marc)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_artisan('marc lefevre'), self.marc)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marc.nom = 'Martin'
+            self.marc.save()
+        with self.assertRaises(Artisan.DoesNotExist):
+            resolve_artisan('Marc Lefèvre')
+        self.assertEqual(resolve_artisan('Martin'), self.marc)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marc.delete()
+        with self.assertRaises(Artisan.DoesNotExist):
+            resolve_artisan('Martin')
+
+    def test_reconstruction_des_cles(self):
+        ArtisanSearchKey.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_artisan_search', stdout=StringIO())
+        self.assertEqual(ArtisanSearchKey.objects.filter(artisan=self.helene).count(), 5)
+        self.assertEqual(resolve_artisan('helene dupont'), self.helene)
+
+    def test_vente_par_nom_d_artisan(self):
+        produit = Produit.objects.create(name='Vase', price='25.00', stock=5, artisan=self.jean)
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+        donnees = {
+            'nom_du_client': 'Client',
+            'lignes_vente': [{'product_id': produit.pk, 'quantity': 1}],
+        }
+
+        response = self.client.post('/api/ventes/', dict(donnees, artisan_name='jean dupont'), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Vente.objects.get().artisan, self.jean)
+
+        response = self.client.post('/api/ventes/', dict(donnees, artisan_name='Dupont'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('artisan_name', response.data)
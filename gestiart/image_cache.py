@@ -0,0 +1,248 @@
+# gestiart/image_cache.py
+"""
+Images réduites à la demande (GET /api/images/<chemin>?w=&format=).
+
+Une image de MEDIA_ROOT est réduite à la largeur demandée lors de la
+première demande, puis gardée dans un cache disque (IMAGE_CACHE_DIR) :
+
+- le fichier en cache est nommé d'après une empreinte (sha256) de
+  l'original (chemin, taille, date de modification), de la largeur, du
+  format et de la version du rendu ; un original remplacé donne une autre
+  empreinte, jamais une image périmée. L'empreinte sert aussi d'ETag fort ;
+- la date de modification d'un fichier en cache est celle de son dernier
+  accès (à la minute près) : au-delà de IMAGE_CACHE_MAX_BYTES, les fichiers
+  les moins récemment servis sont supprimés (LRU) ;
+- des demandes simultanées de la même image ne la calculent qu'une fois :
+  verrou par empreinte dans le processus, plus un fichier verrou (création
+  exclusive) pour les autres processus ;
+- la largeur demandée est arrondie à la largeur suivante de WIDTHS : un
+  client ne peut pas faire calculer une image par pixel de largeur.
+"""
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from PIL import Image
+
+from .images import open_oriented, save_image
+
+# À changer quand le rendu change : les anciens fichiers ne sont plus lus
+RENDER_VERSION = 1
+
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+
+# Largeurs calculées : une largeur demandée est arrondie à la suivante, ce
+# qui borne le nombre de fichiers en cache par image (et par format)
+WIDTHS = (64, 128, 160, 240, 320, 480, 640, 800, 1024, 1280, 1600, 2048)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# Dossiers de MEDIA_ROOT servis : images des produits (catalogue public)
+# seulement, pas les photos des artisans
+SOURCE_DIRS = ('produits_images',)
+
+# Précision de la date de dernier accès (secondes)
+TOUCH_INTERVAL = 60
+
+# Après une éviction, le cache descend à cette fraction de la taille maximale
+EVICT_RATIO = 0.9
+
+# Attente maximale d'un calcul en cours dans un autre processus (secondes)
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Taille du cache estimée par ce processus (None : à mesurer)
+_usage = None
+_usage_guard = threading.Lock()
+
+
+def cache_dir():
+    return getattr(settings, 'IMAGE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'image_cache'))
+
+
+def get_max_bytes():
+    return getattr(settings, 'IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def source_path(name):
+    """
+    Chemin sur disque de l'image `name` de MEDIA_ROOT, ou None si elle n'est
+    pas servie (extension, dossier hors SOURCE_DIRS, fichier absent).
+    """
+    if os.path.splitext(name)[1].lower() not in SOURCE_EXTENSIONS:
+        return None
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+    # Chemin résolu : « produits_images/../artisans/… » n'est pas servi
+    if not any(path.startswith(safe_join(settings.MEDIA_ROOT, folder) + os.sep) for folder in SOURCE_DIRS):
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def cache_width(width):
+    """Largeur calculée pour une demande de `width` pixels (MIN_WIDTH à MAX_WIDTH)."""
+    return WIDTHS[bisect_left(WIDTHS, width)]
+
+
+def image_key(source, name, width, format):
+    """Empreinte de l'image `name` réduite à `width` pixels au format `format`."""
+    stat = os.stat(source)
+    identity = f'{RENDER_VERSION}\0{name}\0{stat.st_size}\0{stat.st_mtime_ns}\0{width}\0{format}'
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def cached_path(key, format):
+    return os.path.join(cache_dir(), key[:2], f'{key}.{format}')
+
+
+def _touch(path):
+    """Marque le fichier comme servi ; False s'il n'existe pas."""
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _local_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _remove_stale_lock(lock):
+    """Supprime le fichier verrou s'il date de plus de LOCK_TIMEOUT (processus arrêté en plein calcul)."""
+    try:
+        if time.time() - os.stat(lock).st_mtime > LOCK_TIMEOUT:
+            os.remove(lock)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def _file_lock(path):
+    """
+    Verrou entre processus sur le calcul de `path` (abandonné après
+    LOCK_TIMEOUT). Un verrou plus ancien que LOCK_TIMEOUT est celui d'un
+    processus arrêté : il est supprimé, au pire deux processus calculent
+    alors la même image (le remplacement du fichier reste atomique).
+    """
+    lock = f'{path}.lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    acquired = False
+    while not os.path.exists(path):
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            acquired = True
+            break
+        except FileExistsError:
+            _remove_stale_lock(lock)
+            if time.monotonic() > deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        if acquired:
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                # Calcul plus long que LOCK_TIMEOUT : verrou déjà repris
+                pass
+
+
+def render_width(source, path, width, format):
+    """Écrit dans `path` l'image `source` réduite à `width` pixels de large (sans agrandissement)."""
+    image = open_oriented(source, width)
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    save_image(image, path, format)
+
+
+def resized_image(source, key, width, format):
+    """
+    Fichier en cache de l'image `source` réduite (calculé s'il manque, une
+    seule fois pour des demandes simultanées) : (chemin, trouvé en cache).
+    """
+    path = cached_path(key, format)
+    if _touch(path):
+        return path, True
+    with _local_lock(key):
+        try:
+            if _touch(path):
+                return path, True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with _file_lock(path):
+                if _touch(path):
+                    return path, True
+                render_width(source, path, width, format)
+            _record_write(os.path.getsize(path))
+            return path, False
+        finally:
+            with _locks_guard:
+                _locks.pop(key, None)
+
+
+def _record_write(size):
+    global _usage
+    with _usage_guard:
+        _usage = cache_size() if _usage is None else _usage + size
+        if _usage > get_max_bytes():
+            # Mesure réelle (les autres processus écrivent aussi), puis éviction
+            _usage = evict()
+
+
+def _cached_files():
+    for entry in os.scandir(cache_dir()):
+        if entry.is_dir():
+            for file in os.scandir(entry.path):
+                if file.name.endswith(tuple(f'.{format}' for format in CONTENT_TYPES)):
+                    yield file
+
+
+def cache_size():
+    try:
+        return sum(file.stat().st_size for file in _cached_files())
+    except FileNotFoundError:
+        return 0
+
+
+def evict(max_bytes=None):
+    """
+    Supprime les fichiers les moins récemment servis si le cache dépasse
+    `max_bytes` (défaut IMAGE_CACHE_MAX_BYTES), jusqu'à EVICT_RATIO de cette
+    taille ; retourne la taille restante.
+    """
+    max_bytes = get_max_bytes() if max_bytes is None else max_bytes
+    files = []
+    for file in _cached_files():
+        try:
+            stat = file.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, file.path))
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return total
+    for _, size, path in sorted(files):
+        if total <= max_bytes * EVICT_RATIO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
@@ -0,0 +1,209 @@
+# gestiart/images.py
+"""
+Variantes des images téléversées (images des produits, photos des artisans).
+
+Chaque image d'origine est déclinée en trois tailles (plus grand côté de
+160, 480 et 1024 pixels, sans agrandissement), en WebP et en JPEG pour les
+navigateurs sans WebP. Les variantes sont tournées selon l'orientation EXIF
+puis enregistrées sans métadonnées (ni EXIF ni position GPS des photos
+prises au téléphone).
+
+Elles sont écrites à côté des médias, sous un chemin déduit de celui de
+l'original : IMAGE_VARIANTS_DIR/<original sans extension>/<taille>.<format>.
+Les URL se calculent donc sans requête ; un nouvel envoi change le nom de
+l'original, donc celui des variantes.
+
+Après l'enregistrement d'un modèle surveillé (voir watch), les variantes
+manquantes sont calculées par un pool de processus (IMAGE_VARIANT_WORKERS,
+0 : dans le processus du serveur, après le commit). build_image_variants
+(commande) calcule celles des médias existants.
+
+Seul le stockage sur disque (FileSystemStorage) est pris en charge.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Du plus grand au plus petit : chaque taille est réduite depuis la précédente
+SIZES = (('grande', 1024), ('moyenne', 480), ('miniature', 160))
+FORMATS = ('webp', 'jpeg')
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_pool = None
+_pool_guard = threading.Lock()
+
+
+def variants_dir():
+    return getattr(settings, 'IMAGE_VARIANTS_DIR', 'variantes')
+
+
+def variant_name(name, size, format):
+    """Nom (dans le stockage) d'une variante de l'image `name`."""
+    return f'{variants_dir()}/{os.path.splitext(name)[0]}/{size}.{format}'
+
+
+def has_variants(name):
+    # La plus petite est écrite en dernier
+    return default_storage.exists(variant_name(name, SIZES[-1][0], FORMATS[-1]))
+
+
+def variant_urls(image, request=None):
+    """
+    URL des variantes d'un fichier image : {taille: {format: url}}, ou None
+    s'il n'y a pas d'image ou si ses variantes ne sont pas encore calculées.
+    """
+    if not image or not has_variants(image.name):
+        return None
+    urls = {}
+    for size, _ in SIZES:
+        urls[size] = {}
+        for format in FORMATS:
+            url = default_storage.url(variant_name(image.name, size, format))
+            urls[size][format] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def open_oriented(source, pixels):
+    """
+    Ouvre l'image `source` (chemin sur disque) pour une réduction à `pixels`
+    de côté au plus : décodage JPEG directement à une échelle réduite,
+    orientation EXIF appliquée, mode RGB ou RGBA.
+    """
+    with Image.open(source) as original:
+        original.draft('RGB', (pixels, pixels))
+        image = ImageOps.exif_transpose(original)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+    return image
+
+
+def save_image(image, path, format):
+    """Enregistre `image` sans métadonnées, par remplacement atomique du fichier `path`."""
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        if format == 'jpeg':
+            if image.mode == 'RGBA':
+                flat = Image.new('RGB', image.size, (255, 255, 255))
+                flat.paste(image, mask=image.getchannel('A'))
+                image = flat
+            image.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+        # Jamais de fichier à moitié écrit
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def render_variants(source, target):
+    """
+    Écrit les variantes de l'image `source` dans le dossier `target` (chemins
+    sur disque) ; retourne le nombre de fichiers écrits. Exécutée dans les
+    processus du pool : n'utilise ni Django ni la base.
+    """
+    os.makedirs(target, exist_ok=True)
+    written = 0
+    image = open_oriented(source, SIZES[0][1])
+    for size, pixels in SIZES:
+        image.thumbnail((pixels, pixels), Image.LANCZOS)
+        for format in FORMATS:
+            save_image(image, os.path.join(target, f'{size}.{format}'), format)
+            written += 1
+    return written
+
+
+def variant_paths(name):
+    """(source, dossier cible) sur disque pour l'image `name`."""
+    target = os.path.dirname(default_storage.path(variant_name(name, SIZES[0][0], FORMATS[0])))
+    return default_storage.path(name), target
+
+
+def get_workers():
+    return getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+
+
+def get_pool():
+    global _pool
+    with _pool_guard:
+        if _pool is None:
+            # spawn : pas de copie du serveur (threads, connexions) dans les processus
+            _pool = ProcessPoolExecutor(
+                max_workers=get_workers(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _log_failure(name):
+    def callback(future):
+        if future.exception() is not None:
+            logger.error("Variantes de %s non calculées : %s", name, future.exception())
+    return callback
+
+
+def schedule_variants(name):
+    """Calcule les variantes de `name` dans le pool (ou sur place sans pool)."""
+    try:
+        source, target = variant_paths(name)
+    except NotImplementedError:
+        return
+    if get_workers() < 1:
+        try:
+            render_variants(source, target)
+        except Exception as e:
+            logger.error("Variantes de %s non calculées : %s", name, e)
+        return
+    get_pool().submit(render_variants, source, target).add_done_callback(_log_failure(name))
+
+
+def _render_or_error(paths):
+    try:
+        render_variants(*paths)
+        return None
+    except Exception as e:
+        return f'{paths[0]} : {e}'
+
+
+def build_variants(names, workers=None):
+    """
+    Calcule les variantes des images `names` avec `workers` processus
+    (défaut : un par cœur). Retourne (nombre d'images traitées, erreurs).
+    """
+    paths = [variant_paths(name) for name in names]
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(paths) < 2:
+        results = map(_render_or_error, paths)
+        errors = [error for error in results if error]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            errors = [error for error in pool.map(_render_or_error, paths, chunksize=8) if error]
+    return len(paths) - len(errors), errors
+
+
+def watch(model, field_name):
+    """Calcule les variantes de `model.field_name` après chaque enregistrement qui en manque."""
+    def receiver(sender, instance, raw=False, **kwargs):
+        image = getattr(instance, field_name)
+        if raw or not image:
+            return
+        name = image.name
+        if not has_variants(name):
+            transaction.on_commit(lambda: schedule_variants(name))
+
+    post_save.connect(
+        receiver, sender=model, weak=False,
+        dispatch_uid=f'images_{model._meta.label_lower}_{field_name}'
+    )
@@ -109,6 +109,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Attendre le verrou d'écriture au lieu d'échouer lors des ventes simultanées
+            'timeout': 20,
+        },
+        'TEST': {
+            # Base de test sur fichier : les tests multi-threads partagent la même base
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -172,6 +180,63 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': None,
 }
 
+# Numérotation des ventes : nombre de numéros réservés à la fois par processus.
+# 1 = une réservation en base par vente (numéros strictement croissants).
+SALE_NUMBER_BLOCK_SIZE = int(os.getenv('SALE_NUMBER_BLOCK_SIZE', 1))
+
+# Idempotence de POST /api/ventes/ (en-tête Idempotency-Key)
+IDEMPOTENCY_CACHE_TIMEOUT = 300  # secondes de réponse gardée dans le cache local
+IDEMPOTENCY_KEY_RETENTION_HOURS = 24  # voir manage.py purge_idempotency_keys
+
+# Cache : mémoire locale par processus par défaut. DJANGO_CACHE_DIR active un
+# cache fichier, partagé entre les processus du serveur (invalidation des
+# statistiques, idempotence).
+if os.getenv('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('DJANGO_CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Durée de vie des réponses des vues de statistiques (voir stats/cache.py)
+STATS_CACHE_TIMEOUT = 300
+STATS_CACHE_MAX_BYTES = 5 * 1024 * 1024  # réponses en flux plus grosses : non gardées
+
+# Requêtes indépendantes des tableaux de bord exécutées en parallèle (0 ou 1 : à la suite).
+# Utile avec MySQL et des connexions persistantes (CONN_MAX_AGE) ; avec SQLite,
+# ouvrir une connexion par thread coûte plus que le gain (manage.py benchmark_dashboard).
+STATS_QUERY_THREADS = int(os.getenv('STATS_QUERY_THREADS', '0'))
+
+# Instantanés précalculés des rapports (voir manage.py snapshot_report_card)
+STATS_SNAPSHOT_DIR = os.getenv('STATS_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+
+# Colonnes des lignes de vente sur disque (voir manage.py build_sales_columns) ;
+# sans ce réglage, chaque processus les charge depuis la base
+STATS_COLUMNS_DIR = os.getenv('STATS_COLUMNS_DIR') or None
+
+# Taille maximale d'un tableau croisé (lignes x colonnes) de /api/stats/analytics/
+STATS_PIVOT_MAX_CELLS = 100_000
+
+# Variantes WebP/JPEG des images téléversées (voir gestiart/images.py) :
+# processus de calcul (0 : dans le processus du serveur) et dossier dans MEDIA_ROOT
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+IMAGE_VARIANTS_DIR = 'variantes'
+
+# Images réduites à la demande (GET /api/images/, voir gestiart/image_cache.py) :
+# dossier du cache disque et taille maximale avant éviction des moins récemment servies
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Délai de réapprovisionnement des produits, en jours (voir manage.py forecast_stock)
+STOCK_DELAI_REAPPRO_JOURS = 7
+
 # JWT Settings
 # SIMPLE_JWT = {
 #     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -236,6 +301,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 # Point Django to the custom user model
@@ -0,0 +1,220 @@
+# gestiart/tests.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image as PILImage
+from rest_framework.test import APITestCase
+
+from artisans.models import Artisan
+from produits.models import Produit
+from ventes.tests import creer_artisan, creer_produit
+from . import image_cache
+
+
+def image_jpeg(largeur=3000, hauteur=2000):
+    """Photo JPEG avec orientation EXIF (90°) et position GPS, comme un téléphone."""
+    image = PILImage.new('RGB', (largeur, hauteur), (200, 120, 40))
+    exif = PILImage.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {1: 'N', 2: (48.0, 51.0, 24.0)}
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class VariantesImagesTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglages = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANT_WORKERS=0)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.artisan = creer_artisan()
+
+    def test_variantes_apres_envoi(self):
+        produit = creer_produit(self.artisan)
+        self.assertIsNone(self.client.get(f'/api/produits/{produit.pk}/').data['image_variants'])
+        with self.captureOnCommitCallbacks(execute=True):
+            produit.image = SimpleUploadedFile('photo.jpg', image_jpeg(), content_type='image/jpeg')
+            produit.save()
+
+        variantes = self.client.get(f'/api/produits/{produit.pk}/').data['image_variants']
+        self.assertEqual(set(variantes), {'miniature', 'moyenne', 'grande'})
+        racine = produit.image.name.rsplit('.', 1)[0]
+        self.assertEqual(
+            variantes['miniature']['webp'],
+            f'http://testserver/media/variantes/{racine}/miniature.webp'
+        )
+        for taille, dimensions in (('grande', (683, 1024)), ('miniature', (107, 160))):
+            for format in ('webp', 'jpeg'):
+                with PILImage.open(os.path.join(self.media, 'variantes', racine, f'{taille}.{format}')) as variante:
+                    # Tournée selon l'EXIF, puis sans métadonnées
+                    self.assertEqual(variante.size, dimensions)
+                    self.assertEqual(variante.format, format.upper())
+                    self.assertEqual(len(variante.getexif()), 0)
+
+    def test_commande_sur_les_medias_existants(self):
+        os.makedirs(os.path.join(self.media, 'produits_images'))
+        with open(os.path.join(self.media, 'produits_images', 'ancienne.jpg'), 'wb') as f:
+            f.write(image_jpeg(800, 600))
+        PILImage.new('RGBA', (300, 300), (0, 0, 0, 0)).save(os.path.join(self.media, 'portrait.png'))
+        creer_produit(self.artisan)
+        Produit.objects.update(image='produits_images/ancienne.jpg')
+        Artisan.objects.update(photo='portrait.png')
+
+        sortie = StringIO()
+        call_command('build_image_variants', workers=2, stdout=sortie)
+        self.assertIn('2 images déclinées en variantes, 0 en erreur.', sortie.getvalue())
+        with PILImage.open(os.path.join(self.media, 'variantes', 'produits_images', 'ancienne', 'grande.jpeg')) as variante:
+            # Jamais agrandie
+            self.assertEqual(variante.size, (600, 800))
+        artisan = self.client.get(f'/api/artisans/{self.artisan.pk}/').data
+        self.assertTrue(artisan['photo_variants']['moyenne']['jpeg'].endswith('/media/variantes/portrait/moyenne.jpeg'))
+
+        sortie = StringIO()
+        call_command('build_image_variants', stdout=sortie)
+        self.assertIn('0 images déclinées', sortie.getvalue())
+
+
+class ImagesALaDemandeTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglages = override_settings(MEDIA_ROOT=self.media, IMAGE_CACHE_DIR=os.path.join(self.media, 'cache'))
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        os.makedirs(os.path.join(self.media, 'produits_images'))
+        with open(os.path.join(self.media, 'produits_images', 'photo.jpg'), 'wb') as f:
+            f.write(image_jpeg())
+        self.url = '/api/images/produits_images/photo.jpg'
+
+    def contenu(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_reduction_puis_cache_et_etag(self):
+        response = self.client.get(self.url, {'w': 300, 'format': 'jpeg'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with PILImage.open(BytesIO(self.contenu(response))) as image:
+            # Largeur arrondie à la largeur calculée suivante
+            self.assertEqual(image.size, (320, 480))
+            self.assertEqual(len(image.getexif()), 0)
+
+        seconde = self.client.get(self.url, {'w': 300, 'format': 'jpeg'})
+        self.assertEqual(seconde['X-Cache'], 'HIT')
+        self.assertEqual(seconde['ETag'], response['ETag'])
+        self.contenu(seconde)
+        self.assertEqual(
+            self.client.get(self.url, {'w': 300, 'format': 'jpeg'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304
+        )
+        # Même largeur calculée : même fichier
+        proche = self.client.get(self.url, {'w': 310, 'format': 'jpeg'})
+        self.assertEqual((proche['X-Cache'], proche['ETag']), ('HIT', response['ETag']))
+        self.contenu(proche)
+        # Autre largeur ou format : autre fichier, autre ETag
+        webp = self.client.get(self.url, {'w': 300})
+        self.assertEqual(webp['Content-Type'], 'image/webp')
+        self.assertNotEqual(webp['ETag'], response['ETag'])
+        self.contenu(webp)
+
+        self.assertEqual(self.client.get(self.url, {'w': 5000}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'w': 300, 'format': 'gif'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/images/produits_images/absente.jpg', {'w': 300}).status_code, 404)
+        self.assertEqual(self.client.get('/api/images/../manage.py', {'w': 300}).status_code, 404)
+
+    def test_un_seul_calcul_pour_des_demandes_simultanees(self):
+        appels = []
+        rendu = image_cache.render_width
+
+        def rendu_lent(*args):
+            appels.append(args)
+            time.sleep(0.2)
+            rendu(*args)
+
+        source = image_cache.source_path('produits_images/photo.jpg')
+        cle = image_cache.image_key(source, 'produits_images/photo.jpg', 200, 'webp')
+        resultats = []
+        with mock.patch.object(image_cache, 'render_width', rendu_lent):
+            threads = [
+                threading.Thread(target=lambda: resultats.append(image_cache.resized_image(source, cle, 200, 'webp')))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(len(resultats), 8)
+        self.assertEqual(sorted(hit for _, hit in resultats), [False] + [True] * 7)
+
+    def test_images_des_produits_seulement(self):
+        os.makedirs(os.path.join(self.media, 'artisans_photos'))
+        with open(os.path.join(self.media, 'artisans_photos', 'portrait.jpg'), 'wb') as f:
+            f.write(image_jpeg(400, 300))
+        self.assertEqual(self.client.get('/api/images/artisans_photos/portrait.jpg', {'w': 300}).status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/images/produits_images/../artisans_photos/portrait.jpg', {'w': 300}).status_code,
+            404
+        )
+
+    def test_original_illisible_ou_supprime(self):
+        with mock.patch.object(PILImage, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.client.get(self.url, {'w': 300})
+        self.assertEqual(response.status_code, 400)
+
+        with mock.patch('gestiart.views.image_key', side_effect=FileNotFoundError):
+            self.assertEqual(self.client.get(self.url, {'w': 300}).status_code, 404)
+
+    def test_verrou_abandonne(self):
+        source = image_cache.source_path('produits_images/photo.jpg')
+        cle = image_cache.image_key(source, 'produits_images/photo.jpg', 160, 'webp')
+        verrou = image_cache.cached_path(cle, 'webp') + '.lock'
+        os.makedirs(os.path.dirname(verrou))
+        open(verrou, 'w').close()
+        ancien = time.time() - image_cache.LOCK_TIMEOUT - 1
+        os.utime(verrou, (ancien, ancien))
+
+        debut = time.monotonic()
+        chemin, hit = image_cache.resized_image(source, cle, 160, 'webp')
+        self.assertLess(time.monotonic() - debut, image_cache.LOCK_TIMEOUT)
+        self.assertFalse(hit)
+        self.assertTrue(os.path.exists(chemin))
+        self.assertFalse(os.path.exists(verrou))
+
+    def test_image_evincee_avant_lecture(self):
+        absent = os.path.join(self.media, 'cache', 'absent.webp')
+        with mock.patch('gestiart.views.resized_image', return_value=(absent, False)) as calcul:
+            response = self.client.get(self.url, {'w': 300})
+        self.assertEqual(calcul.call_count, 2)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_eviction_des_moins_recemment_servies(self):
+        source = image_cache.source_path('produits_images/photo.jpg')
+        chemins = {}
+        for largeur in (100, 200, 300):
+            cle = image_cache.image_key(source, 'produits_images/photo.jpg', largeur, 'jpeg')
+            chemins[largeur], _ = image_cache.resized_image(source, cle, largeur, 'jpeg')
+        # 100 servie le plus récemment, puis 300 ; 200 est la plus ancienne
+        maintenant = time.time()
+        for largeur, age in ((100, 0), (200, 3600), (300, 1800)):
+            os.utime(chemins[largeur], (maintenant - age, maintenant - age))
+        tailles = {largeur: os.path.getsize(chemin) for largeur, chemin in chemins.items()}
+
+        # Taille maximale dépassée, mais il suffit de retirer la plus ancienne
+        maximum = int((tailles[100] + tailles[300]) / image_cache.EVICT_RATIO) + 1
+        self.assertGreater(sum(tailles.values()), maximum)
+        self.assertEqual(image_cache.evict(max_bytes=maximum), tailles[100] + tailles[300])
+        self.assertFalse(os.path.exists(chemins[200]))
+        self.assertTrue(os.path.exists(chemins[100]))
@@ -22,11 +22,14 @@ from rest_framework_simplejwt.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
+from .views import image_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     # path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Images réduites à la demande (?w=&format=)
+    path('api/images/<path:name>', image_view, name='image-resize'),
     path('api/', include('users.urls')),
     path('api/', include('artisans.urls')),
     path('api/', include('produits.urls')),
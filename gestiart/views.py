@@ -0,0 +1,77 @@
+# gestiart/views.py
+import os
+
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+from PIL import Image, UnidentifiedImageError
+
+from .image_cache import (
+    CONTENT_TYPES,
+    MAX_WIDTH,
+    MIN_WIDTH,
+    cache_width,
+    image_key,
+    resized_image,
+    source_path,
+)
+
+
+@require_GET
+def image_view(request, name):
+    """
+    Image de produit `name` (dossiers SOURCE_DIRS de MEDIA_ROOT) réduite à
+    la largeur `w` (16 à 2048 pixels, arrondie à la largeur calculée
+    suivante, sans agrandissement), au format `format` (webp par défaut, ou
+    jpeg). Calculée à la première demande puis servie depuis le cache disque
+    (voir gestiart/image_cache.py), avec un ETag fort. Les photos des
+    artisans ne sont pas servies.
+    """
+    format = request.GET.get('format', 'webp')
+    if format not in CONTENT_TYPES:
+        return JsonResponse({'format': f"Valeurs possibles : {', '.join(CONTENT_TYPES)}."}, status=400)
+    try:
+        width = int(request.GET.get('w', ''))
+    except ValueError:
+        width = None
+    if width is None or not MIN_WIDTH <= width <= MAX_WIDTH:
+        return JsonResponse({'w': f"Largeur entre {MIN_WIDTH} et {MAX_WIDTH} pixels attendue."}, status=400)
+
+    width = cache_width(width)
+
+    source = source_path(name)
+    if source is None:
+        raise Http404("Image introuvable.")
+    try:
+        key = image_key(source, name, width, format)
+    except FileNotFoundError:
+        # Original supprimé depuis source_path
+        raise Http404("Image introuvable.")
+    etag = f'"{key}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    # Deux essais : le fichier peut être évincé entre le calcul et l'ouverture
+    for attempt in range(2):
+        try:
+            path, hit = resized_image(source, key, width, format)
+            file = open(path, 'rb')
+            break
+        except UnidentifiedImageError:
+            return JsonResponse({'detail': "Fichier image illisible."}, status=400)
+        except Image.DecompressionBombError:
+            return JsonResponse({'detail': "Image d'origine trop grande."}, status=400)
+        except FileNotFoundError:
+            if not os.path.isfile(source):
+                raise Http404("Image introuvable.")
+    else:
+        # Évincé deux fois de suite : cache saturé, le client réessaiera
+        response = JsonResponse({'detail': "Image momentanément indisponible."}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    response = FileResponse(file, content_type=CONTENT_TYPES[format])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=86400'
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
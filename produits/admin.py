@@ -2,7 +2,7 @@
 
 # produits/admin.py
 from django.contrib import admin
-from .models import Produit, Categorie
+from .models import Produit, Categorie, PrevisionStock
 
 @admin.register(Categorie)
 class CategorieAdmin(admin.ModelAdmin):
@@ -28,4 +28,11 @@ class ProduitAdmin(admin.ModelAdmin):
         ('Dates', {
             'fields': ('date_added',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(PrevisionStock)
+class PrevisionStockAdmin(admin.ModelAdmin):
+    list_display = ('product', 'stock', 'daily_velocity', 'days_of_cover', 'reorder_point', 'is_low', 'computed_at')
+    list_filter = ('is_low',)
+    search_fields = ('product__name',)
+    readonly_fields = [field.name for field in PrevisionStock._meta.fields]
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProduitsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produits'
+
+    def ready(self):
+        # Abonne les index de recherche aux enregistrements des produits
+        from . import search  # noqa: F401
+        from gestiart import images
+        from .models import Produit
+        images.watch(Produit, 'image')
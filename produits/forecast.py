@@ -0,0 +1,130 @@
+# produits/forecast.py
+"""
+Prévisions de rupture de stock, calculées en lot pour tout le catalogue.
+
+Les quantités vendues par produit et par jour sur les HISTORIQUE_JOURS
+derniers jours sont lues en une requête (GROUP BY sur les lignes de vente),
+rangées dans une matrice NumPy produits x jours, puis les vitesses de vente
+(moyennes glissantes sur 7 et 30 jours), jours de couverture et points de
+commande sont calculés pour tous les produits à la fois.
+
+Les résultats remplacent le contenu de PrevisionStock : la liste des stocks
+bas (GET /api/produits/low-stock/) est une simple lecture de cette table.
+La commande forecast_stock est à planifier (cron), par exemple chaque nuit.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ventes.models import LigneVente
+from .models import PrevisionStock, Produit
+
+# Fenêtres des moyennes glissantes (jours) ; la plus longue fixe l'historique lu
+FENETRE_COURTE = 7
+FENETRE_LONGUE = 30
+HISTORIQUE_JOURS = FENETRE_LONGUE
+
+# Stock de sécurité : z * écart-type de la demande * racine du délai
+# (1.65 : rupture évitée dans 95 % des cas pendant le délai)
+NIVEAU_SERVICE_Z = 1.65
+
+
+def get_lead_time():
+    """Délai de réapprovisionnement en jours (STOCK_DELAI_REAPPRO_JOURS)."""
+    return getattr(settings, 'STOCK_DELAI_REAPPRO_JOURS', 7)
+
+
+def daily_sales(product_ids, today):
+    """
+    Matrice (produits x HISTORIQUE_JOURS) des quantités vendues par jour,
+    le dernier jour étant `today`, dans l'ordre de `product_ids` (trié).
+    """
+    first_day = today - timedelta(days=HISTORIQUE_JOURS - 1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    rows = np.array(list(
+        LigneVente.objects.filter(vente__sale_date__gte=start).annotate(
+            jour=TruncDate('vente__sale_date')
+        ).values('product_id', 'jour').annotate(
+            total=Sum('quantity')
+        ).order_by().values_list('product_id', 'jour', 'total')
+    ), dtype=object).reshape(-1, 3)
+
+    ventes = np.zeros((len(product_ids), HISTORIQUE_JOURS))
+    if not len(rows):
+        return ventes
+    products = rows[:, 0].astype(np.int64)
+    days = np.array([(jour - first_day).days for jour in rows[:, 1]], dtype=np.int64)
+    rows_index = np.searchsorted(product_ids, products)
+    known = (rows_index < len(product_ids)) & (days >= 0) & (days < HISTORIQUE_JOURS)
+    known[known] &= product_ids[rows_index[known]] == products[known]
+    np.add.at(ventes, (rows_index[known], days[known]), rows[known, 2].astype(np.float64))
+    return ventes
+
+
+def compute_forecasts(stocks, ventes, lead_time):
+    """
+    Calcule, pour chaque produit (une ligne de `ventes`), les vitesses de vente,
+    jours de couverture, points de commande et l'indicateur de stock bas.
+    Retourne un dict de tableaux alignés sur `stocks`.
+    """
+    cumul = np.cumsum(ventes, axis=1)
+    velocity_7d = (cumul[:, -1] - cumul[:, -FENETRE_COURTE - 1]) / FENETRE_COURTE
+    velocity_30d = cumul[:, -1] / FENETRE_LONGUE
+    # La vitesse retenue suit une accélération récente sans oublier les 30 jours
+    velocity = np.maximum(velocity_7d, velocity_30d)
+    ecart_type = ventes.std(axis=1)
+
+    reorder_point = np.ceil(
+        velocity * lead_time + NIVEAU_SERVICE_Z * ecart_type * np.sqrt(lead_time)
+    ).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, stocks / velocity, np.where(stocks > 0, np.nan, 0.0))
+    return {
+        'velocity_7d': velocity_7d,
+        'velocity_30d': velocity_30d,
+        'daily_velocity': velocity,
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point,
+        # Un produit jamais vendu sur la période n'a pas de rupture à prévoir
+        'is_low': (velocity > 0) & (stocks <= reorder_point),
+    }
+
+
+def forecast_stock(today=None):
+    """Recalcule PrevisionStock pour tous les produits. Retourne (produits, stocks bas)."""
+    today = today or timezone.localdate()
+    catalogue = np.array(
+        list(Produit.objects.order_by('pk').values_list('pk', 'stock')), dtype=np.int64
+    ).reshape(-1, 2)
+    product_ids, stocks = catalogue[:, 0], catalogue[:, 1]
+    resultats = compute_forecasts(stocks, daily_sales(product_ids, today), get_lead_time())
+
+    computed_at = timezone.now()
+    previsions = [
+        PrevisionStock(
+            product_id=product_id,
+            stock=stock,
+            velocity_7d=round(velocity_7d, 3),
+            velocity_30d=round(velocity_30d, 3),
+            daily_velocity=round(velocity, 3),
+            days_of_cover=None if np.isnan(cover) else round(cover, 1),
+            reorder_point=reorder_point,
+            is_low=is_low,
+            computed_at=computed_at,
+        )
+        for product_id, stock, velocity_7d, velocity_30d, velocity, cover, reorder_point, is_low in zip(
+            product_ids.tolist(), stocks.tolist(),
+            resultats['velocity_7d'].tolist(), resultats['velocity_30d'].tolist(),
+            resultats['daily_velocity'].tolist(), resultats['days_of_cover'].tolist(),
+            resultats['reorder_point'].tolist(), resultats['is_low'].tolist(),
+        )
+    ]
+    with transaction.atomic():
+        PrevisionStock.objects.all().delete()
+        PrevisionStock.objects.bulk_create(previsions, batch_size=500)
+    return len(previsions), int(resultats['is_low'].sum())
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from artisans.models import Artisan
+from gestiart.images import build_variants, has_variants
+from produits.models import Produit
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule les variantes WebP/JPEG (miniature, moyenne, grande) des images des produits "
+        "et des photos des artisans déjà téléversées, en parallèle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Recalcule aussi les images qui ont déjà leurs variantes."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Nombre de processus (défaut : un par cœur)."
+        )
+
+    def handle(self, *args, **options):
+        names = set(Produit.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+        names |= set(Artisan.objects.exclude(photo='').exclude(photo=None).values_list('photo', flat=True))
+        if not options['force']:
+            names = {name for name in names if not has_variants(name)}
+
+        done, errors = build_variants(sorted(names), options['workers'])
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} images déclinées en variantes, {len(errors)} en erreur."
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from produits.forecast import forecast_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les prévisions de rupture de stock de tous les produits "
+        "(GET /api/produits/low-stock/). À planifier (cron), par exemple chaque nuit."
+    )
+
+    def handle(self, *args, **options):
+        produits, stocks_bas = forecast_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f"{produits} produits analysés, {stocks_bas} sous le point de commande."
+        ))
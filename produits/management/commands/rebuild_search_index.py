@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from produits.search import INDEXES
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les index de recherche plein texte des produits et des catégories "
+        "(SQLite), par exemple après une modification directe en base."
+    )
+
+    def handle(self, *args, **options):
+        for index in INDEXES:
+            count = index.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"{index.table} : {count} lignes indexées."))
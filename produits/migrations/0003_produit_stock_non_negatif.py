@@ -0,0 +1,17 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0002_alter_produit_options_alter_categorie_date_creation_and_more'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='produit',
+            constraint=models.CheckConstraint(check=models.Q(('stock__gte', 0)), name='produit_stock_non_negatif'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.22 on 2026-10-17 23:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0003_produit_stock_non_negatif'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisionStock',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prevision_stock', serialize=False, to='produits.produit', verbose_name='Produit')),
+                ('stock', models.IntegerField(verbose_name='Stock au calcul')),
+                ('velocity_7d', models.FloatField(verbose_name='Ventes par jour (7 jours)')),
+                ('velocity_30d', models.FloatField(verbose_name='Ventes par jour (30 jours)')),
+                ('daily_velocity', models.FloatField(verbose_name='Vitesse de vente retenue')),
+                ('days_of_cover', models.FloatField(blank=True, null=True, verbose_name='Jours de couverture')),
+                ('reorder_point', models.PositiveIntegerField(verbose_name='Point de commande')),
+                ('is_low', models.BooleanField(default=False, verbose_name='Stock bas')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Prévision de stock',
+                'verbose_name_plural': 'Prévisions de stock',
+                'indexes': [models.Index(condition=models.Q(('is_low', True)), fields=['days_of_cover'], name='produits_stock_bas_idx')],
+            },
+        ),
+    ]
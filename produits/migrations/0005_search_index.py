@@ -0,0 +1,55 @@
+from django.db import migrations
+
+FTS_TABLES = {
+    'produits_produit_fts': (
+        "name, description, categorie",
+        "SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(c.nom, '') "
+        "FROM produits_produit p LEFT JOIN produits_categorie c ON c.id = p.categorie_id",
+    ),
+    'produits_categorie_fts': (
+        "nom, description",
+        "SELECT id, nom, COALESCE(description, '') FROM produits_categorie",
+    ),
+}
+
+FULLTEXT_INDEXES = {
+    'produits_produit_fts': ('produits_produit', 'name, description'),
+    'produits_categorie_fts': ('produits_categorie', 'nom, description'),
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            for table, (columns, source) in FTS_TABLES.items():
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {table} USING fts5("
+                    f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+                cursor.execute(f"INSERT INTO {table} (rowid, {columns}) {source}")
+        elif vendor == 'mysql':
+            for name, (table, columns) in FULLTEXT_INDEXES.items():
+                cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            for table in FTS_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        elif vendor == 'mysql':
+            for name, (table, _) in FULLTEXT_INDEXES.items():
+                cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0004_prevision_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.22 on 2026-10-18 00:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='previsionstock',
+            name='produits_stock_bas_idx',
+        ),
+    ]
@@ -73,6 +73,13 @@ class Produit(models.Model):
             models.Index(fields=['categorie']),
             models.Index(fields=['artisan']),
         ]
+        constraints = [
+            # Filet de sécurité pour les décréments concurrents (voir ventes.models.reserve_stock)
+            models.CheckConstraint(
+                check=models.Q(stock__gte=0),
+                name='produit_stock_non_negatif',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -80,4 +87,33 @@ class Produit(models.Model):
     def save(self, *args, **kwargs):
         if self.stock < 0:
             raise ValueError("Le stock ne peut pas être négatif")
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class PrevisionStock(models.Model):
+    """
+    Prévision de rupture d'un produit, recalculée en lot par la commande
+    forecast_stock (voir produits/forecast.py). `stock` est le stock au moment
+    du calcul.
+    """
+    product = models.OneToOneField(
+        Produit,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='prevision_stock',
+        verbose_name=_('Produit')
+    )
+    stock = models.IntegerField(_('Stock au calcul'))
+    velocity_7d = models.FloatField(_('Ventes par jour (7 jours)'))
+    velocity_30d = models.FloatField(_('Ventes par jour (30 jours)'))
+    daily_velocity = models.FloatField(_('Vitesse de vente retenue'))
+    days_of_cover = models.FloatField(_('Jours de couverture'), null=True, blank=True)
+    reorder_point = models.PositiveIntegerField(_('Point de commande'))
+    is_low = models.BooleanField(_('Stock bas'), default=False)
+    computed_at = models.DateTimeField(_('Calculé le'))
+
+    class Meta:
+        verbose_name = _('Prévision de stock')
+        verbose_name_plural = _('Prévisions de stock')
+
+    def __str__(self):
+        return f'{self.product} : {self.days_of_cover} jours de couverture'
@@ -0,0 +1,193 @@
+# produits/search.py
+"""
+Recherche plein texte dans les produits et les catégories (paramètre ?q=).
+
+La recherche dépend du moteur de base de données :
+
+- SQLite : table virtuelle FTS5 par modèle (rowid = clé primaire), tenue à
+  jour par les signaux des modèles ; résultats classés par bm25, le nom
+  pesant plus que la catégorie, elle-même plus que la description ;
+- MySQL : index FULLTEXT sur les colonnes texte du modèle, interrogé avec
+  MATCH ... AGAINST en mode booléen (sans le nom de catégorie) ;
+- autres moteurs, PostgreSQL compris : filtre icontains sur chaque mot, les
+  noms qui commencent par le premier mot en tête. Sans index plein texte,
+  chaque recherche parcourt toute la table : acceptable pour quelques
+  milliers de produits, pas au-delà (prévoir alors SearchVector et un index
+  GIN sur PostgreSQL).
+
+Chaque mot de la recherche est un préfixe (« pot » trouve « poterie ») et
+tous les mots doivent être présents. Les index sont créés par la migration
+produits 0005 ; rebuild_search_index (commande) reconstruit les tables FTS5.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Categorie, Produit
+
+# Nombre maximal de mots pris en compte dans une recherche
+MAX_TERMS = 8
+
+WORD_RE = re.compile(r'\w+')
+
+
+def search_terms(q):
+    return WORD_RE.findall((q or '').lower())[:MAX_TERMS]
+
+
+class SearchIndex:
+    """
+    Index plein texte d'un modèle.
+
+    - `columns` : colonnes de la table FTS5, remplies par la requête `source`
+      (clé `key` puis une expression par colonne) ;
+    - `weights` : poids bm25 de chaque colonne ;
+    - `lookups` : champs équivalents pour la recherche sans index ;
+    - `fulltext` : colonnes de l'index FULLTEXT (MySQL).
+    """
+
+    def __init__(self, model, table, columns, weights, source, key, lookups, fulltext):
+        self.model = model
+        self.table = table
+        self.columns = columns
+        self.weights = weights
+        self.source = source
+        self.key = key
+        self.lookups = lookups
+        self.fulltext = fulltext
+
+    # --- Mise à jour (SQLite uniquement, les index FULLTEXT suivent seuls) --
+
+    def rebuild(self):
+        """Réindexe toutes les lignes ; retourne leur nombre."""
+        if connection.vendor != 'sqlite':
+            return self.model.objects.count()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) {self.source}"
+            )
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+    def index(self, pks):
+        """Réindexe les lignes `pks` depuis la base (supprimées si elles n'existent plus)."""
+        pks = list(pks)
+        if not pks or connection.vendor != 'sqlite':
+            return
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", pks)
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) "
+                f"{self.source} WHERE {self.key} IN ({placeholders})",
+                pks
+            )
+
+    # --- Recherche ----------------------------------------------------------
+
+    def search(self, queryset, q):
+        """Filtre `queryset` sur la recherche `q` et le trie par pertinence."""
+        terms = search_terms(q)
+        if not terms:
+            return queryset.none()
+        if connection.vendor == 'sqlite':
+            # Chaque mot entre guillemets (pas de syntaxe FTS5 venant de
+            # l'utilisateur), suivi de * pour la recherche par préfixe
+            match = ' '.join(f'"{term}"*' for term in terms)
+            weights = ', '.join(str(weight) for weight in self.weights)
+            opts = self.model._meta
+            key = f'{connection.ops.quote_name(opts.db_table)}.{connection.ops.quote_name(opts.pk.column)}'
+            # Filtre sur les rowid trouvés par l'index, puis score bm25 de
+            # chaque ligne retenue (sous-requête sur sa seule rowid)
+            found = RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match])
+            pertinence = RawSQL(
+                f"SELECT bm25({self.table}, {weights}) FROM {self.table} "
+                f"WHERE {self.table} MATCH %s AND rowid = {key}",
+                [match],
+                output_field=FloatField()
+            )
+            return queryset.filter(pk__in=found).annotate(
+                pertinence=pertinence
+            ).order_by('pertinence', 'pk')
+        if connection.vendor == 'mysql':
+            match = ' '.join(f'+{term}*' for term in terms)
+            pertinence = RawSQL(
+                f"MATCH ({', '.join(self.fulltext)}) AGAINST (%s IN BOOLEAN MODE)", [match]
+            )
+            return queryset.annotate(pertinence=pertinence).filter(
+                pertinence__gt=0
+            ).order_by('-pertinence', 'pk')
+        filters = Q()
+        for term in terms:
+            term_filter = Q()
+            for lookup in self.lookups:
+                term_filter |= Q(**{f'{lookup}__icontains': term})
+            filters &= term_filter
+        return queryset.filter(filters).annotate(
+            pertinence=Case(
+                When(**{f'{self.lookups[0]}__istartswith': terms[0]}, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('pertinence', self.lookups[0], 'pk')
+
+
+produit_index = SearchIndex(
+    Produit,
+    table='produits_produit_fts',
+    columns=['name', 'description', 'categorie'],
+    weights=[10.0, 1.0, 3.0],
+    source=(
+        "SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(c.nom, '') "
+        "FROM produits_produit p LEFT JOIN produits_categorie c ON c.id = p.categorie_id"
+    ),
+    key='p.id',
+    lookups=['name', 'description', 'categorie__nom'],
+    fulltext=['name', 'description'],
+)
+
+categorie_index = SearchIndex(
+    Categorie,
+    table='produits_categorie_fts',
+    columns=['nom', 'description'],
+    weights=[10.0, 1.0],
+    source="SELECT id, nom, COALESCE(description, '') FROM produits_categorie",
+    key='id',
+    lookups=['nom', 'description'],
+    fulltext=['nom', 'description'],
+)
+
+INDEXES = (produit_index, categorie_index)
+
+
+@receiver(post_save, sender=Produit, dispatch_uid='produits_search_produit_save')
+@receiver(post_delete, sender=Produit, dispatch_uid='produits_search_produit_delete')
+def index_produit(sender, instance, raw=False, **kwargs):
+    if not raw:
+        produit_index.index([instance.pk])
+
+
+@receiver(post_save, sender=Categorie, dispatch_uid='produits_search_categorie_save')
+def index_categorie(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    categorie_index.index([instance.pk])
+    # Le nom de la catégorie fait partie de l'index des produits
+    produit_index.index(Produit.objects.filter(categorie=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Categorie, dispatch_uid='produits_search_categorie_pre_delete')
+def remember_categorie_produits(sender, instance, **kwargs):
+    instance._search_produits = list(instance.produits.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Categorie, dispatch_uid='produits_search_categorie_delete')
+def unindex_categorie(sender, instance, **kwargs):
+    categorie_index.index([instance.pk])
+    # Produits passés sans catégorie (SET_NULL)
+    produit_index.index(getattr(instance, '_search_produits', []))
@@ -2,15 +2,17 @@
 from rest_framework import serializers
 from .models import Produit, Categorie
 from artisans.serializers import ArtisanSerializer
+from gestiart.images import variant_urls
 
 class ProduitSerializer(serializers.ModelSerializer):
     artisan_detail = ArtisanSerializer(source='artisan', read_only=True)
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Produit
         fields = [
             'id', 'name', 'description', 'categorie', 'artisan', 'artisan_detail',
-            'price', 'stock', 'numero_boutique', 'image'
+            'price', 'stock', 'numero_boutique', 'image', 'image_variants'
         ]
         read_only_fields = ['date_added']
         extra_kwargs = {
@@ -20,6 +22,10 @@ class ProduitSerializer(serializers.ModelSerializer):
             'stock': {'required': True, 'min_value': 0}
         }
 
+    def get_image_variants(self, obj):
+        # Miniatures WebP/JPEG (voir gestiart/images.py), None tant qu'elles ne sont pas calculées
+        return variant_urls(obj.image, self.context.get('request'))
+
     def validate_artisan(self, value):
         if not value:
             raise serializers.ValidationError("Un artisan doit être sélectionné")
@@ -1,13 +1,24 @@
 # produits/tests.py
+import os
+import time
+from io import StringIO
+from unittest import skipUnless
+
+import numpy as np
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Categorie, Produit
+from .forecast import HISTORIQUE_JOURS, compute_forecasts
+from .models import Categorie, PrevisionStock, Produit
+from .search import produit_index
 from artisans.models import Artisan
+from ventes.tests import creer_artisan, creer_produit
 
 User = get_user_model()
 
+
 class ProduitTests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -40,4 +51,134 @@ class ProduitTests(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Produit.objects.count(), 1)
-        self.assertEqual(Produit.objects.get().name, 'Produit de test')
\ No newline at end of file
+        self.assertEqual(Produit.objects.get().name, 'Produit de test')
+
+class PrevisionStockTests(APITestCase):
+    url = '/api/produits/low-stock/'
+
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.vase = creer_produit(self.artisan, stock=25, name='Vase', price='5.00')
+        self.bol = creer_produit(self.artisan, stock=100, name='Bol', price='2.00')
+        self.panier = creer_produit(self.autre, stock=0, name='Panier', price='7.00')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def vendre(self, produit, quantity):
+        response = self.client.post('/api/ventes/', {
+            'artisan': produit.artisan_id,
+            'nom_du_client': 'Client',
+            'lignes_vente': [{'product_id': produit.pk, 'quantity': quantity}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_calcul_vectorise(self):
+        ventes = np.zeros((3, HISTORIQUE_JOURS))
+        ventes[0, -1] = 10      # 10 ventes aujourd'hui
+        ventes[1, :] = 2        # 2 ventes par jour, régulièrement
+        resultats = compute_forecasts(np.array([15, 30, 0]), ventes, lead_time=7)
+
+        self.assertAlmostEqual(resultats['daily_velocity'][0], 10 / 7)
+        self.assertEqual(resultats['daily_velocity'][1], 2)
+        self.assertEqual(resultats['reorder_point'].tolist(), [18, 14, 0])
+        self.assertEqual(resultats['days_of_cover'][1], 15)
+        # Panier : stock nul mais jamais vendu, pas de rupture à prévoir
+        self.assertEqual(resultats['is_low'].tolist(), [True, False, False])
+
+    def test_liste_des_stocks_bas(self):
+        self.vendre(self.vase, 10)
+        self.vendre(self.bol, 1)
+        out = StringIO()
+        call_command('forecast_stock', stdout=out)
+        self.assertIn('3 produits analysés, 1 sous le point de commande', out.getvalue())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['produit'] for p in response.data], ['Vase'])
+        vase = response.data[0]
+        self.assertEqual((vase['stock'], vase['point_de_commande'], vase['jours_de_couverture']), (15, 18, 10.5))
+
+        # Un produit réapprovisionné sort de la liste sans attendre le prochain calcul
+        Produit.objects.filter(pk=self.vase.pk).update(stock=50)
+        self.assertEqual(self.client.get(self.url).data, [])
+
+        self.client.force_authenticate(user=self.artisan.user)
+        self.assertEqual(self.client.get(self.url).data, [])
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_tri_sur_le_stock_actuel(self):
+        self.vendre(self.vase, 10)
+        self.vendre(self.bol, 1)
+        call_command('forecast_stock', stdout=StringIO())
+        PrevisionStock.objects.filter(product=self.bol).update(
+            is_low=True, reorder_point=100, days_of_cover=0.5
+        )
+        # Le bol était le plus urgent au calcul, mais il a été réassorti
+        # depuis : le tri suit la couverture au stock actuel
+        response = self.client.get(self.url)
+        self.assertEqual([p['produit'] for p in response.data], ['Vase', 'Bol'])
+        couvertures = [p['jours_de_couverture'] for p in response.data]
+        self.assertEqual(couvertures, sorted(couvertures))
+
+
+class RechercheProduitsTests(APITestCase):
+    url = '/api/produits/'
+
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.poterie = Categorie.objects.create(nom='Poterie', description='Objets en terre cuite')
+        self.vase = creer_produit(self.artisan, name='Vase émaillé')
+        self.bol = creer_produit(self.artisan, name='Bol')
+        self.bol.categorie = self.poterie
+        self.bol.save()
+        self.lampe = creer_produit(self.artisan, name='Lampe')
+        self.lampe.description = 'Pied en forme de vase'
+        self.lampe.save()
+
+    def rechercher(self, q, url=None):
+        response = self.client.get(url or self.url, {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [p.get('name', p.get('nom')) for p in response.data]
+
+    def test_recherche_classee_par_pertinence(self):
+        # Le nom compte plus que la description ; préfixes et accents
+        self.assertEqual(self.rechercher('vase'), ['Vase émaillé', 'Lampe'])
+        self.assertEqual(self.rechercher('EMAIL'), ['Vase émaillé'])
+        self.assertEqual(self.rechercher('pot'), ['Bol'])
+        self.assertEqual(self.rechercher('vase pied'), ['Lampe'])
+        self.assertEqual(self.rechercher('"vase*" -'), ['Vase émaillé', 'Lampe'])
+        self.assertEqual(self.rechercher('terre', url='/api/categories/'), ['Poterie'])
+
+    def test_index_tenu_a_jour(self):
+        self.poterie.nom = 'Céramique'
+        self.poterie.save()
+        self.assertEqual(self.rechercher('ceram'), ['Bol'])
+        self.assertEqual(self.rechercher('pot'), [])
+
+        self.poterie.delete()
+        self.assertEqual(self.rechercher('ceram'), [])
+        self.assertEqual(self.rechercher('bol'), ['Bol'])
+
+        self.vase.delete()
+        self.assertEqual(self.rechercher('vase'), ['Lampe'])
+
+    @skipUnless(os.getenv('GESTIART_BENCHMARKS'), 'mesure de performance : définir GESTIART_BENCHMARKS=1')
+    def test_recherche_sur_cent_mille_produits(self):
+        Produit.objects.bulk_create([
+            Produit(name=f'Produit {i} {mot}', price='1.00', artisan=self.artisan)
+            for i, mot in zip(range(100_000), ['panier', 'tapis', 'collier', 'sac'] * 25_000)
+        ], batch_size=2000)
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        debut = time.perf_counter()
+        resultats = list(produit_index.search(Produit.objects.all(), 'coll 4242')[:20])
+        duree = (time.perf_counter() - debut) * 1000
+        self.assertEqual(
+            [p.name for p in resultats],
+            ['Produit 4242 collier', 'Produit 42422 collier', 'Produit 42426 collier']
+        )
+        self.assertLess(duree, 100, f'{duree:.1f} ms pour 100 000 produits')
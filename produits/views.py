@@ -1,19 +1,34 @@
 # produits/views.py
 import logging
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
 from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import Produit, Categorie
+from .models import Produit, Categorie, PrevisionStock
+from .search import categorie_index, produit_index
 from .serializers import ProduitSerializer, CategorieSerializer
 from artisans.models import Artisan
 from django.shortcuts import get_object_or_404
+from users.permissions import IsAdminUser, IsArtisanUser, IsSecondaryAdminUser
 
 logger = logging.getLogger(__name__)
 
+# Nombre maximal de résultats d'une recherche (?q=)
+MAX_SEARCH_RESULTS = 100
+
 class CategorieViewSet(viewsets.ModelViewSet):
     queryset = Categorie.objects.all()
     serializer_class = CategorieSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        q = self.request.query_params.get('q')
+        if q and self.action == 'list':
+            queryset = categorie_index.search(queryset, q)[:MAX_SEARCH_RESULTS]
+        return queryset
+
     def create(self, request, *args, **kwargs):
         nom = request.data.get('nom', '').lower().strip()
         if nom and Categorie.objects.filter(nom__iexact=nom).exists():
@@ -37,6 +52,11 @@ class ProduitViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(categorie_id=categorie)
         if artisan:
             queryset = queryset.filter(artisan_id=artisan)
+
+        # Recherche plein texte (?q=), résultats classés par pertinence
+        q = self.request.query_params.get('q')
+        if q and self.action == 'list':
+            queryset = produit_index.search(queryset, q)[:MAX_SEARCH_RESULTS]
             
         return queryset
 
@@ -91,8 +111,54 @@ class ProduitViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'], url_path='low-stock')
+    def low_stock(self, request):
+        """
+        Produits dont le stock est passé sous le point de commande, du plus
+        urgent au moins urgent (jours de couverture croissants). Les prévisions
+        sont calculées par la commande forecast_stock ; le stock et les jours
+        de couverture suivent le stock actuel, et un produit réapprovisionné
+        depuis sort de la liste. Les produits sans vente sur la période n'y
+        figurent pas. Filtres : artisan, categorie. Un artisan ne voit que ses
+        produits.
+        """
+        previsions = PrevisionStock.objects.filter(
+            is_low=True,
+            daily_velocity__gt=0,
+            product__stock__lte=F('reorder_point')
+        ).annotate(
+            # Couverture au stock actuel, calculée une fois pour le tri et la réponse
+            couverture=Cast('product__stock', FloatField()) / F('daily_velocity')
+        ).select_related('product').order_by('couverture', 'product_id')
+
+        user = request.user
+        if user.user_type == 'artisan':
+            previsions = previsions.filter(product__artisan_id=user.artisan_shop.pk)
+        for name in ('artisan', 'categorie'):
+            value = request.query_params.get(name)
+            if value:
+                if not value.isdigit():
+                    return Response({name: ["Identifiant invalide."]}, status=status.HTTP_400_BAD_REQUEST)
+                previsions = previsions.filter(**{f'product__{name}_id': value})
+
+        return Response([
+            {
+                'produit_id': prevision.product_id,
+                'produit': prevision.product.name,
+                'artisan': prevision.product.artisan_id,
+                'stock': prevision.product.stock,
+                'ventes_par_jour': prevision.daily_velocity,
+                'jours_de_couverture': round(prevision.couverture, 1),
+                'point_de_commande': prevision.reorder_point,
+                'calcule_le': prevision.computed_at,
+            }
+            for prevision in previsions
+        ])
+
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action == 'low_stock':
+            permission_classes = [IsAdminUser | IsSecondaryAdminUser | IsArtisanUser]
+        elif self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAdminUser]
         else:
             permission_classes = [permissions.IsAuthenticatedOrReadOnly]
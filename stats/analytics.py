@@ -0,0 +1,474 @@
+# stats/analytics.py
+"""
+Moteur d'analyse en colonnes des lignes de vente (NumPy).
+
+Les lignes de vente, jointes au jour et à l'artisan de la vente, sont chargées en tableaux NumPy (une colonne par
+champ). Les regroupements, tableaux croisés et percentiles sont ensuite
+calculés de façon vectorisée (np.unique, np.bincount), sans ORM : un tableau
+croisé sur quelques millions de lignes prend une fraction de seconde.
+
+Chaque processus garde les colonnes en mémoire (get_columns) :
+
+- après de nouvelles ventes (étiquette de cache `sales`), seules les lignes
+  des ventes plus récentes que le dernier chargement sont ajoutées ;
+- après une modification de ventes existantes (étiquette `sale_edits`), les
+  colonnes sont rechargées en entier.
+
+Si STATS_COLUMNS_DIR est défini, la commande build_sales_columns écrit les
+colonnes sur disque (fichiers .npy par lots, ouverts en memory-map) : un
+processus qui démarre part de ces fichiers et ne lit en base que les ventes
+plus récentes. Les modifications de ventes existantes ne sont reprises sur
+disque qu'à la reconstruction (build_sales_columns --rebuild, à planifier).
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from produits.models import Produit
+from ventes.models import LigneVente
+from ventes.signals import sale_day
+from .cache import tag_versions
+
+# (nom, dtype) des colonnes
+COLUMNS = (
+    ('day', np.int32),         # jours depuis le 1970-01-01 (date locale de la vente)
+    ('vente', np.int32),       # code de la vente (indice dans vente_ids)
+    ('artisan', np.int32),
+    ('product', np.int32),
+    ('quantity', np.int32),
+    ('unit_price', np.float64),
+    ('revenue', np.float64),
+)
+
+# Marge de relecture avant la dernière vente chargée : sale_date est posée à
+# l'insertion, une vente validée après le chargement peut porter une date
+# légèrement antérieure.
+OVERLAP = timedelta(minutes=5)
+
+FETCH_CHUNK_SIZE = 5000
+
+# Au-delà, les lots sur disque sont fusionnés
+MAX_PARTS = 16
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+NO_CATEGORY = -1
+
+
+def day_number(day):
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+class SalesColumns:
+    """
+    Colonnes des lignes de vente en mémoire.
+
+    `vente_ids` associe le code de chaque vente à son UUID (16 octets) ;
+    `watermark` est la date de vente la plus récente chargée et `recent`
+    l'ensemble des ventes chargées depuis watermark - OVERLAP, pour ne pas
+    les relire deux fois.
+    """
+
+    def __init__(self, arrays=None, vente_ids=None, watermark=None, recent=()):
+        self.arrays = arrays or {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+        self.vente_ids = vente_ids if vente_ids is not None else np.empty(0, 'S16')
+        self.watermark = watermark
+        self.recent = set(recent)
+
+    def __len__(self):
+        return len(self.arrays['day'])
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def extend(self, other):
+        """Ajoute les lignes d'un jeu chargé après celui-ci (codes de vente déjà décalés)."""
+        watermark = max(filter(None, [self.watermark, other.watermark]), default=None)
+        return SalesColumns(
+            {name: np.concatenate([self.arrays[name], other.arrays[name]]) for name, _ in COLUMNS},
+            np.concatenate([self.vente_ids, other.vente_ids]),
+            watermark,
+            recent_sales(self.recent | other.recent, watermark),
+        )
+
+
+def recent_sales(sales, watermark):
+    """Ventes (UUID, date) encore dans la marge de relecture après `watermark`."""
+    if watermark is None:
+        return set(sales)
+    return {item for item in sales if item[1] >= watermark - OVERLAP}
+
+
+def fetch_columns(since=None, exclude=(), code_offset=0):
+    """
+    Charge depuis la base les lignes des ventes datées d'après `since`
+    (moins OVERLAP), hors ventes de `exclude` (ensemble de (UUID, date)).
+    """
+    lignes = LigneVente.objects.order_by()
+    if since is not None:
+        lignes = lignes.filter(vente__sale_date__gte=since - OVERLAP)
+    excluded = {vente_id for vente_id, _ in exclude}
+
+    columns = {name: [] for name, _ in COLUMNS}
+    codes = {}
+    recent = set()
+    watermark = since
+    rows = lignes.values_list(
+        'vente_id', 'vente__sale_date', 'vente__artisan_id', 'product_id', 'quantity', 'unit_price'
+    ).iterator(chunk_size=FETCH_CHUNK_SIZE)
+    for vente_id, sale_date, artisan_id, product_id, quantity, unit_price in rows:
+        if vente_id in excluded:
+            continue
+        code = codes.get(vente_id)
+        if code is None:
+            code = codes[vente_id] = code_offset + len(codes)
+            recent.add((vente_id, sale_date))
+            if watermark is None or sale_date > watermark:
+                watermark = sale_date
+        columns['day'].append(day_number(sale_day(sale_date)))
+        columns['vente'].append(code)
+        columns['artisan'].append(artisan_id)
+        columns['product'].append(product_id)
+        columns['quantity'].append(quantity)
+        columns['unit_price'].append(float(unit_price))
+
+    arrays = {name: np.array(columns[name], dtype) for name, dtype in COLUMNS if name != 'revenue'}
+    arrays['revenue'] = arrays['quantity'] * arrays['unit_price']
+    vente_ids = np.array([vente_id.bytes for vente_id in codes], 'S16') if codes else np.empty(0, 'S16')
+    return SalesColumns(arrays, vente_ids, watermark, recent_sales(recent, watermark))
+
+
+class ColumnStore:
+    """
+    Colonnes sur disque : un sous-dossier par lot (part-00001, ...) contenant
+    un fichier .npy par colonne, et meta.json (watermark et ventes récentes).
+    Un seul écrivain à la fois (la commande build_sales_columns).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def parts(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith('part-')
+        )
+
+    def exists(self):
+        return os.path.exists(self._meta_path())
+
+    def load(self):
+        """Colonnes du disque, ouvertes en memory-map (assemblées s'il y a plusieurs lots)."""
+        with open(self._meta_path(), encoding='utf-8') as f:
+            meta = json.load(f)
+        parts = self.parts()
+        if not parts:
+            return SalesColumns()
+        arrays = {}
+        for name in [name for name, _ in COLUMNS] + ['vente_ids']:
+            chunks = [np.load(os.path.join(part, f'{name}.npy'), mmap_mode='r') for part in parts]
+            arrays[name] = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+        vente_ids = arrays.pop('vente_ids')
+        watermark = datetime.fromisoformat(meta['watermark']) if meta['watermark'] else None
+        recent = {(uuid.UUID(vente_id), datetime.fromisoformat(sale_date))
+                  for vente_id, sale_date in meta['recent']}
+        return SalesColumns(arrays, vente_ids, watermark, recent)
+
+    def _write_part(self, directory, index, columns):
+        part = os.path.join(directory, f'part-{index:05d}')
+        os.makedirs(part)
+        for name, _ in COLUMNS:
+            np.save(os.path.join(part, f'{name}.npy'), columns[name])
+        np.save(os.path.join(part, 'vente_ids.npy'), columns.vente_ids)
+
+    def _write_meta(self, directory, columns):
+        meta = {
+            'watermark': columns.watermark.isoformat() if columns.watermark else None,
+            'recent': [[str(vente_id), sale_date.isoformat()] for vente_id, sale_date in columns.recent],
+        }
+        tmp = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, 'meta.json'))
+
+    def rebuild(self, columns):
+        """Remplace tout le contenu par `columns` (un seul lot)."""
+        parent = os.path.dirname(os.path.abspath(self.directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = f'{self.directory}.tmp-{uuid.uuid4().hex}'
+        os.makedirs(tmp)
+        self._write_part(tmp, 1, columns)
+        self._write_meta(tmp, columns)
+        old = f'{self.directory}.old-{uuid.uuid4().hex}'
+        if os.path.isdir(self.directory):
+            os.rename(self.directory, old)
+        os.rename(tmp, self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def append(self, new_columns, all_columns):
+        """Ajoute un lot ; fusionne les lots quand ils deviennent trop nombreux."""
+        parts = self.parts()
+        if len(parts) >= MAX_PARTS:
+            self.rebuild(all_columns)
+            return
+        if len(new_columns) or len(new_columns.vente_ids):
+            last = int(os.path.basename(parts[-1])[5:]) if parts else 0
+            self._write_part(self.directory, last + 1, new_columns)
+        self._write_meta(self.directory, all_columns)
+
+
+def refresh(columns):
+    """
+    Ajoute aux colonnes les lignes des ventes enregistrées depuis leur
+    chargement. Retourne (colonnes complétées, lignes ajoutées).
+    """
+    new = fetch_columns(columns.watermark, columns.recent, code_offset=len(columns.vente_ids))
+    return columns.extend(new), new
+
+
+def get_store():
+    directory = getattr(settings, 'STATS_COLUMNS_DIR', None)
+    return ColumnStore(directory) if directory else None
+
+
+class _ColumnsCache:
+    """Colonnes du processus, rafraîchies selon les étiquettes sales et sale_edits."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = None
+        self.versions = None
+
+    def get(self):
+        sales, edits = tag_versions(['sales', 'sale_edits'])
+        with self.lock:
+            if self.columns is None or self.versions[1] != edits:
+                store = get_store()
+                if self.columns is None and store is not None and store.exists():
+                    self.columns = refresh(store.load())[0]
+                else:
+                    self.columns = fetch_columns()
+            elif self.versions[0] != sales:
+                self.columns = refresh(self.columns)[0]
+            self.versions = (sales, edits)
+            return self.columns
+
+    def clear(self):
+        with self.lock:
+            self.columns = self.versions = None
+
+
+columns_cache = _ColumnsCache()
+
+
+def get_columns():
+    return columns_cache.get()
+
+
+def product_categories():
+    """Tableau id de produit -> id de catégorie (NO_CATEGORY si aucune)."""
+    rows = np.array(
+        [(pk, NO_CATEGORY if categorie_id is None else categorie_id)
+         for pk, categorie_id in Produit.objects.values_list('pk', 'categorie_id')],
+        dtype=np.int64
+    ).reshape(-1, 2)
+    lookup = np.full(rows[:, 0].max() + 1 if len(rows) else 0, NO_CATEGORY, np.int32)
+    lookup[rows[:, 0]] = rows[:, 1]
+    return lookup
+
+
+class Frame:
+    """
+    Colonnes à analyser, complétées de la catégorie actuelle des produits
+    (lue à chaque analyse : les changements de catégorie sont pris en compte
+    sans recharger les lignes).
+    """
+
+    def __init__(self, columns, categories):
+        self.columns = columns
+        self.categories = categories
+        self._categorie = None
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, name):
+        if name != 'categorie':
+            return self.columns[name]
+        if self._categorie is None:
+            products = self.columns['product']
+            known = products < len(self.categories)
+            self._categorie = np.full(len(products), NO_CATEGORY, np.int32)
+            self._categorie[known] = self.categories[products[known]]
+        return self._categorie
+
+
+def load_frame():
+    """Colonnes du processus, à jour, prêtes pour l'analyse."""
+    return Frame(get_columns(), product_categories())
+
+
+# --- Dimensions, filtres et agrégations -----------------------------------
+
+DIMENSIONS = ('artisan', 'categorie', 'produit', 'jour', 'mois', 'annee')
+VALUES = ('chiffre_affaires', 'quantite', 'lignes')
+MEASURES = ('panier_quantite', 'panier_montant', 'prix_unitaire')
+
+
+def dimension(columns, name):
+    """Valeurs entières d'une dimension, une par ligne."""
+    if name == 'artisan':
+        return columns['artisan']
+    if name == 'categorie':
+        return columns['categorie']
+    if name == 'produit':
+        return columns['product']
+    if name == 'jour':
+        return columns['day']
+    if name == 'mois':
+        return columns['day'].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if name == 'annee':
+        return columns['day'].astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64)
+    raise ValueError(f'Dimension inconnue : {name}')
+
+
+def dimension_labels(name, values):
+    """Libellés JSON des valeurs d'une dimension (dates ISO, ids, None)."""
+    if name == 'jour':
+        return [str(day) for day in values.astype('datetime64[D]')]
+    if name == 'mois':
+        return [str(month) for month in values.astype('datetime64[M]')]
+    if name == 'annee':
+        return [int(str(year)) for year in values.astype('datetime64[Y]')]
+    return [None if name == 'categorie' and value == NO_CATEGORY else int(value) for value in values]
+
+
+def value_column(columns, name):
+    if name == 'chiffre_affaires':
+        return columns['revenue']
+    if name == 'quantite':
+        return columns['quantity']
+    if name == 'lignes':
+        return None
+    raise ValueError(f'Valeur inconnue : {name}')
+
+
+def filter_mask(columns, date_debut=None, date_fin=None, artisan=None, categorie=None, produit=None):
+    """Masque booléen des lignes retenues par les filtres, ou None sans filtre."""
+    mask = None
+
+    def combine(condition):
+        return condition if mask is None else mask & condition
+
+    if date_debut is not None:
+        mask = combine(columns['day'] >= day_number(date_debut))
+    if date_fin is not None:
+        mask = combine(columns['day'] <= day_number(date_fin))
+    if artisan is not None:
+        mask = combine(columns['artisan'] == artisan)
+    if categorie is not None:
+        mask = combine(columns['categorie'] == categorie)
+    if produit is not None:
+        mask = combine(columns['product'] == produit)
+    return mask
+
+
+def _select(array, mask):
+    return array if mask is None else array[mask]
+
+
+def _weights(columns, value, mask):
+    weights = value_column(columns, value)
+    return None if weights is None else _select(weights, mask).astype(np.float64)
+
+
+def group_by(columns, keys, value='chiffre_affaires', mask=None):
+    """
+    Somme de `value` par combinaison des dimensions `keys`.
+    Retourne (libellés par dimension, sommes), triés par clés.
+    """
+    uniques, codes = [], []
+    for key in keys:
+        unique, inverse = np.unique(_select(dimension(columns, key), mask), return_inverse=True)
+        uniques.append(unique)
+        codes.append(inverse.ravel())
+    if not keys or not len(codes[0]):
+        return [[] for _ in keys], np.empty(0)
+
+    shape = tuple(len(unique) for unique in uniques)
+    if math.prod(shape) <= np.iinfo(np.intp).max:
+        flat = np.ravel_multi_index(codes, shape)
+        groups, inverse = np.unique(flat, return_inverse=True)
+        indices = np.unravel_index(groups, shape)
+    else:
+        # Trop de combinaisons pour un indice entier : regroupement des
+        # n-uplets de codes (plus lent, même ordre)
+        groups, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        indices = tuple(groups.T)
+    sums = np.bincount(inverse.ravel(), weights=_weights(columns, value, mask), minlength=len(groups))
+    labels = [dimension_labels(key, unique[index]) for key, unique, index in zip(keys, uniques, indices)]
+    return labels, sums
+
+
+def get_pivot_max_cells():
+    return getattr(settings, 'STATS_PIVOT_MAX_CELLS', 100_000)
+
+
+class PivotTooLarge(ValueError):
+    """Le tableau croisé demandé dépasse STATS_PIVOT_MAX_CELLS cellules."""
+
+    def __init__(self, cells, max_cells):
+        self.cells = cells
+        self.max_cells = max_cells
+        super().__init__(f'Tableau croisé trop grand : {cells} cellules ({max_cells} au maximum)')
+
+
+def pivot(columns, rows, cols, value='chiffre_affaires', mask=None):
+    """
+    Tableau croisé `rows` x `cols` de la somme de `value` (matrice dense).
+    Lève PivotTooLarge au-delà de STATS_PIVOT_MAX_CELLS cellules, avant
+    d'allouer la matrice.
+    """
+    row_values, row_codes = np.unique(_select(dimension(columns, rows), mask), return_inverse=True)
+    col_values, col_codes = np.unique(_select(dimension(columns, cols), mask), return_inverse=True)
+    size = len(row_values) * len(col_values)
+    if size > get_pivot_max_cells():
+        raise PivotTooLarge(size, get_pivot_max_cells())
+    flat = row_codes.ravel().astype(np.int64) * len(col_values) + col_codes.ravel()
+    matrix = np.bincount(flat, weights=_weights(columns, value, mask), minlength=size)
+    return (
+        dimension_labels(rows, row_values),
+        dimension_labels(cols, col_values),
+        matrix.reshape(len(row_values), len(col_values)),
+    )
+
+
+def measure(columns, name, mask=None):
+    """Valeurs d'une mesure : taille des paniers (par vente) ou prix unitaires (par ligne)."""
+    if name == 'prix_unitaire':
+        return _select(columns['unit_price'], mask)
+    if name not in ('panier_quantite', 'panier_montant'):
+        raise ValueError(f'Mesure inconnue : {name}')
+    ventes = _select(columns['vente'], mask)
+    weights = _select(columns['quantity' if name == 'panier_quantite' else 'revenue'], mask)
+    totals = np.bincount(ventes, weights=weights.astype(np.float64))
+    return totals[np.unique(ventes)]
+
+
+def percentiles(values, q):
+    """Percentiles `q` (0-100) des valeurs, None si elles sont vides."""
+    if not len(values):
+        return [None] * len(q)
+    return np.percentile(values, q).tolist()
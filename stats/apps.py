@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class StatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stats'
+
+    def ready(self):
+        # Abonne les agrégats journaliers, les classements et le cache des
+        # vues aux écritures de ventes
+        from . import cache, categories, leaderboard, rollups  # noqa: F401
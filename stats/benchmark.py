@@ -0,0 +1,105 @@
+# stats/benchmark.py
+"""
+Banc d'essai des vues de statistiques : jeu de ventes synthétique et mesure
+des latences (p50, p95). Utilisé par la commande benchmark_dashboard, sur une
+base de développement uniquement.
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from artisans.models import Artisan
+from produits.models import Produit
+from ventes.models import LigneVente, Vente
+from .leaderboard import reconcile_leaderboard
+from .rollups import rebuild_rollups
+
+CENTIME = Decimal('0.01')
+
+
+def seed_sales(lignes, jours=365, artisans=20, produits=200, lignes_par_vente=3, seed=0):
+    """
+    Crée `lignes` lignes de vente réparties sur les `jours` derniers jours
+    (écritures en lot, sans signaux), puis reconstruit les agrégats et les
+    classements. Retourne le nombre de ventes créées.
+    """
+    rng = np.random.default_rng(seed)
+    lot = uuid.uuid4().hex[:8]
+    User = get_user_model()
+    boutiques = [
+        Artisan.objects.create(
+            user=User.objects.create_user(email=f'bench-{lot}-{i}@example.com', user_type='artisan'),
+            numero_boutique=f'BENCH-{lot}-{i}', prenom='Banc', nom=f'Essai {i}',
+            telephone='000000000', specialite='Banc d\'essai'
+        )
+        for i in range(artisans)
+    ]
+    catalogue = [
+        Produit.objects.create(
+            name=f'Produit {lot}-{i}', price=Decimal(int(rng.integers(100, 10000))) / 100,
+            stock=10 ** 6, artisan=boutiques[i % artisans]
+        )
+        for i in range(produits)
+    ]
+    par_artisan = [catalogue[i::artisans] for i in range(artisans)]
+
+    nb_ventes = -(-lignes // lignes_par_vente)
+    ventes_par_jour = np.bincount(rng.integers(0, jours, nb_ventes), minlength=jours)
+    today = timezone.localdate()
+    restantes = lignes
+    numero = 0
+    for offset, count in enumerate(ventes_par_jour.tolist()):
+        if not count:
+            continue
+        day = today - timedelta(days=jours - 1 - offset)
+        ventes, lignes_vente = [], []
+        for artisan_index in rng.integers(0, artisans, count).tolist():
+            numero += 1
+            vente = Vente(artisan=boutiques[artisan_index], numero_vente=f'BENCH-{lot}-{numero}')
+            nb_lignes = min(lignes_par_vente, restantes)
+            restantes -= nb_lignes
+            choix = par_artisan[artisan_index]
+            total, quantite = Decimal('0'), 0
+            for product_index, quantity in zip(
+                rng.integers(0, len(choix), nb_lignes).tolist(),
+                rng.integers(1, 5, nb_lignes).tolist()
+            ):
+                produit = choix[product_index]
+                lignes_vente.append(LigneVente(
+                    vente=vente, product=produit, quantity=quantity, unit_price=produit.price
+                ))
+                total += quantity * produit.price
+                quantite += quantity
+            vente.total_amount = total.quantize(CENTIME)
+            vente.products_count = nb_lignes
+            vente.total_quantity = quantite
+            ventes.append(vente)
+
+        with transaction.atomic():
+            Vente.objects.bulk_create(ventes, batch_size=1000)
+            # sale_date est posée à l'insertion : on la ramène au jour voulu
+            Vente.objects.filter(pk__in=[vente.pk for vente in ventes]).update(
+                sale_date=timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+            )
+            LigneVente.objects.bulk_create(lignes_vente, batch_size=1000)
+
+    rebuild_rollups(today - timedelta(days=jours - 1), today)
+    reconcile_leaderboard(fix=True)
+    return numero
+
+
+def measure(call, requetes):
+    """Exécute `call` `requetes` fois ; retourne (p50, p95) en millisecondes."""
+    durees = []
+    for _ in range(requetes):
+        debut = time.perf_counter()
+        call()
+        durees.append((time.perf_counter() - debut) * 1000)
+    p50, p95 = np.percentile(durees, [50, 95])
+    return round(float(p50), 2), round(float(p95), 2)
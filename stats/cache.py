@@ -0,0 +1,254 @@
+# stats/cache.py
+"""
+Cache des réponses des vues de statistiques, invalidé par étiquettes.
+
+Chaque réponse est rangée sous une clé qui contient la version courante des
+étiquettes dont elle dépend (`sales`, `products`, `artisans` ; `sale_edits`
+ne change que lorsqu'une vente existante est modifiée). Une écriture
+sur les ventes, les produits ou les artisans change la version de l'étiquette
+(après le commit de la transaction) : les anciennes entrées ne sont plus
+jamais lues et expirent d'elles-mêmes.
+
+Les versions sont des jetons aléatoires et non des compteurs : une version
+évincée du cache est remplacée par un nouveau jeton, qui ne peut pas
+retomber sur d'anciennes entrées.
+
+Quand plusieurs requêtes manquent la même entrée en même temps, une seule
+recalcule la réponse (verrou par clé dans le processus, plus un verrou
+posé dans le cache pour les autres processus) ; les autres attendent puis
+lisent le résultat. Les réponses en flux (bulletin) sont mises en cache au
+fil de leur envoi, sans ce verrou.
+
+Les versions des étiquettes vivent dans le cache Django : avec le cache
+mémoire par défaut (LocMemCache, propre à chaque processus), une écriture
+n'invalide que le cache du processus qui l'a faite, et les autres servent
+des statistiques périmées jusqu'à STATS_CACHE_TIMEOUT. Avec plusieurs
+processus serveur, il faut un cache partagé (DJANGO_CACHE_DIR, ou tout
+moteur commun aux processus) ; manage.py check --deploy le signale.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Tags, Warning, register
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework.response import Response
+
+from artisans.models import Artisan
+from produits.models import Produit
+from ventes.models import LigneVente, Vente
+from ventes.signals import sales_changed
+
+# sale_edits : modifications de ventes existantes (et non simples créations)
+TAGS = ('sales', 'products', 'artisans', 'sale_edits')
+
+CACHE_PREFIX = 'stats:cache:'
+TAG_PREFIX = 'stats:tag:'
+LOCK_PREFIX = 'stats:lock:'
+
+# Attente maximale d'un calcul en cours dans un autre processus (secondes)
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_timeout():
+    return getattr(settings, 'STATS_CACHE_TIMEOUT', 300)
+
+
+def tag_versions(tags):
+    """Versions courantes des étiquettes, créées si elles n'existent pas."""
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_tags(*tags):
+    """Invalide les entrées liées aux étiquettes, après le commit en cours."""
+    def bump():
+        cache.set_many({TAG_PREFIX + tag: uuid.uuid4().hex for tag in tags}, None)
+    transaction.on_commit(bump)
+
+
+def _local_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def single_flight(key, compute, timeout):
+    """
+    Retourne la valeur en cache sous `key`, ou la calcule une seule fois
+    quelles que soient les requêtes concurrentes. Retourne (valeur, hit).
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value, True
+
+    with _local_lock(key):
+        value = cache.get(key)
+        if value is not None:
+            return value, True
+
+        # Verrou inter-processus : le premier qui le pose calcule
+        lock_key = LOCK_PREFIX + key
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value, True
+        try:
+            value = compute()
+            if value is not None:
+                cache.set(key, value, timeout)
+            return value, False
+        finally:
+            cache.delete(lock_key)
+            with _locks_guard:
+                _locks.pop(key, None)
+
+
+def request_cache_key(view, request, tags):
+    """Clé d'une requête : vue, périmètre de l'utilisateur, paramètres et versions."""
+    user = request.user
+    if user.user_type == 'artisan':
+        # Un compte artisan sans boutique ne partage pas les entrées des admins
+        shop = getattr(user, 'artisan_shop', None)
+        scope = f'artisan:{shop.pk if shop is not None else None}'
+    else:
+        scope = 'all'
+    params = '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(request.query_params.lists())
+        for value in values
+    )
+    # Paramètres hachés : la clé reste sous la limite de 250 caractères de memcached
+    params = hashlib.sha1(params.encode()).hexdigest()
+    versions = '.'.join(tag_versions(tags))
+    return f'{CACHE_PREFIX}{type(view).__name__}:{scope}:{params}:{versions}'
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Signale un cache propre à chaque processus : invalidation non partagée."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend.endswith('.LocMemCache'):
+        return [Warning(
+            "Le cache par défaut est propre à chaque processus : les statistiques "
+            "mises en cache ne sont invalidées que dans le processus qui écrit.",
+            hint="Avec plusieurs processus serveur, définir DJANGO_CACHE_DIR "
+                 "ou un autre cache partagé.",
+            id='stats.W001',
+        )]
+    return []
+
+
+def cached_stats_view(*tags):
+    """
+    Décorateur de la méthode get d'une APIView de statistiques.
+
+    Les réponses DRF sont gardées sous forme de données, avec un seul calcul
+    pour des requêtes concurrentes. Les réponses en flux restent envoyées en
+    flux : elles sont gardées quand le client les a lues en entier (dans la
+    limite de STATS_CACHE_MAX_BYTES), sans protection contre les calculs
+    concurrents. L'en-tête X-Cache indique HIT ou MISS.
+    """
+    for tag in tags:
+        if tag not in TAGS:
+            raise ValueError(f'Étiquette de cache inconnue : {tag}')
+
+    def decorator(get):
+        @wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            responses = []
+
+            def compute():
+                response = get(view, request, *args, **kwargs)
+                responses.append(response)
+                if isinstance(response, Response) and response.status_code == 200:
+                    return ('data', response.data, {})
+                return None
+
+            key = request_cache_key(view, request, tags)
+            stored, hit = single_flight(key, compute, get_timeout())
+            if responses:
+                response = responses[0]
+                if (isinstance(response, StreamingHttpResponse)
+                        and not isinstance(response, FileResponse)
+                        and response.status_code == 200):
+                    response.streaming_content = _cache_stream(
+                        key, response.streaming_content, response
+                    )
+            elif stored[0] == 'data':
+                response = Response(stored[1])
+            else:
+                response = HttpResponse(stored[1])
+                for name, value in stored[2].items():
+                    response[name] = value
+            response['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _cache_stream(key, chunks, response):
+    """Relaie le contenu en flux et le garde en cache s'il a été lu en entier."""
+    max_bytes = getattr(settings, 'STATS_CACHE_MAX_BYTES', 5 * 1024 * 1024)
+    headers = {
+        name: value for name, value in response.items()
+        if name.lower() in ('content-type', 'content-disposition')
+    }
+    body = []
+    size = 0
+    for chunk in chunks:
+        if size <= max_bytes:
+            body.append(chunk)
+            size += len(chunk)
+        yield chunk
+    if size <= max_bytes:
+        cache.set(key, ('content', b''.join(body), headers), get_timeout())
+
+
+@receiver(sales_changed, dispatch_uid='stats_cache_sales_changed')
+def invalidate_on_sales_changed(sender, created=False, **kwargs):
+    # Couvre aussi les écritures en lot (bulk_create) sans post_save ;
+    # les ventes modifient les stocks, donc les produits.
+    if created:
+        bump_tags('sales', 'products')
+    else:
+        bump_tags('sales', 'products', 'sale_edits')
+
+
+@receiver(post_save, sender=Vente, dispatch_uid='stats_cache_vente_save')
+@receiver(post_delete, sender=Vente, dispatch_uid='stats_cache_vente_delete')
+@receiver(post_save, sender=LigneVente, dispatch_uid='stats_cache_ligne_save')
+@receiver(post_delete, sender=LigneVente, dispatch_uid='stats_cache_ligne_delete')
+def invalidate_sales(sender, **kwargs):
+    bump_tags('sales')
+
+
+@receiver(post_save, sender=Produit, dispatch_uid='stats_cache_produit_save')
+@receiver(post_delete, sender=Produit, dispatch_uid='stats_cache_produit_delete')
+def invalidate_products(sender, **kwargs):
+    bump_tags('products')
+
+
+@receiver(post_save, sender=Artisan, dispatch_uid='stats_cache_artisan_save')
+@receiver(post_delete, sender=Artisan, dispatch_uid='stats_cache_artisan_delete')
+def invalidate_artisans(sender, **kwargs):
+    bump_tags('artisans')
@@ -0,0 +1,269 @@
+# stats/categories.py
+"""
+Compteurs par catégorie (CategoryStats) : chiffre d'affaires et quantités
+vendues, nombre de produits, produits en stock, unités et valeur du stock
+(stock x prix), par artisan et pour tous les artisans.
+
+Chaque événement ajoute des variations aux compteurs en un seul upsert :
+
+- sales_changed (écritures de ventes) : chiffre d'affaires et quantités ;
+- stock_changed (réservations et remises en stock des ventes) : stock ;
+- enregistrement ou suppression d'un Produit : on retire la contribution de
+  son ancien état et on ajoute celle du nouveau (prix, stock, catégorie,
+  artisan) ; un changement de catégorie déplace aussi ses ventes.
+
+Les ventes sont comptées dans la catégorie actuelle du produit, comme le
+recalcul : reconcile_category_stats (commande du même nom) recalcule tout à
+partir des produits et des lignes de vente, et corrige les écarts (par
+exemple après une modification directe en base).
+"""
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from produits.models import Categorie, Produit
+from ventes.models import LigneVente
+from ventes.signals import sales_changed, stock_changed
+from .models import CategoryStats
+from .rollups import add_increments, upsert_increments
+
+KEY_FIELDS = ['artisan_key', 'categorie_key']
+
+COUNTERS = ('revenue', 'quantity_sold', 'products_count', 'active_products', 'stock_units', 'stock_value')
+
+CENTIME = Decimal('0.01')
+
+# État d'un produit pris en compte : (artisan, catégorie, prix, stock)
+STATE_FIELDS = ('artisan_id', 'categorie_id', 'price', 'stock')
+
+
+def category_key(categorie_id):
+    return CategoryStats.NO_CATEGORY if categorie_id is None else categorie_id
+
+
+def _add(increments, artisan_id, categorie_id, **values):
+    """Ajoute des variations pour l'artisan et pour le total de la catégorie."""
+    for artisan_key in (artisan_id, CategoryStats.ALL_ARTISANS):
+        add_increments(increments, (artisan_key, category_key(categorie_id)), **values)
+
+
+def _add_product(increments, state, sign):
+    artisan_id, categorie_id, price, stock = state
+    _add(
+        increments, artisan_id, categorie_id,
+        products_count=sign,
+        active_products=sign * (stock > 0),
+        stock_units=sign * stock,
+        stock_value=sign * stock * price
+    )
+
+
+def _move_sales(increments, product_id, old_categorie_id, new_categorie_id):
+    """Déplace les ventes d'un produit d'une catégorie à l'autre."""
+    ventes = LigneVente.objects.filter(product_id=product_id).values('vente__artisan_id').annotate(
+        quantite=Sum('quantity'),
+        montant=Sum(
+            F('quantity') * F('unit_price'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+    ).order_by()
+    for row in ventes:
+        quantite = row['quantite'] or 0
+        montant = Decimal(row['montant'] or 0).quantize(CENTIME)
+        _add(increments, row['vente__artisan_id'], old_categorie_id, revenue=-montant, quantity_sold=-quantite)
+        _add(increments, row['vente__artisan_id'], new_categorie_id, revenue=montant, quantity_sold=quantite)
+
+
+def _db_state(product_id):
+    return Produit.objects.filter(pk=product_id).values_list(*STATE_FIELDS).first()
+
+
+@receiver(sales_changed, dispatch_uid='stats_categories_sales')
+def update_sales(sender, lines=(), **kwargs):
+    lines = [line for line in lines if line.quantity or line.revenue]
+    if not lines:
+        return
+    categories = dict(
+        Produit.objects.filter(pk__in={line.product_id for line in lines}).values_list('pk', 'categorie_id')
+    )
+    increments = {}
+    for line in lines:
+        _add(
+            increments, line.artisan_id, categories.get(line.product_id),
+            revenue=line.revenue, quantity_sold=line.quantity
+        )
+    upsert_increments(CategoryStats, KEY_FIELDS, increments)
+
+
+@receiver(stock_changed, dispatch_uid='stats_categories_stock')
+def update_stock(sender, changes, **kwargs):
+    # Stock déjà mis à jour : l'ancien stock est le nouveau moins la variation
+    increments = {}
+    for product_id, artisan_id, categorie_id, price, stock in Produit.objects.filter(
+        pk__in=list(changes)
+    ).values_list('pk', *STATE_FIELDS):
+        delta = changes[product_id]
+        _add(
+            increments, artisan_id, categorie_id,
+            active_products=(stock > 0) - (stock - delta > 0),
+            stock_units=delta,
+            stock_value=delta * price
+        )
+    upsert_increments(CategoryStats, KEY_FIELDS, increments)
+
+
+@receiver(pre_save, sender=Produit, dispatch_uid='stats_categories_produit_pre_save')
+def remember_product_state(sender, instance, raw=False, **kwargs):
+    instance._categories_old_state = None if raw or instance.pk is None else _db_state(instance.pk)
+
+
+@receiver(post_save, sender=Produit, dispatch_uid='stats_categories_produit_save')
+def update_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_categories_old_state', None)
+    new = tuple(getattr(instance, field) for field in STATE_FIELDS)
+    if old is not None and update_fields is not None:
+        # Champs non enregistrés : la valeur en base n'a pas changé
+        saved = {Produit._meta.get_field(name).attname for name in update_fields}
+        new = tuple(
+            value if field in saved else old_value
+            for field, value, old_value in zip(STATE_FIELDS, new, old)
+        )
+    new = new[:2] + (Produit._meta.get_field('price').to_python(new[2]), new[3])
+    if old == new:
+        return
+    increments = {}
+    if old is not None:
+        _add_product(increments, old, -1)
+        if old[1] != new[1]:
+            _move_sales(increments, instance.pk, old[1], new[1])
+    _add_product(increments, new, 1)
+    upsert_increments(CategoryStats, KEY_FIELDS, increments)
+
+
+@receiver(pre_delete, sender=Produit, dispatch_uid='stats_categories_produit_pre_delete')
+def remember_deleted_product(sender, instance, **kwargs):
+    instance._categories_old_state = _db_state(instance.pk)
+
+
+@receiver(post_delete, sender=Produit, dispatch_uid='stats_categories_produit_delete')
+def remove_product(sender, instance, **kwargs):
+    old = getattr(instance, '_categories_old_state', None)
+    if old is not None:
+        increments = {}
+        _add_product(increments, old, -1)
+        upsert_increments(CategoryStats, KEY_FIELDS, increments)
+
+
+@receiver(post_delete, sender=Categorie, dispatch_uid='stats_categories_categorie_delete')
+def merge_deleted_category(sender, instance, **kwargs):
+    # Les produits passent sans catégorie (SET_NULL, sans signal) : leurs
+    # compteurs aussi
+    rows = list(CategoryStats.objects.filter(categorie_key=instance.pk))
+    increments = {}
+    for row in rows:
+        add_increments(
+            increments, (row.artisan_key, CategoryStats.NO_CATEGORY),
+            **{name: getattr(row, name) for name in COUNTERS}
+        )
+    upsert_increments(CategoryStats, KEY_FIELDS, increments)
+    CategoryStats.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+
+def category_stats(artisan=None):
+    """
+    Compteurs d'un artisan (ou de tous), une entrée par catégorie, avec le
+    nom de la catégorie ; les catégories sans produit ni vente sont omises.
+    """
+    rows = CategoryStats.objects.filter(
+        artisan_key=CategoryStats.ALL_ARTISANS if artisan is None else artisan
+    ).exclude(
+        **{name: 0 for name in COUNTERS}
+    ).order_by('categorie_key')
+    rows = list(rows)
+    noms = dict(Categorie.objects.filter(
+        pk__in=[row.categorie_key for row in rows if row.categorie_key]
+    ).values_list('pk', 'nom'))
+    return [
+        {
+            'categorie_id': row.categorie_key or None,
+            'categorie': noms.get(row.categorie_key),
+            'chiffre_affaires': row.revenue,
+            'quantite_vendue': row.quantity_sold,
+            'produits': row.products_count,
+            'produits_actifs': row.active_products,
+            'stock': row.stock_units,
+            'valeur_stock': row.stock_value,
+        }
+        for row in rows
+    ]
+
+
+def expected_category_stats():
+    """Compteurs recalculés à partir des produits et des lignes de vente : {clé: {compteur: valeur}}."""
+    increments = {}
+    produits = Produit.objects.values('artisan_id', 'categorie_id').annotate(
+        produits=Count('pk'),
+        actifs=Count('pk', filter=Q(stock__gt=0)),
+        unites=Sum('stock'),
+        valeur=Sum(
+            F('stock') * F('price'),
+            output_field=models.DecimalField(max_digits=16, decimal_places=2)
+        )
+    ).order_by()
+    for row in produits:
+        _add(
+            increments, row['artisan_id'], row['categorie_id'],
+            products_count=row['produits'],
+            active_products=row['actifs'],
+            stock_units=row['unites'] or 0,
+            stock_value=Decimal(row['valeur'] or 0).quantize(CENTIME)
+        )
+    ventes = LigneVente.objects.values('vente__artisan_id', 'product__categorie_id').annotate(
+        quantite=Sum('quantity'),
+        montant=Sum(
+            F('quantity') * F('unit_price'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )
+    ).order_by()
+    for row in ventes:
+        _add(
+            increments, row['vente__artisan_id'], row['product__categorie_id'],
+            quantity_sold=row['quantite'] or 0,
+            revenue=Decimal(row['montant'] or 0).quantize(CENTIME)
+        )
+    return {
+        key: {name: values.get(name, 0) for name in COUNTERS}
+        for key, values in increments.items()
+        if any(values.values())
+    }
+
+
+def reconcile_category_stats(fix=True):
+    """
+    Compare les compteurs aux produits et lignes de vente. Retourne (nombre
+    d'entrées attendues, liste des écarts (clé, stocké, attendu)) ; avec
+    `fix`, les compteurs sont remplacés par les valeurs recalculées.
+    """
+    with transaction.atomic():
+        expected = expected_category_stats()
+        stored = {
+            (row.artisan_key, row.categorie_key): {name: getattr(row, name) for name in COUNTERS}
+            for row in CategoryStats.objects.exclude(**{name: 0 for name in COUNTERS})
+        }
+        drift = [
+            (key, stored.get(key), expected.get(key))
+            for key in sorted(set(stored) | set(expected))
+            if stored.get(key) != expected.get(key)
+        ]
+        if fix and drift:
+            CategoryStats.objects.all().delete()
+            CategoryStats.objects.bulk_create([
+                CategoryStats(artisan_key=artisan_key, categorie_key=categorie_key, **values)
+                for (artisan_key, categorie_key), values in expected.items()
+            ], batch_size=500)
+    return len(expected), drift
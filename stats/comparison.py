@@ -0,0 +1,122 @@
+# stats/comparison.py
+"""
+Comparaison de deux périodes de ventes (ce mois-ci / le mois dernier...),
+par artisan, catégorie ou produit.
+
+Les deux périodes sont lues en une seule requête sur les agrégats
+journaliers : un GROUP BY sur la dimension, avec une somme filtrée par
+période pour chaque indicateur (SUM(...) FILTER (WHERE day BETWEEN ...)).
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from .models import DailyArtisanAggregate, DailySalesAggregate
+
+CENTIME = Decimal('0.01')
+
+PERIODES = ('mois', 'annee', 'semaine')
+
+# Dimension -> (clé, champs du libellé) dans les agrégats par produit
+DIMENSIONS = {
+    'artisan': ('artisan_id', ('artisan__prenom', 'artisan__nom')),
+    'categorie': ('product__categorie_id', ('product__categorie__nom',)),
+    'produit': ('product_id', ('product__name',)),
+}
+
+INDICATEURS = ('chiffre_affaires', 'quantite', 'ventes')
+
+
+def _same_day(day, year, month):
+    """Même jour du mois dans un autre mois, ramené au dernier jour si besoin."""
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def comparison_periods(periode, date_fin):
+    """
+    Période en cours jusqu'à `date_fin` et la même portion de la période
+    précédente : ((début, fin), (début de référence, fin de référence)).
+    """
+    if periode == 'semaine':
+        debut = date_fin - timedelta(days=date_fin.weekday())
+        return (debut, date_fin), (debut - timedelta(days=7), date_fin - timedelta(days=7))
+    if periode == 'annee':
+        return (
+            (date_fin.replace(month=1, day=1), date_fin),
+            (date(date_fin.year - 1, 1, 1), _same_day(date_fin, date_fin.year - 1, date_fin.month)),
+        )
+    year, month = (date_fin.year, date_fin.month - 1) if date_fin.month > 1 else (date_fin.year - 1, 12)
+    return (
+        (date_fin.replace(day=1), date_fin),
+        (date(year, month, 1), _same_day(date_fin, year, month)),
+    )
+
+
+def growth(actuel, reference):
+    """Évolution en pourcentage, None si la référence est nulle."""
+    if not reference:
+        return None
+    return round(float((actuel - reference) * 100 / reference), 1)
+
+
+def _valeurs(row, suffixe):
+    return {
+        'chiffre_affaires': Decimal(row[f'chiffre_affaires_{suffixe}'] or 0).quantize(CENTIME),
+        'quantite': row[f'quantite_{suffixe}'] or 0,
+        'ventes': row[f'ventes_{suffixe}'] or 0,
+    }
+
+
+def _comparaison(actuel, reference):
+    return {
+        'actuel': actuel,
+        'reference': reference,
+        'ecart': {name: actuel[name] - reference[name] for name in INDICATEURS},
+        'evolution_pct': {name: growth(actuel[name], reference[name]) for name in INDICATEURS},
+    }
+
+
+def compare_periods(actuel, reference, par='artisan', artisan=None, categorie=None):
+    """
+    Indicateurs des deux périodes (couples de dates incluses), leurs écarts
+    et évolutions, par valeur de la dimension `par` et au total.
+
+    Par artisan sans filtre de catégorie, `ventes` est le nombre de ventes ;
+    sinon c'est le nombre de lignes de vente (comme dans timeseries).
+    """
+    if par == 'artisan' and categorie is None:
+        queryset = DailyArtisanAggregate.objects.all()
+        ventes = 'sales_count'
+    else:
+        queryset = DailySalesAggregate.objects.all()
+        ventes = 'lines_count'
+    if artisan is not None:
+        queryset = queryset.filter(artisan_id=artisan)
+    if categorie is not None:
+        queryset = queryset.filter(product__categorie_id=categorie)
+
+    periodes = {'actuel': Q(day__range=actuel), 'reference': Q(day__range=reference)}
+    cle, libelle = DIMENSIONS[par]
+    rows = queryset.filter(periodes['actuel'] | periodes['reference']).values(cle, *libelle).annotate(**{
+        f'{indicateur}_{suffixe}': Sum(champ, filter=condition)
+        for suffixe, condition in periodes.items()
+        for indicateur, champ in (('chiffre_affaires', 'revenue'), ('quantite', 'quantity'), ('ventes', ventes))
+    }).order_by(cle)
+
+    groupes = []
+    totaux = {suffixe: dict.fromkeys(INDICATEURS, 0) for suffixe in periodes}
+    for row in rows:
+        valeurs = {suffixe: _valeurs(row, suffixe) for suffixe in periodes}
+        for suffixe, indicateurs in valeurs.items():
+            for name, value in indicateurs.items():
+                totaux[suffixe][name] += value
+        groupes.append({
+            'id': row[cle],
+            'nom': ' '.join(filter(None, (row[champ] for champ in libelle))) or None,
+            **_comparaison(valeurs['actuel'], valeurs['reference']),
+        })
+    for indicateurs in totaux.values():
+        indicateurs['chiffre_affaires'] = Decimal(indicateurs['chiffre_affaires']).quantize(CENTIME)
+    return groupes, _comparaison(totaux['actuel'], totaux['reference'])
@@ -0,0 +1,126 @@
+# stats/dashboard.py
+"""
+Tableau de bord des ventes (GET /api/stats/dashboard-stats/).
+
+Tout le tableau tient en deux requêtes indépendantes :
+
+- un GROUP BY par artisan sur les agrégats journaliers, avec des sommes
+  filtrées sur le mois en cours (Sum(..., filter=Q(...))) : les totaux
+  globaux et mensuels sont la somme de ces lignes ;
+- le top 5 des produits, lu dans les classements.
+
+Avec STATS_QUERY_THREADS >= 2, les deux requêtes partent en parallèle sur un
+petit pool de threads, chacun avec sa propre connexion.
+Dans une transaction en cours, elles restent dans le thread appelant : une
+autre connexion ne verrait pas les écritures non validées.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .leaderboard import top_products
+from .models import DailyArtisanAggregate
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_query_threads():
+    return getattr(settings, 'STATS_QUERY_THREADS', 0)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_query_threads(), thread_name_prefix='stats-query'
+            )
+        return _executor
+
+
+def _in_worker(call):
+    # Connexion propre au thread du pool, fermée ou gardée selon CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(*calls):
+    """Exécute des fonctions indépendantes (requêtes en lecture), résultats dans l'ordre."""
+    if len(calls) < 2 or get_query_threads() < 2 or connection.in_atomic_block:
+        return [call() for call in calls]
+    futures = [_get_executor().submit(_in_worker, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def month_bounds(now=None):
+    """Début du mois en cours et début du mois suivant (heure locale)."""
+    start = (now or timezone.localtime()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def artisan_rows(month_start, month_end):
+    mois = Q(day__gte=month_start.date(), day__lt=month_end.date())
+    return list(DailyArtisanAggregate.objects.values(
+        'artisan__id',
+        'artisan__prenom',
+        'artisan__nom'
+    ).annotate(
+        total_ventes=Sum('sales_count'),
+        chiffre_affaires=Sum('revenue'),
+        ventes_mois=Sum('sales_count', filter=mois),
+        produits_mois=Sum('quantity', filter=mois),
+        chiffre_affaires_mois=Sum('revenue', filter=mois)
+    ).order_by('artisan__id'))
+
+
+def top_product_rows(limit=5):
+    return list(top_products(limit=limit).values(
+        'product__id',
+        'product__name',
+        total_quantity=F('quantity'),
+        total_sales=F('revenue')
+    ))
+
+
+def dashboard_stats(now=None):
+    """Données du tableau de bord (voir DashboardStatsView)."""
+    start_date, end_date = month_bounds(now)
+    artisans, top_produits = run_concurrently(
+        lambda: artisan_rows(start_date, end_date),
+        top_product_rows,
+    )
+
+    mensuel = {'total_ventes': 0, 'total_produits': 0, 'chiffre_affaires': None}
+    total_ventes, total_sales = 0, Decimal('0')
+    stats_artisans = []
+    for row in artisans:
+        total_ventes += row['total_ventes'] or 0
+        total_sales += row['chiffre_affaires'] or 0
+        mensuel['total_ventes'] += row.pop('ventes_mois') or 0
+        mensuel['total_produits'] += row.pop('produits_mois') or 0
+        chiffre_affaires_mois = row.pop('chiffre_affaires_mois')
+        if chiffre_affaires_mois is not None:
+            mensuel['chiffre_affaires'] = (mensuel['chiffre_affaires'] or 0) + chiffre_affaires_mois
+        stats_artisans.append(row)
+
+    return {
+        'total_ventes': total_ventes,
+        'chiffre_affaires_total': float(total_sales),
+        'periode': {
+            'debut': start_date,
+            'fin': end_date
+        },
+        'top_produits': top_produits,
+        'stats_artisans': stats_artisans,
+        'stats_mensuelles': mensuel
+    }
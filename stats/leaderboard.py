@@ -0,0 +1,221 @@
+# stats/leaderboard.py
+"""
+Classements des produits les plus vendus (ProductLeaderboard).
+
+Chaque écriture de vente incrémente, en un seul upsert, les lignes de
+classement des produits concernés : portée globale, artisan et catégorie,
+fenêtre « tout » et fenêtres glissantes (7 et 30 jours). Lire un top N revient
+à parcourir N entrées de l'index (scope, scope_id, window, -quantity).
+
+Les fenêtres glissantes avancent d'un jour à la fois : advance_windows retire
+des classements les jours sortis de la fenêtre, en soustrayant les agrégats
+journaliers de ces jours. LeaderboardWindow garde pour chaque fenêtre le
+dernier jour retiré ; une vente n'est comptée dans une fenêtre que si son jour
+est postérieur, ce qui garantit qu'elle en sera retirée exactement une fois.
+Les fenêtres avancent sur le chemin d'écriture, à la première vente du jour,
+et par la commande reconcile_leaderboard --advance pour les jours sans vente ;
+les lectures n'écrivent jamais.
+
+Les changements de catégorie d'un produit ne sont pas répercutés sur les
+classements existants : reconcile_leaderboard (commande du même nom)
+recalcule tout à partir des lignes de vente et signale les écarts.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from produits.models import Produit
+from ventes.models import LigneVente
+from ventes.signals import sales_changed
+from .models import DailySalesAggregate, LeaderboardWindow, ProductLeaderboard
+from .rollups import add_increments, day_start, upsert_increments
+
+# Fenêtres de classement : nombre de jours, None pour « depuis toujours »
+WINDOWS = {'tout': None, '7j': 7, '30j': 30}
+ALL_TIME = 'tout'
+
+MAX_LIMIT = 100
+
+CENTIME = Decimal('0.01')
+
+KEY_FIELDS = ['scope', 'scope_id', 'window', 'product']
+
+# Jour pour lequel ce processus a déjà avancé les fenêtres
+_windows_checked_on = None
+
+
+def _scopes(artisan_id, categorie_id):
+    yield ProductLeaderboard.SCOPE_GLOBAL, 0
+    yield ProductLeaderboard.SCOPE_ARTISAN, artisan_id
+    if categorie_id is not None:
+        yield ProductLeaderboard.SCOPE_CATEGORIE, categorie_id
+
+
+def _add_product(increments, windows, artisan_id, categorie_id, product_id, quantity, revenue):
+    for scope, scope_id in _scopes(artisan_id, categorie_id):
+        for window in windows:
+            add_increments(
+                increments, (scope, scope_id, window, product_id),
+                quantity=quantity, revenue=revenue
+            )
+
+
+def apply_lines(lines):
+    """Reporte des variations de lignes de vente (LineDelta) sur les classements."""
+    lines = [line for line in lines if line.quantity or line.revenue]
+    if not lines:
+        return
+    categories = dict(
+        Produit.objects.filter(pk__in={line.product_id for line in lines}).values_list('pk', 'categorie_id')
+    )
+    expired = dict(LeaderboardWindow.objects.values_list('window', 'expired_through'))
+
+    increments = {}
+    for line in lines:
+        windows = [ALL_TIME] + [
+            window for window, days in WINDOWS.items()
+            if days is not None and window in expired and line.day > expired[window]
+        ]
+        _add_product(
+            increments, windows, line.artisan_id, categories.get(line.product_id),
+            line.product_id, line.quantity, line.revenue
+        )
+    upsert_increments(ProductLeaderboard, KEY_FIELDS, increments)
+
+
+@receiver(sales_changed, dispatch_uid='stats_leaderboard')
+def update_leaderboard(sender, lines=(), **kwargs):
+    ensure_windows_current()
+    apply_lines(lines)
+
+
+def _rollup_totals(**filters):
+    return DailySalesAggregate.objects.filter(**filters).values(
+        'artisan_id', 'product_id', 'product__categorie_id'
+    ).annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('revenue')
+    ).order_by()
+
+
+def advance_windows(today=None):
+    """
+    Retire des fenêtres glissantes les jours qui en sont sortis à la date
+    `today`. Une fenêtre encore jamais initialisée est remplie à partir des
+    agrégats journaliers.
+    """
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        cursors = LeaderboardWindow.objects.select_for_update().in_bulk()
+        for window, days in WINDOWS.items():
+            if days is None:
+                continue
+            target = today - timedelta(days=days)
+            cursor = cursors.get(window)
+            if cursor is not None and cursor.expired_through >= target:
+                continue
+
+            increments = {}
+            if cursor is None:
+                ProductLeaderboard.objects.filter(window=window).delete()
+                rows, sign = _rollup_totals(day__gt=target), 1
+            else:
+                rows, sign = _rollup_totals(day__gt=cursor.expired_through, day__lte=target), -1
+            for row in rows:
+                _add_product(
+                    increments, [window], row['artisan_id'], row['product__categorie_id'],
+                    row['product_id'], sign * row['total_quantity'], sign * row['total_revenue']
+                )
+            upsert_increments(ProductLeaderboard, KEY_FIELDS, increments)
+            ProductLeaderboard.objects.filter(window=window, quantity=0, revenue=0).delete()
+            LeaderboardWindow.objects.update_or_create(
+                window=window, defaults={'expired_through': target}
+            )
+
+
+def ensure_windows_current():
+    """Avance les fenêtres glissantes au plus une fois par jour et par processus."""
+    global _windows_checked_on
+    today = timezone.localdate()
+    if _windows_checked_on != today:
+        advance_windows(today)
+        _windows_checked_on = today
+
+
+def top_products(scope=ProductLeaderboard.SCOPE_GLOBAL, scope_id=0, window=ALL_TIME, limit=5):
+    """Top `limit` des produits d'un classement, par quantité vendue (lecture seule)."""
+    return ProductLeaderboard.objects.filter(
+        scope=scope, scope_id=scope_id, window=window, quantity__gt=0
+    ).order_by('-quantity', 'product_id')[:limit]
+
+
+def expected_leaderboard():
+    """Classements recalculés à partir des lignes de vente : {clé: (quantité, montant)}."""
+    montant = Sum(
+        F('quantity') * F('unit_price'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+    base = LigneVente.objects.values(
+        'vente__artisan_id', 'product_id', 'product__categorie_id'
+    ).annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=montant
+    ).order_by()
+    expired = dict(LeaderboardWindow.objects.values_list('window', 'expired_through'))
+
+    increments = {}
+    for window, days in WINDOWS.items():
+        if days is None:
+            rows = base
+        elif window in expired:
+            rows = base.filter(vente__sale_date__gte=day_start(expired[window] + timedelta(days=1)))
+        else:
+            continue
+        for row in rows:
+            _add_product(
+                increments, [window], row['vente__artisan_id'], row['product__categorie_id'],
+                row['product_id'], row['total_quantity'],
+                Decimal(row['total_revenue'] or 0).quantize(CENTIME)
+            )
+    return {
+        key: (values['quantity'], values['revenue'])
+        for key, values in increments.items()
+        if values['quantity'] or values['revenue']
+    }
+
+
+def reconcile_leaderboard(fix=True):
+    """
+    Compare les classements aux lignes de vente. Retourne (nombre d'entrées
+    attendues, liste des écarts (clé, stocké, attendu)) ; avec `fix`, les
+    fenêtres glissantes sont d'abord avancées puis les classements remplacés
+    par les valeurs recalculées. Sans `fix`, rien n'est écrit : les fenêtres
+    sont comparées telles qu'elles sont stockées.
+    """
+    if fix:
+        advance_windows()
+    with transaction.atomic():
+        expected = expected_leaderboard()
+        stored = {
+            (row.scope, row.scope_id, row.window, row.product_id): (row.quantity, row.revenue)
+            for row in ProductLeaderboard.objects.exclude(quantity=0, revenue=0)
+        }
+        drift = [
+            (key, stored.get(key), expected.get(key))
+            for key in sorted(set(stored) | set(expected), key=str)
+            if stored.get(key) != expected.get(key)
+        ]
+        if fix and drift:
+            ProductLeaderboard.objects.all().delete()
+            ProductLeaderboard.objects.bulk_create([
+                ProductLeaderboard(
+                    scope=scope, scope_id=scope_id, window=window, product_id=product_id,
+                    quantity=quantity, revenue=revenue
+                )
+                for (scope, scope_id, window, product_id), (quantity, revenue) in expected.items()
+            ], batch_size=500)
+    return len(expected), drift
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from stats.benchmark import measure, seed_sales
+from stats.dashboard import dashboard_stats, get_query_threads
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les latences p50/p95 du tableau de bord (dashboard-stats), requêtes "
+        "enchaînées puis en parallèle, hors cache. Avec --seed-lignes, crée d'abord "
+        "un jeu de ventes synthétique : base de développement uniquement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-lignes',
+            type=int,
+            default=0,
+            help="Nombre de lignes de vente synthétiques à créer (ex. 1000000)."
+        )
+        parser.add_argument(
+            '--jours',
+            type=int,
+            default=365,
+            help="Nombre de jours sur lesquels répartir les ventes (défaut : 365)."
+        )
+        parser.add_argument(
+            '--requetes',
+            type=int,
+            default=50,
+            help="Nombre de mesures par mode (défaut : 50)."
+        )
+
+    def handle(self, *args, **options):
+        if options['seed_lignes']:
+            ventes = seed_sales(options['seed_lignes'], jours=options['jours'])
+            self.stdout.write(f"{ventes} ventes et {options['seed_lignes']} lignes créées.")
+
+        threads = max(get_query_threads(), 2)
+        for mode, setting in (('enchaîné', 1), (f'parallèle ({threads} threads)', threads)):
+            with override_settings(STATS_QUERY_THREADS=setting):
+                dashboard_stats()  # préchauffage (connexions, fenêtres de classement)
+                p50, p95 = measure(dashboard_stats, options['requetes'])
+            self.stdout.write(self.style.SUCCESS(f"dashboard-stats, {mode} : p50 {p50} ms, p95 {p95} ms"))
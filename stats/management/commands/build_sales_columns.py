@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from stats.analytics import ColumnStore, fetch_columns, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Écrit les colonnes des lignes de vente dans STATS_COLUMNS_DIR pour le moteur "
+        "d'analyse (GET /api/stats/analytics/). Sans --rebuild, seules les ventes "
+        "enregistrées depuis le dernier passage sont ajoutées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="Recharge toutes les lignes (à planifier pour reprendre les ventes modifiées)."
+        )
+
+    def handle(self, *args, **options):
+        directory = getattr(settings, 'STATS_COLUMNS_DIR', None)
+        if not directory:
+            raise CommandError("STATS_COLUMNS_DIR n'est pas défini.")
+        store = ColumnStore(directory)
+
+        if options['rebuild'] or not store.exists():
+            columns = fetch_columns()
+            store.rebuild(columns)
+            added = len(columns)
+        else:
+            columns, new = refresh(store.load())
+            store.append(new, columns)
+            added = len(new)
+        self.stdout.write(self.style.SUCCESS(
+            f"{added} lignes ajoutées, {len(columns)} lignes au total."
+        ))
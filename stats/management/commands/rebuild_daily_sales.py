@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stats.rollups import rebuild_rollups
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Date invalide (AAAA-MM-JJ attendu) : {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les agrégats journaliers des ventes (par produit et par artisan) "
+        "à partir des ventes, fenêtre de jours par fenêtre de jours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depuis', help='Premier jour à reconstruire (AAAA-MM-JJ).')
+        parser.add_argument('--jusqua', help='Dernier jour à reconstruire (AAAA-MM-JJ).')
+        parser.add_argument(
+            '--jours-par-lot',
+            type=int,
+            default=31,
+            help='Nombre de jours reconstruits par transaction (défaut : 31).'
+        )
+
+    def handle(self, *args, **options):
+        start = _parse_day(options['depuis']) if options['depuis'] else None
+        end = _parse_day(options['jusqua']) if options['jusqua'] else None
+        if start and end and start > end:
+            raise CommandError("--depuis doit précéder --jusqua.")
+        if options['jours_par_lot'] < 1:
+            raise CommandError("--jours-par-lot doit être positif.")
+
+        days = rebuild_rollups(
+            start=start,
+            end=end,
+            days_per_chunk=options['jours_par_lot'],
+            stdout=self.stdout if options['verbosity'] > 1 else None
+        )
+        self.stdout.write(self.style.SUCCESS(f"{days} jours reconstruits."))
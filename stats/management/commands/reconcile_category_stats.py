@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from stats.categories import reconcile_category_stats
+
+# Nombre d'écarts détaillés dans la sortie
+MAX_DETAILS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les statistiques par catégorie (ventes, stock et valeur du stock) à "
+        "partir des produits et des lignes de vente, et corrige les écarts. Avec --check, "
+        "signale les écarts sans rien modifier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Vérifie seulement ; code de sortie 1 si des écarts sont trouvés.'
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        checked, drift = reconcile_category_stats(fix=not check_only)
+
+        for (artisan_key, categorie_key), stocke, attendu in drift[:MAX_DETAILS]:
+            self.stdout.write(
+                f"artisan {artisan_key} catégorie {categorie_key} : stocké {stocke}, attendu {attendu}"
+            )
+        if len(drift) > MAX_DETAILS:
+            self.stdout.write(f"... et {len(drift) - MAX_DETAILS} autres écarts.")
+
+        verbe = 'à corriger' if check_only else 'corrigés'
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} entrées par catégorie vérifiées, {len(drift)} écarts {verbe}."
+        ))
+        if check_only and drift:
+            raise SystemExit(1)
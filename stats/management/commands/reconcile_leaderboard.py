@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from stats.leaderboard import advance_windows, reconcile_leaderboard
+
+# Nombre d'écarts détaillés dans la sortie
+MAX_DETAILS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les classements des produits les plus vendus à partir des lignes "
+        "de vente et corrige les écarts. Avec --check, signale les écarts sans rien modifier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Vérifie seulement ; code de sortie 1 si des écarts sont trouvés.'
+        )
+        parser.add_argument(
+            '--advance',
+            action='store_true',
+            help='Avance seulement les fenêtres glissantes à la date du jour (tâche quotidienne).'
+        )
+
+    def handle(self, *args, **options):
+        if options['advance']:
+            advance_windows()
+            self.stdout.write(self.style.SUCCESS("Fenêtres glissantes avancées."))
+            return
+
+        check_only = options['check']
+        checked, drift = reconcile_leaderboard(fix=not check_only)
+
+        for (scope, scope_id, window, product_id), stocke, attendu in drift[:MAX_DETAILS]:
+            self.stdout.write(
+                f"{scope}:{scope_id} {window} produit {product_id} : stocké {stocke}, attendu {attendu}"
+            )
+        if len(drift) > MAX_DETAILS:
+            self.stdout.write(f"... et {len(drift) - MAX_DETAILS} autres écarts.")
+
+        verbe = 'à corriger' if check_only else 'corrigés'
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} entrées de classement vérifiées, {len(drift)} écarts {verbe}."
+        ))
+        if check_only and drift:
+            raise SystemExit(1)
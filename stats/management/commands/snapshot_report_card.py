@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from stats.report_card import REPORT_FORMATS, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Précalcule le bulletin des artisans (GET /api/stats/report-card/?snapshot=1) "
+        "dans STATS_SNAPSHOT_DIR. À planifier (cron) en dehors des heures de pointe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=[*REPORT_FORMATS, 'tous'],
+            default='tous',
+            help="Format de l'instantané (défaut : tous)."
+        )
+
+    def handle(self, *args, **options):
+        formats = list(REPORT_FORMATS) if options['format'] == 'tous' else [options['format']]
+        for format in formats:
+            path = write_snapshot(format)
+            self.stdout.write(self.style.SUCCESS(f"Bulletin écrit : {path}"))
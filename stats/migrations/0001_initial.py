@@ -0,0 +1,105 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:48
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    # Agrégats des ventes déjà enregistrées (même calcul que rebuild_daily_sales)
+    Vente = apps.get_model('ventes', 'Vente')
+    LigneVente = apps.get_model('ventes', 'LigneVente')
+    DailySalesAggregate = apps.get_model('stats', 'DailySalesAggregate')
+    DailyArtisanAggregate = apps.get_model('stats', 'DailyArtisanAggregate')
+
+    montant = Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    lignes = LigneVente.objects.annotate(day=TruncDate('vente__sale_date')).values(
+        'day', 'vente__artisan_id', 'product_id'
+    ).annotate(total_quantity=Sum('quantity'), total_revenue=montant, total_lines=Count('id')).order_by()
+    ventes = Vente.objects.annotate(day=TruncDate('sale_date')).values(
+        'day', 'artisan_id'
+    ).annotate(total_sales=Count('id')).order_by()
+
+    par_produit = []
+    par_artisan = {}
+    for row in lignes.iterator():
+        revenue = Decimal(row['total_revenue'] or 0).quantize(Decimal('0.01'))
+        par_produit.append(DailySalesAggregate(
+            day=row['day'], artisan_id=row['vente__artisan_id'], product_id=row['product_id'],
+            quantity=row['total_quantity'], revenue=revenue, lines_count=row['total_lines']
+        ))
+        totals = par_artisan.setdefault((row['day'], row['vente__artisan_id']), {
+            'sales_count': 0, 'quantity': 0, 'revenue': Decimal('0'), 'lines_count': 0
+        })
+        totals['quantity'] += row['total_quantity']
+        totals['revenue'] += revenue
+        totals['lines_count'] += row['total_lines']
+    for row in ventes.iterator():
+        totals = par_artisan.setdefault((row['day'], row['artisan_id']), {
+            'sales_count': 0, 'quantity': 0, 'revenue': Decimal('0'), 'lines_count': 0
+        })
+        totals['sales_count'] += row['total_sales']
+
+    DailySalesAggregate.objects.bulk_create(par_produit, batch_size=500)
+    DailyArtisanAggregate.objects.bulk_create([
+        DailyArtisanAggregate(day=day, artisan_id=artisan_id, **totals)
+        for (day, artisan_id), totals in par_artisan.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('artisans', '0003_artisan_photo'),
+        ('produits', '0003_produit_stock_non_negatif'),
+        ('ventes', '0002_fix_designation_column'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Jour')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('lines_count', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('artisan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres', to='artisans.artisan', verbose_name='Artisan')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres', to='produits.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières par produit',
+                'verbose_name_plural': 'Ventes journalières par produit',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyArtisanAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Jour')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('lines_count', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('artisan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventes_journalieres_totales', to='artisans.artisan', verbose_name='Artisan')),
+            ],
+            options={
+                'verbose_name': 'Ventes journalières par artisan',
+                'verbose_name_plural': 'Ventes journalières par artisan',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesaggregate',
+            constraint=models.UniqueConstraint(fields=('day', 'artisan', 'product'), name='stats_jour_artisan_produit_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyartisanaggregate',
+            constraint=models.UniqueConstraint(fields=('day', 'artisan'), name='stats_jour_artisan_unique'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyartisanaggregate',
+            index=models.Index(fields=['artisan', 'day'], name='stats_artisan_jour_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesaggregate',
+            index=models.Index(fields=['artisan', 'day'], name='stats_produit_artisan_jour_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesaggregate',
+            index=models.Index(fields=['product', 'day'], name='stats_produit_jour_idx'),
+        ),
+    ]
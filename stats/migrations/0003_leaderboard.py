@@ -0,0 +1,82 @@
+# Generated by Django 4.2.22 on 2026-10-17 23:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+import django.db.models.deletion
+
+
+def backfill_all_time(apps, schema_editor):
+    # Classements « tout » des ventes déjà enregistrées ; les fenêtres
+    # glissantes sont remplies à la première vente (advance_windows)
+    LigneVente = apps.get_model('ventes', 'LigneVente')
+    ProductLeaderboard = apps.get_model('stats', 'ProductLeaderboard')
+
+    montant = Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    rows = LigneVente.objects.values('vente__artisan_id', 'product_id', 'product__categorie_id').annotate(
+        total_quantity=Sum('quantity'), total_revenue=montant
+    ).order_by()
+
+    entries = {}
+    for row in rows.iterator():
+        scopes = [('global', 0), ('artisan', row['vente__artisan_id'])]
+        if row['product__categorie_id'] is not None:
+            scopes.append(('categorie', row['product__categorie_id']))
+        revenue = Decimal(row['total_revenue'] or 0).quantize(Decimal('0.01'))
+        for scope, scope_id in scopes:
+            totals = entries.setdefault((scope, scope_id, row['product_id']), [0, Decimal('0')])
+            totals[0] += row['total_quantity']
+            totals[1] += revenue
+    ProductLeaderboard.objects.bulk_create([
+        ProductLeaderboard(
+            scope=scope, scope_id=scope_id, window='tout', product_id=product_id,
+            quantity=quantity, revenue=revenue
+        )
+        for (scope, scope_id, product_id), (quantity, revenue) in entries.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0003_produit_stock_non_negatif'),
+        ('stats', '0002_timeseries_indexes'),
+        ('ventes', '0002_fix_designation_column'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardWindow',
+            fields=[
+                ('window', models.CharField(max_length=5, primary_key=True, serialize=False, verbose_name='Fenêtre')),
+                ('expired_through', models.DateField(verbose_name="Retiré jusqu'au")),
+            ],
+            options={
+                'verbose_name': 'Fenêtre de classement',
+                'verbose_name_plural': 'Fenêtres de classement',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('artisan', 'Artisan'), ('categorie', 'Catégorie')], max_length=10, verbose_name='Portée')),
+                ('scope_id', models.PositiveIntegerField(default=0, help_text="Id de l'artisan ou de la catégorie, 0 pour le classement global", verbose_name='Identifiant de la portée')),
+                ('window', models.CharField(max_length=5, verbose_name='Fenêtre')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classements', to='produits.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Classement des produits',
+                'verbose_name_plural': 'Classements des produits',
+                'indexes': [models.Index(fields=['scope', 'scope_id', 'window', '-quantity', 'product'], name='stats_classement_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productleaderboard',
+            constraint=models.UniqueConstraint(fields=('scope', 'scope_id', 'window', 'product'), name='stats_classement_unique'),
+        ),
+        migrations.RunPython(backfill_all_time, migrations.RunPython.noop),
+    ]
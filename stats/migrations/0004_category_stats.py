@@ -0,0 +1,85 @@
+# Generated by Django 4.2.22 on 2026-10-17 23:24
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def backfill_category_stats(apps, schema_editor):
+    # Compteurs des produits et des ventes existants (même calcul que
+    # reconcile_category_stats) ; artisan 0 : tous, catégorie 0 : sans catégorie
+    Produit = apps.get_model('produits', 'Produit')
+    LigneVente = apps.get_model('ventes', 'LigneVente')
+    CategoryStats = apps.get_model('stats', 'CategoryStats')
+
+    counters = {}
+
+    def add(artisan_id, categorie_id, **values):
+        for artisan_key in (artisan_id, 0):
+            current = counters.setdefault((artisan_key, categorie_id or 0), {})
+            for name, value in values.items():
+                current[name] = current.get(name, 0) + value
+
+    produits = Produit.objects.values('artisan_id', 'categorie_id').annotate(
+        produits=Count('pk'),
+        actifs=Count('pk', filter=Q(stock__gt=0)),
+        unites=Sum('stock'),
+        valeur=Sum(F('stock') * F('price'), output_field=models.DecimalField(max_digits=16, decimal_places=2))
+    ).order_by()
+    for row in produits.iterator():
+        add(
+            row['artisan_id'], row['categorie_id'],
+            products_count=row['produits'],
+            active_products=row['actifs'],
+            stock_units=row['unites'] or 0,
+            stock_value=Decimal(row['valeur'] or 0).quantize(Decimal('0.01'))
+        )
+    ventes = LigneVente.objects.values('vente__artisan_id', 'product__categorie_id').annotate(
+        quantite=Sum('quantity'),
+        montant=Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    ).order_by()
+    for row in ventes.iterator():
+        add(
+            row['vente__artisan_id'], row['product__categorie_id'],
+            quantity_sold=row['quantite'] or 0,
+            revenue=Decimal(row['montant'] or 0).quantize(Decimal('0.01'))
+        )
+    CategoryStats.objects.bulk_create([
+        CategoryStats(artisan_key=artisan_key, categorie_key=categorie_key, **values)
+        for (artisan_key, categorie_key), values in counters.items()
+        if any(values.values())
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0003_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('artisan_key', models.PositiveIntegerField(default=0, help_text="Id de l'artisan, 0 pour tous les artisans", verbose_name='Artisan')),
+                ('categorie_key', models.PositiveIntegerField(default=0, help_text='Id de la catégorie, 0 pour les produits sans catégorie', verbose_name='Catégorie')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('quantity_sold', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+                ('products_count', models.IntegerField(default=0, verbose_name='Nombre de produits')),
+                ('active_products', models.IntegerField(default=0, verbose_name='Produits en stock')),
+                ('stock_units', models.BigIntegerField(default=0, verbose_name='Unités en stock')),
+                ('stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valeur du stock')),
+            ],
+            options={
+                'verbose_name': 'Statistiques par catégorie',
+                'verbose_name_plural': 'Statistiques par catégorie',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categorystats',
+            constraint=models.UniqueConstraint(fields=('artisan_key', 'categorie_key'), name='stats_categorie_artisan_unique'),
+        ),
+        migrations.RunPython(backfill_category_stats, migrations.RunPython.noop),
+    ]
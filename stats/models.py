@@ -1,3 +1,215 @@
 from django.db import models
 
-# Create your models here.
+
+class DailySalesAggregate(models.Model):
+    """
+    Ventes cumulées par jour, artisan et produit.
+
+    Tenu à jour dans la transaction de chaque écriture de vente (voir
+    stats.rollups) et reconstructible avec la commande rebuild_daily_sales.
+    """
+    day = models.DateField(verbose_name='Jour')
+    artisan = models.ForeignKey(
+        'artisans.Artisan',
+        on_delete=models.CASCADE,
+        related_name='ventes_journalieres',
+        verbose_name='Artisan'
+    )
+    product = models.ForeignKey(
+        'produits.Produit',
+        on_delete=models.CASCADE,
+        related_name='ventes_journalieres',
+        verbose_name='Produit'
+    )
+    quantity = models.IntegerField(default=0, verbose_name='Quantité vendue')
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Chiffre d'affaires"
+    )
+    lines_count = models.IntegerField(default=0, verbose_name='Nombre de lignes')
+
+    class Meta:
+        verbose_name = 'Ventes journalières par produit'
+        verbose_name_plural = 'Ventes journalières par produit'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'artisan', 'product'],
+                name='stats_jour_artisan_produit_unique'
+            ),
+        ]
+        indexes = [
+            # Séries temporelles filtrées par artisan ou par produit
+            models.Index(fields=['artisan', 'day'], name='stats_produit_artisan_jour_idx'),
+            models.Index(fields=['product', 'day'], name='stats_produit_jour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.day:%Y-%m-%d} - {self.product_id} : {self.quantity}'
+
+
+class DailyArtisanAggregate(models.Model):
+    """
+    Ventes cumulées par jour et par artisan.
+
+    Complète DailySalesAggregate avec le nombre de ventes, qui ne peut pas
+    être obtenu en additionnant les lignes par produit.
+    """
+    day = models.DateField(verbose_name='Jour')
+    artisan = models.ForeignKey(
+        'artisans.Artisan',
+        on_delete=models.CASCADE,
+        related_name='ventes_journalieres_totales',
+        verbose_name='Artisan'
+    )
+    sales_count = models.IntegerField(default=0, verbose_name='Nombre de ventes')
+    quantity = models.IntegerField(default=0, verbose_name='Quantité vendue')
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Chiffre d'affaires"
+    )
+    lines_count = models.IntegerField(default=0, verbose_name='Nombre de lignes')
+
+    class Meta:
+        verbose_name = 'Ventes journalières par artisan'
+        verbose_name_plural = 'Ventes journalières par artisan'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'artisan'],
+                name='stats_jour_artisan_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['artisan', 'day'], name='stats_artisan_jour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.day:%Y-%m-%d} - {self.artisan_id} : {self.sales_count} ventes'
+
+
+class ProductLeaderboard(models.Model):
+    """
+    Classement des produits les plus vendus, tenu à jour à chaque vente.
+
+    Une ligne par (portée, fenêtre, produit) : portée globale, par artisan ou
+    par catégorie ; fenêtre depuis toujours ou glissante (voir
+    stats.leaderboard). Le top N d'un classement est une lecture de N lignes
+    sur l'index (scope, scope_id, window, -quantity).
+    """
+    SCOPE_GLOBAL = 'global'
+    SCOPE_ARTISAN = 'artisan'
+    SCOPE_CATEGORIE = 'categorie'
+    SCOPE_CHOICES = [
+        (SCOPE_GLOBAL, 'Global'),
+        (SCOPE_ARTISAN, 'Artisan'),
+        (SCOPE_CATEGORIE, 'Catégorie'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, verbose_name='Portée')
+    scope_id = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Identifiant de la portée',
+        help_text="Id de l'artisan ou de la catégorie, 0 pour le classement global"
+    )
+    window = models.CharField(max_length=5, verbose_name='Fenêtre')
+    product = models.ForeignKey(
+        'produits.Produit',
+        on_delete=models.CASCADE,
+        related_name='classements',
+        verbose_name='Produit'
+    )
+    quantity = models.IntegerField(default=0, verbose_name='Quantité vendue')
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Chiffre d'affaires"
+    )
+
+    class Meta:
+        verbose_name = 'Classement des produits'
+        verbose_name_plural = 'Classements des produits'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'scope_id', 'window', 'product'],
+                name='stats_classement_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['scope', 'scope_id', 'window', '-quantity', 'product'],
+                name='stats_classement_top_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.scope_id} {self.window} - {self.product_id} : {self.quantity}'
+
+
+class LeaderboardWindow(models.Model):
+    """Dernier jour retiré de chaque fenêtre glissante des classements."""
+    window = models.CharField(max_length=5, primary_key=True, verbose_name='Fenêtre')
+    expired_through = models.DateField(verbose_name='Retiré jusqu\'au')
+
+    class Meta:
+        verbose_name = 'Fenêtre de classement'
+        verbose_name_plural = 'Fenêtres de classement'
+
+    def __str__(self):
+        return f'{self.window} : {self.expired_through:%Y-%m-%d}'
+
+
+class CategoryStats(models.Model):
+    """
+    Compteurs par catégorie, pour un artisan ou pour tous (artisan_key = 0) :
+    ventes cumulées et valeur du stock en cours.
+
+    Tenus à jour à chaque écriture de vente, mouvement de stock et
+    enregistrement de produit (voir stats.categories) ; les lire coûte une
+    ligne par catégorie.
+    """
+    ALL_ARTISANS = 0
+    NO_CATEGORY = 0
+
+    artisan_key = models.PositiveIntegerField(
+        default=ALL_ARTISANS,
+        verbose_name='Artisan',
+        help_text="Id de l'artisan, 0 pour tous les artisans"
+    )
+    categorie_key = models.PositiveIntegerField(
+        default=NO_CATEGORY,
+        verbose_name='Catégorie',
+        help_text='Id de la catégorie, 0 pour les produits sans catégorie'
+    )
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Chiffre d'affaires"
+    )
+    quantity_sold = models.IntegerField(default=0, verbose_name='Quantité vendue')
+    products_count = models.IntegerField(default=0, verbose_name='Nombre de produits')
+    active_products = models.IntegerField(default=0, verbose_name='Produits en stock')
+    stock_units = models.BigIntegerField(default=0, verbose_name='Unités en stock')
+    stock_value = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        verbose_name='Valeur du stock'
+    )
+
+    class Meta:
+        verbose_name = 'Statistiques par catégorie'
+        verbose_name_plural = 'Statistiques par catégorie'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['artisan_key', 'categorie_key'],
+                name='stats_categorie_artisan_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.artisan_key}:{self.categorie_key} - {self.revenue}'
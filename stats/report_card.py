@@ -0,0 +1,129 @@
+# stats/report_card.py
+"""
+Bulletin des artisans : une ligne par produit (ou une ligne « N/A » pour un
+artisan sans produit) avec les quantités vendues et le chiffre d'affaires.
+
+Le bulletin est produit par une seule requête : artisans LEFT JOIN produits
+LEFT JOIN agrégats journaliers, groupée par produit. Les lignes sont lues par
+iterator() et écrites en flux (JSON ou CSV), la mémoire ne dépend donc pas du
+nombre d'artisans. Un instantané peut être précalculé sur disque avec la
+commande snapshot_report_card et servi tel quel par la vue.
+"""
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Sum
+from rest_framework.utils.encoders import JSONEncoder
+
+from artisans.models import Artisan
+from ventes.export import Echo
+
+REPORT_CHUNK_SIZE = 2000
+
+CENTIME = Decimal('0.01')
+
+REPORT_COLUMNS = (
+    'artisan_name',
+    'speciality',
+    'product_name',
+    'product_category',
+    'product_price',
+    'product_stock',
+    'total_sales_for_product',
+    'revenue_for_product',
+)
+
+REPORT_FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def report_card_queryset():
+    """Une ligne par (artisan, produit), artisans sans produit compris."""
+    return Artisan.objects.values(
+        'id',
+        'prenom',
+        'nom',
+        'specialite',
+        'produits__id',
+        'produits__name',
+        'produits__categorie__nom',
+        'produits__price',
+        'produits__stock',
+    ).annotate(
+        total_quantity=Sum('produits__ventes_journalieres__quantity'),
+        total_revenue=Sum('produits__ventes_journalieres__revenue'),
+    ).order_by('nom', 'prenom', 'id', 'produits__name', 'produits__id')
+
+
+def report_card_rows(queryset=None, chunk_size=REPORT_CHUNK_SIZE):
+    """Génère les lignes du bulletin (dicts dans l'ordre de REPORT_COLUMNS)."""
+    if queryset is None:
+        queryset = report_card_queryset()
+    for row in queryset.iterator(chunk_size=chunk_size):
+        has_product = row['produits__id'] is not None
+        yield {
+            'artisan_name': f"{row['prenom']} {row['nom']}",
+            'speciality': row['specialite'],
+            'product_name': row['produits__name'] if has_product else 'N/A',
+            'product_category': row['produits__categorie__nom'] if has_product else 'N/A',
+            'product_price': row['produits__price'] if has_product else 0,
+            'product_stock': row['produits__stock'] if has_product else 0,
+            'total_sales_for_product': row['total_quantity'] or 0,
+            'revenue_for_product': Decimal(row['total_revenue'] or 0).quantize(CENTIME),
+        }
+
+
+def stream_json(rows):
+    """Tableau JSON écrit élément par élément."""
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(row, cls=JSONEncoder, ensure_ascii=False)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(REPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in REPORT_COLUMNS])
+
+
+def stream_report_card(format='json', rows=None):
+    """Bulletin complet dans le format demandé ('json' ou 'csv')."""
+    if format not in REPORT_FORMATS:
+        raise ValueError(f"Format de bulletin inconnu : {format}")
+    rows = report_card_rows() if rows is None else rows
+    return stream_json(rows) if format == 'json' else stream_csv(rows)
+
+
+def snapshot_path(format):
+    return Path(settings.STATS_SNAPSHOT_DIR) / f'report-card.{format}'
+
+
+def write_snapshot(format='json'):
+    """
+    Écrit l'instantané du bulletin. Le fichier est écrit à côté puis renommé :
+    une lecture concurrente voit l'ancien ou le nouveau bulletin, jamais un
+    fichier partiel. Retourne le chemin écrit.
+    """
+    path = snapshot_path(format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.report-card-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            for chunk in stream_report_card(format):
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
@@ -0,0 +1,202 @@
+# stats/rollups.py
+"""
+Agrégats journaliers des ventes (DailySalesAggregate, DailyArtisanAggregate).
+
+Les agrégats sont incrémentés par un seul INSERT ... ON CONFLICT DO UPDATE
+par table, en réponse au signal ventes.signals.sales_changed, donc dans la
+transaction qui écrit la vente. Les vues de statistiques lisent ces tables :
+leur coût dépend du nombre de jours et de produits, plus du volume de ventes.
+
+rebuild_rollups recalcule les agrégats à partir des ventes, par fenêtres de
+jours (commande rebuild_daily_sales).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ventes.models import LigneVente, Vente
+from ventes.signals import sales_changed
+from .models import DailyArtisanAggregate, DailySalesAggregate
+
+# Nombre de lignes par INSERT (limite de paramètres SQL)
+UPSERT_BATCH = 150
+
+CENTIME = Decimal('0.01')
+
+
+def upsert_increments(model, key_fields, increments):
+    """
+    Ajoute des variations aux compteurs d'une table d'agrégats.
+
+    `increments` associe un tuple de clés (dans l'ordre de `key_fields`) à un
+    dict {champ: variation} ; les champs absents valent 0. Les lignes absentes sont créées, les autres
+    incrémentées par la base : deux transactions concurrentes ne peuvent pas
+    perdre de mise à jour.
+    """
+    if not increments:
+        return
+    opts = model._meta
+    table = connection.ops.quote_name(opts.db_table)
+    # Toutes les colonnes de compteurs sont écrites (0 par défaut) : les
+    # valeurs par défaut des modèles n'existent pas côté base
+    value_fields = [
+        field.name for field in opts.concrete_fields
+        if not field.primary_key and field.name not in key_fields
+    ]
+    key_columns = [opts.get_field(name).column for name in key_fields]
+    value_columns = [opts.get_field(name).column for name in value_fields]
+    columns = ', '.join(connection.ops.quote_name(c) for c in key_columns + value_columns)
+    placeholders = '(' + ', '.join(['%s'] * (len(key_columns) + len(value_columns))) + ')'
+
+    if connection.vendor == 'mysql':
+        conflict = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            f'{c} = {c} + VALUES({c})'
+            for c in map(connection.ops.quote_name, value_columns)
+        )
+    else:
+        # SQLite (>= 3.24) et PostgreSQL
+        conflict = 'ON CONFLICT ({}) DO UPDATE SET {}'.format(
+            ', '.join(map(connection.ops.quote_name, key_columns)),
+            ', '.join(
+                f'{c} = {table}.{c} + excluded.{c}'
+                for c in map(connection.ops.quote_name, value_columns)
+            )
+        )
+
+    fields = [opts.get_field(name) for name in key_fields + value_fields]
+    rows = list(increments.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            batch = rows[start:start + UPSERT_BATCH]
+            params = []
+            for keys, values in batch:
+                raw = list(keys) + [values.get(name, 0) for name in value_fields]
+                params.extend(
+                    field.get_db_prep_value(value, connection, prepared=False)
+                    for field, value in zip(fields, raw)
+                )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES '
+                + ', '.join([placeholders] * len(batch))
+                + ' ' + conflict,
+                params
+            )
+
+
+def add_increments(target, key, **values):
+    current = target.setdefault(key, {})
+    for name, value in values.items():
+        current[name] = current.get(name, 0) + value
+
+
+def apply_sales_changed(lines=(), sales=()):
+    """Reporte des variations de ventes (LineDelta, SaleDelta) sur les agrégats."""
+    par_produit = {}
+    par_artisan = {}
+    for line in lines:
+        values = {'quantity': line.quantity, 'revenue': line.revenue, 'lines_count': line.lines}
+        add_increments(par_produit, (line.day, line.artisan_id, line.product_id), **values)
+        add_increments(par_artisan, (line.day, line.artisan_id), **values)
+    for sale in sales:
+        add_increments(par_artisan, (sale.day, sale.artisan_id), sales_count=sale.sales)
+
+    upsert_increments(DailySalesAggregate, ['day', 'artisan', 'product'], par_produit)
+    upsert_increments(DailyArtisanAggregate, ['day', 'artisan'], par_artisan)
+
+
+@receiver(sales_changed, dispatch_uid='stats_daily_rollups')
+def update_rollups(sender, lines=(), sales=(), **kwargs):
+    apply_sales_changed(lines, sales)
+
+
+def day_start(day):
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def rebuild_rollups(start=None, end=None, days_per_chunk=31, stdout=None):
+    """
+    Recalcule les agrégats des jours [start, end] à partir des ventes.
+
+    Chaque fenêtre de `days_per_chunk` jours est remplacée dans sa propre
+    transaction, ce qui borne la mémoire et la durée des verrous.
+    Retourne le nombre de jours traités.
+    """
+    bounds = Vente.objects.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+    if bounds['first'] is None and (start is None or end is None):
+        DailySalesAggregate.objects.all().delete()
+        DailyArtisanAggregate.objects.all().delete()
+        return 0
+    start = start or timezone.localdate(bounds['first'])
+    end = end or timezone.localdate(bounds['last'])
+
+    day = start
+    while day <= end:
+        chunk_end = min(day + timedelta(days=days_per_chunk - 1), end)
+        _rebuild_window(day, chunk_end)
+        if stdout is not None:
+            stdout.write(f'{day:%Y-%m-%d} → {chunk_end:%Y-%m-%d}')
+        day = chunk_end + timedelta(days=1)
+    return max(0, (end - start).days + 1)
+
+
+def _rebuild_window(first_day, last_day):
+    period = {
+        'sale_date__gte': day_start(first_day),
+        'sale_date__lt': day_start(last_day + timedelta(days=1)),
+    }
+    montant = Sum(
+        F('quantity') * F('unit_price'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+    lignes = LigneVente.objects.filter(
+        **{f'vente__{lookup}': value for lookup, value in period.items()}
+    ).annotate(
+        day=TruncDate('vente__sale_date')
+    ).values('day', 'vente__artisan_id', 'product_id').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=montant,
+        total_lines=Count('id')
+    ).order_by()
+    ventes = Vente.objects.filter(**period).annotate(
+        day=TruncDate('sale_date')
+    ).values('day', 'artisan_id').annotate(total_sales=Count('id')).order_by()
+
+    # La suppression ouvre la transaction d'écriture avant la lecture des
+    # ventes : sous SQLite, les ventes concurrentes attendent la fin de la
+    # fenêtre. Sur un autre moteur, lancer la reconstruction hors des heures
+    # de vente.
+    with transaction.atomic():
+        window = {'day__gte': first_day, 'day__lte': last_day}
+        DailySalesAggregate.objects.filter(**window).delete()
+        DailyArtisanAggregate.objects.filter(**window).delete()
+
+        par_artisan = {}
+        par_produit = []
+        for row in lignes.iterator():
+            revenue = Decimal(row['total_revenue'] or 0).quantize(CENTIME)
+            par_produit.append(DailySalesAggregate(
+                day=row['day'],
+                artisan_id=row['vente__artisan_id'],
+                product_id=row['product_id'],
+                quantity=row['total_quantity'],
+                revenue=revenue,
+                lines_count=row['total_lines']
+            ))
+            add_increments(
+                par_artisan, (row['day'], row['vente__artisan_id']),
+                quantity=row['total_quantity'], revenue=revenue, lines_count=row['total_lines']
+            )
+        for row in ventes.iterator():
+            add_increments(par_artisan, (row['day'], row['artisan_id']), sales_count=row['total_sales'])
+        DailySalesAggregate.objects.bulk_create(par_produit, batch_size=500)
+        DailyArtisanAggregate.objects.bulk_create([
+            DailyArtisanAggregate(day=day, artisan_id=artisan_id, **values)
+            for (day, artisan_id), values in par_artisan.items()
+        ], batch_size=500)
@@ -1,3 +1,1007 @@
-from django.test import TestCase
+# stats/tests.py
+import csv
+import json
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import QueryDict
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from produits.models import Categorie, Produit
+from ventes.bulk_import import import_sales
+from ventes.models import Vente
+from ventes.tests import creer_artisan, creer_produit
+from .analytics import ColumnStore, Frame, SalesColumns, columns_cache, get_columns, group_by, pivot
+from .benchmark import seed_sales
+from .cache import check_shared_cache, request_cache_key, single_flight
+from .categories import category_stats
+from .comparison import compare_periods, comparison_periods
+from .dashboard import run_concurrently
+from .leaderboard import advance_windows, top_products
+from .models import (
+    CategoryStats,
+    DailyArtisanAggregate,
+    DailySalesAggregate,
+    LeaderboardWindow,
+    ProductLeaderboard,
+)
+
+User = get_user_model()
+
+
+def agregats():
+    """Contenu des deux tables d'agrégats, comparable d'un état à l'autre."""
+    produits = {
+        (row.day, row.artisan_id, row.product_id): (row.quantity, row.revenue, row.lines_count)
+        for row in DailySalesAggregate.objects.all()
+    }
+    artisans = {
+        (row.day, row.artisan_id): (row.sales_count, row.quantity, row.revenue, row.lines_count)
+        for row in DailyArtisanAggregate.objects.all()
+    }
+    return produits, artisans
+
+
+class AgregatsJournaliersTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.vase = creer_produit(self.artisan, stock=50, name='Vase', price='5.00')
+        self.bol = creer_produit(self.artisan, stock=50, name='Bol', price='2.00')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.jour = timezone.localdate()
+
+    def creer_vente(self, lignes):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': p.pk, 'quantity': q} for p, q in lignes],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Vente.objects.get(pk=response.data['id'])
+
+    def test_creation_de_vente_incremente_les_agregats(self):
+        self.creer_vente([(self.vase, 2), (self.bol, 1)])
+        self.creer_vente([(self.vase, 1)])
+
+        vase = DailySalesAggregate.objects.get(product=self.vase)
+        self.assertEqual((vase.day, vase.quantity, vase.revenue, vase.lines_count),
+                         (self.jour, 3, Decimal('15.00'), 2))
+        total = DailyArtisanAggregate.objects.get(artisan=self.artisan)
+        self.assertEqual((total.sales_count, total.quantity, total.revenue, total.lines_count),
+                         (2, 4, Decimal('17.00'), 3))
+
+    def test_modification_et_suppression_de_lignes(self):
+        vente = self.creer_vente([(self.vase, 2), (self.bol, 1)])
+        ligne = vente.lignes_vente.get(product=self.vase)
+        ligne.quantity = 4
+        ligne.save()
+        ligne.product = self.bol
+        ligne.unit_price = Decimal('2.00')
+        ligne.save()
+        vente.lignes_vente.get(product=self.bol, quantity=1).delete()
+
+        self.assertEqual(
+            DailySalesAggregate.objects.get(product=self.vase).quantity, 0
+        )
+        bol = DailySalesAggregate.objects.get(product=self.bol)
+        self.assertEqual((bol.quantity, bol.revenue, bol.lines_count), (4, Decimal('8.00'), 1))
+
+        vente.delete()
+        total = DailyArtisanAggregate.objects.get(artisan=self.artisan)
+        self.assertEqual((total.sales_count, total.quantity, total.revenue, total.lines_count),
+                         (0, 0, Decimal('0.00'), 0))
+
+    def test_import_en_masse_incremente_les_agregats(self):
+        ventes = [{
+            'row': i, 'reference': f'R{i}', 'artisan': self.artisan.pk,
+            'nom_du_client': 'Client', 'designation': '', 'errors': [],
+            'lignes': [{'row': i, 'product_id': self.vase.pk, 'quantity': 1},
+                       {'row': i, 'product_id': self.bol.pk, 'quantity': 2}],
+        } for i in range(5)]
+        report = import_sales(ventes, chunk_size=2)
+        self.assertEqual(report.ventes_importees, 5)
+
+        total = DailyArtisanAggregate.objects.get(artisan=self.artisan)
+        self.assertEqual((total.sales_count, total.quantity, total.revenue, total.lines_count),
+                         (5, 15, Decimal('45.00'), 10))
+
+    def test_reconstruction_identique_aux_increments(self):
+        self.creer_vente([(self.vase, 2), (self.bol, 1)])
+        ancienne = self.creer_vente([(self.bol, 3)])
+        # Vente antérieure : la reconstruction doit la ranger à son jour
+        Vente.objects.filter(pk=ancienne.pk).update(sale_date=timezone.now() - timedelta(days=40))
+        DailySalesAggregate.objects.filter(product=self.bol).delete()
+        DailyArtisanAggregate.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_daily_sales', '--jours-par-lot', '7', stdout=out)
+        self.assertIn('41 jours reconstruits', out.getvalue())
+
+        produits, artisans = agregats()
+        ancien_jour = self.jour - timedelta(days=40)
+        self.assertEqual(produits[(ancien_jour, self.artisan.pk, self.bol.pk)], (3, Decimal('6.00'), 1))
+        self.assertEqual(produits[(self.jour, self.artisan.pk, self.bol.pk)], (1, Decimal('2.00'), 1))
+        self.assertEqual(artisans[(self.jour, self.artisan.pk)], (1, 3, Decimal('12.00'), 2))
+
+        # Une seconde reconstruction ne change rien
+        call_command('rebuild_daily_sales', stdout=StringIO())
+        self.assertEqual(agregats(), (produits, artisans))
+
+        # Début postérieur à la dernière vente : rien à reconstruire
+        out = StringIO()
+        demain = (self.jour + timedelta(days=1)).isoformat()
+        call_command('rebuild_daily_sales', '--depuis', demain, stdout=out)
+        self.assertIn('0 jours reconstruits', out.getvalue())
+
+    def test_migration_remplit_les_agregats(self):
+        self.creer_vente([(self.vase, 2), (self.bol, 1)])
+        self.creer_vente([(self.bol, 3)])
+        attendu = agregats()
+        DailySalesAggregate.objects.all().delete()
+        DailyArtisanAggregate.objects.all().delete()
+
+        migration = import_module('stats.migrations.0001_initial')
+        migration.backfill_rollups(django_apps, None)
+        self.assertEqual(agregats(), attendu)
+
+    def test_vues_independantes_du_nombre_de_ventes(self):
+        self.creer_vente([(self.vase, 1)])
+        with CaptureQueriesContext(connection) as une_vente:
+            self.client.get('/api/stats/dashboard-stats/')
+        for _ in range(10):
+            self.creer_vente([(self.vase, 1), (self.bol, 1)])
+        with CaptureQueriesContext(connection) as onze_ventes:
+            response = self.client.get('/api/stats/dashboard-stats/')
+
+        self.assertEqual(len(onze_ventes), len(une_vente))
+        self.assertFalse(any('ventes_lignevente' in q['sql'] for q in onze_ventes.captured_queries))
+        self.assertEqual(response.data['total_ventes'], 11)
+        self.assertEqual(response.data['chiffre_affaires_total'], 75.0)
+        self.assertEqual(response.data['stats_artisans'][0]['chiffre_affaires'], Decimal('75.00'))
+        self.assertEqual(response.data['stats_mensuelles']['total_ventes'], 11)
+
+        response = self.client.get('/api/stats/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_sales_global'], 75.0)
+        self.assertEqual(response.data['top_selling_products'][0]['product__name'], 'Vase')
+
+
+class BulletinArtisansTests(APITestCase):
+    url = '/api/stats/report-card/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.vase = creer_produit(self.artisan, stock=50, name='Vase', price='5.00')
+        creer_produit(self.artisan, stock=7, name='Bol', price='2.00')
+        creer_artisan('B-002', 'sans-produit@example.com')
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.post('/api/ventes/', {
+            'artisan': self.artisan.pk,
+            'nom_du_client': 'Client',
+            'lignes_vente': [{'product_id': self.vase.pk, 'quantity': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def lire_json(self, response):
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.getvalue())
+
+    def test_bulletin_json(self):
+        lignes = self.lire_json(self.client.get(self.url))
+        self.assertEqual([l['product_name'] for l in lignes], ['Bol', 'Vase', 'N/A'])
+        vase = lignes[1]
+        self.assertEqual(vase['artisan_name'], 'Test Artisan')
+        self.assertEqual(vase['speciality'], 'Poterie')
+        self.assertEqual(vase['total_sales_for_product'], 3)
+        self.assertEqual(vase['revenue_for_product'], 15.0)
+        self.assertEqual(vase['product_stock'], 47)
+        self.assertEqual(lignes[0]['total_sales_for_product'], 0)
+
+    def test_bulletin_csv(self):
+        response = self.client.get(self.url, {'export': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        lignes = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(lignes), 3)
+        self.assertEqual(lignes[1]['revenue_for_product'], '15.00')
+
+    def test_nombre_de_requetes_independant_du_nombre_d_artisans(self):
+        with CaptureQueriesContext(connection) as peu:
+            self.lire_json(self.client.get(self.url))
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                artisan = creer_artisan(f'B-1{i:02d}', f'artisan{i}@example.com')
+                creer_produit(artisan, name=f'Produit {i}')
+        with CaptureQueriesContext(connection) as beaucoup:
+            lignes = self.lire_json(self.client.get(self.url))
+
+        self.assertEqual(len(lignes), 23)
+        self.assertEqual(len(beaucoup), len(peu))
+
+    def test_instantane(self):
+        with tempfile.TemporaryDirectory() as dossier, override_settings(STATS_SNAPSHOT_DIR=dossier):
+            response = self.client.get(self.url, {'snapshot': '1'})
+            self.assertEqual(response.status_code, 404)
+
+            call_command('snapshot_report_card', stdout=StringIO())
+            with CaptureQueriesContext(connection) as requetes:
+                response = self.client.get(self.url, {'snapshot': '1'})
+                lignes = self.lire_json(response)
+            self.assertEqual(len(lignes), 3)
+            self.assertIn('X-Snapshot-Date', response)
+            self.assertFalse(any('artisans_artisan' in q['sql'] for q in requetes.captured_queries))
+
+            response = self.client.get(self.url, {'snapshot': '1', 'export': 'csv'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'artisan_name,'))
+
+
+class SerieTemporelleTests(APITestCase):
+    url = '/api/stats/timeseries/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.vase = creer_produit(self.artisan, name='Vase', price='5.00')
+        self.panier = creer_produit(self.autre, name='Panier', price='7.00')
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+        self.lundi = date(2025, 3, 3)
+
+    def agreger(self, day, produit, quantity, ventes=1):
+        revenue = Decimal(produit.price) * quantity
+        DailySalesAggregate.objects.create(
+            day=day, artisan=produit.artisan, product=produit,
+            quantity=quantity, revenue=revenue, lines_count=ventes
+        )
+        DailyArtisanAggregate.objects.create(
+            day=day, artisan=produit.artisan, sales_count=ventes,
+            quantity=quantity, revenue=revenue, lines_count=ventes
+        )
+
+    def test_serie_journaliere_completee_a_zero(self):
+        self.agreger(self.lundi, self.vase, 2)
+        self.agreger(self.lundi + timedelta(days=2), self.panier, 1, ventes=2)
+
+        response = self.client.get(self.url, {'date_debut': '2025-03-03', 'date_fin': '2025-03-05'})
+        self.assertEqual(response.status_code, 200)
+        series = response.data['series']
+        self.assertEqual([p['debut'] for p in series],
+                         [self.lundi + timedelta(days=i) for i in range(3)])
+        self.assertEqual([p['quantite'] for p in series], [2, 0, 1])
+        self.assertEqual([p['ventes'] for p in series], [1, 0, 2])
+        self.assertEqual(series[0]['chiffre_affaires'], Decimal('10.00'))
+
+    def test_semaines_et_mois(self):
+        self.agreger(self.lundi, self.vase, 1)
+        self.agreger(self.lundi + timedelta(days=6), self.vase, 2)
+        self.agreger(self.lundi + timedelta(days=7), self.vase, 4)
+        self.agreger(date(2025, 5, 20), self.vase, 8)
+
+        response = self.client.get(self.url, {
+            'intervalle': 'semaine', 'date_debut': '2025-03-05', 'date_fin': '2025-03-12'
+        })
+        self.assertEqual([(p['debut'], p['quantite']) for p in response.data['series']],
+                         [(self.lundi, 3), (self.lundi + timedelta(days=7), 4)])
+
+        response = self.client.get(self.url, {
+            'intervalle': 'mois', 'date_debut': '2025-03-01', 'date_fin': '2025-05-31'
+        })
+        self.assertEqual([(p['debut'], p['quantite']) for p in response.data['series']],
+                         [(date(2025, 3, 1), 7), (date(2025, 4, 1), 0), (date(2025, 5, 1), 8)])
+
+    def test_filtres_et_restriction_artisan(self):
+        self.agreger(self.lundi, self.vase, 2)
+        self.agreger(self.lundi, self.panier, 3)
+        periode = {'date_debut': '2025-03-03', 'date_fin': '2025-03-03'}
+
+        response = self.client.get(self.url, {**periode, 'produit': self.panier.pk})
+        self.assertEqual(response.data['series'][0]['quantite'], 3)
+        response = self.client.get(self.url, {**periode, 'artisan': self.artisan.pk})
+        self.assertEqual(response.data['series'][0]['quantite'], 2)
+
+        self.client.force_authenticate(user=self.autre.user)
+        response = self.client.get(self.url, {**periode, 'artisan': self.artisan.pk})
+        self.assertEqual(response.data['series'][0]['quantite'], 3)
+
+    def test_parametres_invalides(self):
+        self.assertEqual(self.client.get(self.url, {'intervalle': 'heure'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_debut': '2025-13-01'}).status_code, 400)
+        response = self.client.get(self.url, {'date_debut': '2000-01-01', 'date_fin': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_une_annee_en_une_requete(self):
+        DailyArtisanAggregate.objects.bulk_create([
+            DailyArtisanAggregate(
+                day=date(2024, 1, 1) + timedelta(days=i), artisan=self.artisan,
+                sales_count=1, quantity=1, revenue=Decimal('5.00'), lines_count=1
+            )
+            for i in range(0, 366, 2)
+        ])
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url, {'date_debut': '2024-01-01', 'date_fin': '2024-12-31'})
+        self.assertEqual(len(response.data['series']), 366)
+        self.assertEqual(sum(p['ventes'] for p in response.data['series']), 183)
+        self.assertEqual(len([q for q in requetes.captured_queries if 'stats_' in q['sql']]), 1)
+
+
+class CacheStatistiquesTests(APITestCase):
+    url = '/api/stats/dashboard-stats/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.vase = creer_produit(self.artisan, stock=50, name='Vase', price='5.00')
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+
+    def creer_vente(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': self.vase.pk, 'quantity': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_deuxieme_lecture_sans_requete(self):
+        self.creer_vente()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['total_ventes'], 1)
+        self.assertFalse(any('stats_' in q['sql'] for q in requetes.captured_queries))
+
+        # Les paramètres font partie de la clé
+        self.assertEqual(self.client.get(self.url, {'x': '1'})['X-Cache'], 'MISS')
+
+    def test_invalidation_par_etiquette(self):
+        self.creer_vente()
+        self.client.get(self.url)
+        self.creer_vente()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_ventes'], 2)
+
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vase.name = 'Grand vase'
+            self.vase.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['top_produits'][0]['product__name'], 'Grand vase')
+
+    def test_bulletin_en_flux_mis_en_cache(self):
+        response = self.client.get('/api/stats/report-card/', {'export': 'csv'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        premier = response.getvalue()
+        response = self.client.get('/api/stats/report-card/', {'export': 'csv'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, premier)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_un_seul_calcul_pour_des_requetes_concurrentes(self):
+        calculs = []
+        depart = threading.Barrier(8)
+
+        def calcul():
+            calculs.append(1)
+            time.sleep(0.2)
+            return {'valeur': 42}
+
+        resultats = []
+
+        def lecture():
+            depart.wait()
+            resultats.append(single_flight('stats:test:single-flight', calcul, 60))
+
+        threads = [threading.Thread(target=lecture) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calculs), 1)
+        self.assertEqual([valeur for valeur, _ in resultats], [{'valeur': 42}] * 8)
+        self.assertEqual(sum(1 for _, hit in resultats if not hit), 1)
+
+    def test_cle_artisan_sans_boutique(self):
+        compte = User.objects.create_user(
+            email='sans-boutique@example.com', password='testpass123', user_type='artisan'
+        )
+        requete = mock.Mock(user=compte, query_params=QueryDict())
+        cle = request_cache_key(mock.Mock(), requete, ('sales',))
+        self.assertIn(':artisan:None:', cle)
+
+    def test_avertissement_cache_local(self):
+        self.assertEqual([w.id for w in check_shared_cache(None)], ['stats.W001'])
+        partage = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                               'LOCATION': tempfile.gettempdir()}}
+        with override_settings(CACHES=partage):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class ClassementProduitsTests(APITestCase):
+    url = '/api/stats/top-produits/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.categorie = Categorie.objects.create(nom='Poterie')
+        self.vase = creer_produit(self.artisan, stock=100, name='Vase', price='5.00')
+        self.bol = creer_produit(self.artisan, stock=100, name='Bol', price='2.00')
+        self.panier = creer_produit(self.autre, stock=100, name='Panier', price='7.00')
+        Produit.objects.filter(pk__in=[self.vase.pk, self.panier.pk]).update(categorie=self.categorie)
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+        advance_windows()
+
+    def vendre(self, produit, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': produit.artisan_id,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': produit.pk, 'quantity': quantity}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Vente.objects.get(pk=response.data['id'])
+
+    def classement(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(p['produit'], p['quantite']) for p in response.data['produits']]
+
+    def test_classements_par_portee(self):
+        self.vendre(self.vase, 2)
+        self.vendre(self.bol, 5)
+        self.vendre(self.panier, 3)
+
+        self.assertEqual(self.classement(), [('Bol', 5), ('Panier', 3), ('Vase', 2)])
+        self.assertEqual(self.classement(limite=1), [('Bol', 5)])
+        self.assertEqual(self.classement(portee='artisan', id=self.artisan.pk), [('Bol', 5), ('Vase', 2)])
+        self.assertEqual(self.classement(portee='categorie', id=self.categorie.pk), [('Panier', 3), ('Vase', 2)])
+        self.assertEqual(self.classement(fenetre='7j'), [('Bol', 5), ('Panier', 3), ('Vase', 2)])
+
+        with CaptureQueriesContext(connection) as requetes:
+            top = list(top_products(limit=2))
+        self.assertEqual(len(requetes), 1)
+        self.assertEqual([row.product_id for row in top], [self.bol.pk, self.panier.pk])
+
+    def test_fenetres_glissantes(self):
+        vente = self.vendre(self.vase, 4)
+        self.vendre(self.bol, 1)
+        # La vente du vase date de 10 jours : les agrégats et le classement
+        # sont reconstruits comme si elle avait été saisie ce jour-là
+        Vente.objects.filter(pk=vente.pk).update(sale_date=timezone.now() - timedelta(days=10))
+        call_command('rebuild_daily_sales', stdout=StringIO())
+        LeaderboardWindow.objects.all().delete()
+        advance_windows()
+
+        self.assertEqual(self.classement(fenetre='7j'), [('Bol', 1)])
+        self.assertEqual(self.classement(fenetre='30j'), [('Vase', 4), ('Bol', 1)])
+
+        # Dans 25 jours, seule la vente du bol reste dans la fenêtre de 30 jours
+        advance_windows(timezone.localdate() + timedelta(days=25))
+        self.assertEqual(
+            [(row.product_id, row.quantity) for row in top_products(window='30j')],
+            [(self.bol.pk, 1)]
+        )
+        self.assertEqual(self.classement(), [('Vase', 4), ('Bol', 1)])
+
+    def test_fenetres_avancees_a_l_ecriture(self):
+        LeaderboardWindow.objects.all().delete()
+        with mock.patch('stats.leaderboard._windows_checked_on', None):
+            # La lecture n'écrit rien, même avec des fenêtres en retard
+            with CaptureQueriesContext(connection) as requetes:
+                self.assertEqual(list(top_products(window='7j')), [])
+            self.assertEqual(len(requetes), 1)
+            self.assertFalse(LeaderboardWindow.objects.exists())
+
+            # La première vente du jour les avance
+            self.vendre(self.vase, 2)
+            self.assertEqual(LeaderboardWindow.objects.count(), 2)
+            self.assertEqual(self.classement(fenetre='7j'), [('Vase', 2)])
+
+        LeaderboardWindow.objects.all().delete()
+        out = StringIO()
+        call_command('reconcile_leaderboard', '--advance', stdout=out)
+        self.assertIn('Fenêtres glissantes avancées', out.getvalue())
+        self.assertEqual(LeaderboardWindow.objects.count(), 2)
+
+    def test_reconciliation(self):
+        self.vendre(self.vase, 2)
+        self.vendre(self.panier, 3)
+        out = StringIO()
+        call_command('reconcile_leaderboard', '--check', stdout=out)
+        self.assertIn('0 écarts', out.getvalue())
+
+        ProductLeaderboard.objects.filter(product=self.vase, scope='global', window='tout').update(quantity=40)
+        with self.assertRaises(SystemExit):
+            call_command('reconcile_leaderboard', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('reconcile_leaderboard', stdout=out)
+        self.assertIn('1 écarts corrigés', out.getvalue())
+        self.assertEqual(self.classement(), [('Panier', 3), ('Vase', 2)])
+
+    def test_verification_sans_ecriture(self):
+        self.vendre(self.vase, 2)
+        # Fenêtres en retard : la vérification ne les avance pas
+        retard = timezone.localdate() - timedelta(days=31)
+        LeaderboardWindow.objects.update(expired_through=retard)
+        call_command('reconcile_leaderboard', '--check', stdout=StringIO())
+        self.assertEqual(set(LeaderboardWindow.objects.values_list('expired_through', flat=True)), {retard})
+
+    def test_migration_remplit_le_classement(self):
+        self.vendre(self.vase, 2)
+        self.vendre(self.panier, 3)
+        attendu = sorted(ProductLeaderboard.objects.filter(window='tout').values_list(
+            'scope', 'scope_id', 'product_id', 'quantity', 'revenue'
+        ))
+        ProductLeaderboard.objects.all().delete()
+
+        migration = import_module('stats.migrations.0003_leaderboard')
+        migration.backfill_all_time(django_apps, None)
+        self.assertEqual(sorted(ProductLeaderboard.objects.values_list(
+            'scope', 'scope_id', 'product_id', 'quantity', 'revenue'
+        )), attendu)
+
+    def test_artisan_limite_a_son_classement(self):
+        self.vendre(self.vase, 2)
+        self.vendre(self.panier, 3)
+        self.client.force_authenticate(user=self.autre.user)
+        self.assertEqual(self.classement(portee='global'), [('Panier', 3)])
+        self.assertEqual(self.client.get(self.url, {'fenetre': '1an'}).status_code, 400)
+
+
+class MoteurAnalyseTests(APITestCase):
+    url = '/api/stats/analytics/'
+
+    def setUp(self):
+        cache.clear()
+        columns_cache.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.categorie = Categorie.objects.create(nom='Poterie')
+        self.vase = creer_produit(self.artisan, stock=100, name='Vase', price='5.00')
+        self.bol = creer_produit(self.artisan, stock=100, name='Bol', price='2.00')
+        self.panier = creer_produit(self.autre, stock=100, name='Panier', price='7.00')
+        Produit.objects.filter(pk=self.vase.pk).update(categorie=self.categorie)
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+        self.jour = str(timezone.localdate())
+
+    def vendre(self, lignes):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': lignes[0][0].artisan_id,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': p.pk, 'quantity': q} for p, q in lignes],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Vente.objects.get(pk=response.data['id'])
+
+    def analyser(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        if response['X-Cache'] == 'MISS':
+            self.assertTrue(response.has_header('X-Duree-Ms'))
+        return response.data
+
+    def test_groupement_pivot_et_percentiles(self):
+        self.vendre([(self.vase, 2), (self.bol, 1)])
+        self.vendre([(self.panier, 3)])
+
+        data = self.analyser(par='artisan,categorie')
+        self.assertEqual(data['lignes_analysees'], 3)
+        self.assertNotIn('duree_ms', data)
+        response = self.client.get(self.url, {'par': 'artisan,categorie'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse(response.has_header('X-Duree-Ms'))
+        self.assertEqual(data['groupes'], [
+            {'artisan': self.artisan.pk, 'categorie': None, 'chiffre_affaires': 2.0},
+            {'artisan': self.artisan.pk, 'categorie': self.categorie.pk, 'chiffre_affaires': 10.0},
+            {'artisan': self.autre.pk, 'categorie': None, 'chiffre_affaires': 21.0},
+        ])
+
+        data = self.analyser(type='pivot', lignes='produit', colonnes='jour', valeur='quantite')
+        self.assertEqual(data['lignes']['valeurs'], [self.vase.pk, self.bol.pk, self.panier.pk])
+        self.assertEqual(data['colonnes']['valeurs'], [self.jour])
+        self.assertEqual(data['matrice'], [[2.0], [1.0], [3.0]])
+
+        data = self.analyser(type='percentiles', mesure='panier_montant', q='0,50,100')
+        self.assertEqual(data['effectif'], 2)
+        self.assertEqual([p['valeur'] for p in data['percentiles']], [12.0, 16.5, 21.0])
+
+        data = self.analyser(artisan=self.autre.pk, par='produit', valeur='lignes')
+        self.assertEqual(data['groupes'], [{'produit': self.panier.pk, 'lignes': 1.0}])
+
+        self.assertEqual(self.client.get(self.url, {'par': 'client'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'type': 'pivot', 'lignes': 'jour'}).status_code, 400)
+
+    def test_pivot_trop_grand(self):
+        self.vendre([(self.vase, 2), (self.bol, 1)])
+        self.vendre([(self.panier, 3)])
+        params = {'type': 'pivot', 'lignes': 'produit', 'colonnes': 'artisan'}
+        with override_settings(STATS_PIVOT_MAX_CELLS=5):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('6 cellules', str(response.data['colonnes']))
+        with override_settings(STATS_PIVOT_MAX_CELLS=6):
+            self.assertEqual(self.client.get(self.url, params).status_code, 200)
+
+    def test_groupement_au_dela_des_indices_entiers(self):
+        # 10 000 valeurs sur cinq dimensions : 10^20 combinaisons, plus qu'un entier 64 bits
+        n = 10_000
+        quantity = np.ones(n, dtype=np.int32)
+        columns = SalesColumns({
+            'day': np.full(n, 19000, dtype=np.int32),
+            'vente': np.arange(n, dtype=np.int32),
+            'artisan': np.ones(n, dtype=np.int32),
+            'product': np.arange(n, 0, -1, dtype=np.int32),
+            'quantity': quantity,
+            'unit_price': np.ones(n),
+            'revenue': quantity * 1.0,
+        })
+        frame = Frame(columns, np.zeros(n + 1, dtype=np.int32))
+
+        labels, sums = group_by(frame, ['produit'] * 5)
+        self.assertEqual(labels[0], list(range(1, n + 1)))
+        self.assertEqual(labels[0], labels[4])
+        self.assertEqual(sums.tolist(), [1.0] * n)
+
+    def test_colonnes_rafraichies_apres_ajout_et_modification(self):
+        vente = self.vendre([(self.vase, 2)])
+        self.assertEqual(self.analyser(par='produit')['groupes'][0]['chiffre_affaires'], 10.0)
+        colonnes = get_columns()
+
+        # Nouvelle vente : les colonnes existantes sont complétées
+        self.vendre([(self.vase, 1)])
+        self.assertEqual(self.analyser(par='produit')['groupes'][0]['chiffre_affaires'], 15.0)
+        self.assertEqual(len(get_columns().vente_ids), 2)
+        self.assertEqual(len(colonnes), 1)  # les colonnes déjà servies ne changent pas
+
+        # Vente modifiée : rechargement complet
+        ligne = vente.lignes_vente.get()
+        ligne.quantity = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            ligne.save()
+        self.assertEqual(self.analyser(par='produit')['groupes'][0]['chiffre_affaires'], 25.0)
+
+        # La catégorie est lue à chaque analyse
+        Produit.objects.filter(pk=self.vase.pk).update(categorie=None)
+        cache.clear()
+        self.assertEqual(self.analyser(par='categorie')['groupes'], [{'categorie': None, 'chiffre_affaires': 25.0}])
+
+    def test_colonnes_sur_disque(self):
+        self.vendre([(self.vase, 2), (self.bol, 1)])
+        with tempfile.TemporaryDirectory() as tmp, override_settings(STATS_COLUMNS_DIR=f'{tmp}/colonnes'):
+            out = StringIO()
+            call_command('build_sales_columns', stdout=out)
+            self.assertIn('2 lignes ajoutées, 2 lignes au total', out.getvalue())
+
+            self.vendre([(self.panier, 3)])
+            out = StringIO()
+            call_command('build_sales_columns', stdout=out)
+            self.assertIn('1 lignes ajoutées, 3 lignes au total', out.getvalue())
+            self.assertEqual(len(ColumnStore(f'{tmp}/colonnes').parts()), 2)
+
+            columns_cache.clear()
+            self.assertEqual(self.analyser(par='artisan')['groupes'], [
+                {'artisan': self.artisan.pk, 'chiffre_affaires': 12.0},
+                {'artisan': self.autre.pk, 'chiffre_affaires': 21.0},
+            ])
+
+            call_command('build_sales_columns', '--rebuild', stdout=StringIO())
+            self.assertEqual(len(ColumnStore(f'{tmp}/colonnes').parts()), 1)
+            self.assertEqual(len(ColumnStore(f'{tmp}/colonnes').load()), 3)
+
+    def test_pivot_vectorise_sur_deux_millions_de_lignes(self):
+        rng = np.random.default_rng(0)
+        n = 2_000_000
+        quantity = rng.integers(1, 5, n, dtype=np.int32)
+        unit_price = rng.integers(100, 10000, n) / 100
+        columns = SalesColumns({
+            'day': rng.integers(19000, 20000, n, dtype=np.int32),
+            'vente': np.arange(n, dtype=np.int32) // 3,
+            'artisan': rng.integers(1, 200, n, dtype=np.int32),
+            'product': rng.integers(1, 5000, n, dtype=np.int32),
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'revenue': quantity * unit_price,
+        })
+        frame = Frame(columns, rng.integers(1, 30, 5000, dtype=np.int32))
+
+        debut = time.perf_counter()
+        lignes, colonnes, matrice = pivot(frame, 'categorie', 'mois', 'chiffre_affaires')
+        duree = time.perf_counter() - debut
+
+        self.assertEqual(matrice.shape, (len(lignes), len(colonnes)))
+        self.assertAlmostEqual(matrice.sum(), columns['revenue'].sum(), places=2)
+        self.assertLess(duree, 1.0)
+
+
+class ComparaisonPeriodesTests(APITestCase):
+    url = '/api/stats/comparaison/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.categorie = Categorie.objects.create(nom='Poterie')
+        self.vase = creer_produit(self.artisan, stock=100, name='Vase', price='5.00')
+        self.panier = creer_produit(self.autre, stock=100, name='Panier', price='7.00')
+        Produit.objects.filter(pk=self.vase.pk).update(categorie=self.categorie)
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+
+        # Ce mois-ci : 2 vases et 1 panier ; même jour le mois dernier : 1 vase
+        self.aujourdhui = timezone.localdate()
+        _, (_, self.jour_reference) = comparison_periods('mois', self.aujourdhui)
+        self.vendre(self.vase, 2)
+        self.vendre(self.panier, 1)
+        ancienne = self.vendre(self.vase, 1)
+        Vente.objects.filter(pk=ancienne.pk).update(
+            sale_date=timezone.make_aware(datetime.combine(self.jour_reference, datetime.min.time()))
+        )
+        call_command('rebuild_daily_sales', stdout=StringIO())
+
+    def vendre(self, produit, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': produit.artisan_id,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': produit.pk, 'quantity': quantity}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Vente.objects.get(pk=response.data['id'])
+
+    def test_mois_en_cours_contre_mois_precedent(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['reference']['fin'], self.jour_reference)
+
+        vase, panier = response.data['groupes']
+        self.assertEqual((vase['id'], vase['nom']), (self.artisan.pk, 'Test Artisan'))
+        self.assertEqual(vase['actuel']['chiffre_affaires'], Decimal('10.00'))
+        self.assertEqual(vase['reference']['chiffre_affaires'], Decimal('5.00'))
+        self.assertEqual(vase['ecart']['quantite'], 1)
+        self.assertEqual(vase['evolution_pct'], {'chiffre_affaires': 100.0, 'quantite': 100.0, 'ventes': 0.0})
+        self.assertIsNone(panier['evolution_pct']['chiffre_affaires'])
+        self.assertEqual(response.data['total']['actuel']['chiffre_affaires'], Decimal('17.00'))
+
+        with CaptureQueriesContext(connection) as requetes:
+            compare_periods(
+                (self.aujourdhui.replace(day=1), self.aujourdhui),
+                (self.jour_reference.replace(day=1), self.jour_reference),
+                par='categorie'
+            )
+        self.assertEqual(len(requetes), 1)
+
+    def test_periodes_explicites_et_artisan(self):
+        params = {
+            'par': 'produit',
+            'date_debut': str(self.aujourdhui), 'date_fin': str(self.aujourdhui),
+            'reference_debut': str(self.jour_reference), 'reference_fin': str(self.jour_reference),
+        }
+        self.client.force_authenticate(user=self.artisan.user)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([g['nom'] for g in response.data['groupes']], ['Vase'])
+        self.assertEqual(response.data['total']['ecart']['chiffre_affaires'], Decimal('5.00'))
+
+        self.assertEqual(self.client.get(self.url, {'date_debut': '2025-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'par': 'client'}).status_code, 400)
+
+
+class TableauDeBordTests(APITestCase):
+    url = '/api/stats/dashboard-stats/'
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+
+    def test_tableau_de_bord_en_deux_requetes(self):
+        seed_sales(600, jours=60, artisans=3, produits=9)
+        attendu = DailyArtisanAggregate.objects.aggregate(ventes=Sum('sales_count'), total=Sum('revenue'))
+        debut_mois = timezone.localdate().replace(day=1)
+        mensuel = DailyArtisanAggregate.objects.filter(day__gte=debut_mois).aggregate(ventes=Sum('sales_count'))
+
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in requetes.captured_queries if 'stats_' in q['sql']]), 2)
+        self.assertEqual(response.data['total_ventes'], 200)
+        self.assertEqual(response.data['total_ventes'], attendu['ventes'])
+        self.assertEqual(response.data['chiffre_affaires_total'], float(attendu['total']))
+        self.assertEqual(response.data['stats_mensuelles']['total_ventes'], mensuel['ventes'] or 0)
+        self.assertEqual(len(response.data['stats_artisans']), 3)
+        self.assertEqual(len(response.data['top_produits']), 5)
+
+    def test_requetes_en_parallele(self):
+        threads = set()
+
+        def requete():
+            threads.add(threading.get_ident())
+            return len(threads)
+
+        # Dans une transaction (comme ici), les requêtes restent dans le thread appelant
+        with override_settings(STATS_QUERY_THREADS=2):
+            self.assertEqual(run_concurrently(requete, requete), [1, 1])
+        self.assertEqual(threads, {threading.get_ident()})
+
+        threads.clear()
+        barriere = threading.Barrier(2, timeout=5)
+
+        def requete_simultanee():
+            barriere.wait()  # bloquerait si les deux appels n'étaient pas simultanés
+            threads.add(threading.get_ident())
+
+        with override_settings(STATS_QUERY_THREADS=2), mock.patch.object(connection, 'in_atomic_block', False):
+            run_concurrently(requete_simultanee, requete_simultanee)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_banc_d_essai(self):
+        out = StringIO()
+        call_command('benchmark_dashboard', '--seed-lignes', '90', '--jours', '10', '--requetes', '3', stdout=out)
+        self.assertIn('30 ventes et 90 lignes créées', out.getvalue())
+        self.assertRegex(out.getvalue(), r'enchaîné : p50 [\d.]+ ms, p95 [\d.]+ ms')
+        self.assertIn('parallèle (2 threads)', out.getvalue())
+
+
+class StatistiquesCategoriesTests(APITestCase):
+    url = '/api/stats/categories/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.poterie = Categorie.objects.create(nom='Poterie')
+        self.vannerie = Categorie.objects.create(nom='Vannerie')
+        self.vase = creer_produit(self.artisan, stock=10, name='Vase', price='5.00')
+        self.vase.categorie = self.poterie
+        self.vase.save()
+        self.bol = creer_produit(self.artisan, stock=4, name='Bol', price='2.00')
+        self.panier = creer_produit(self.autre, stock=3, name='Panier', price='7.00')
+        self.panier.categorie = self.vannerie
+        self.panier.save()
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+
+    def vendre(self, produit, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ventes/', {
+                'artisan': produit.artisan_id,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': produit.pk, 'quantity': quantity}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Vente.objects.get(pk=response.data['id'])
+
+    def categories(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {
+            c['categorie']: (c['chiffre_affaires'], c['quantite_vendue'], c['produits_actifs'],
+                             c['stock'], c['valeur_stock'])
+            for c in response.data['categories']
+        }
+
+    def test_compteurs_tenus_a_jour(self):
+        self.vendre(self.vase, 2)
+        vente = self.vendre(self.panier, 3)
+        self.assertEqual(self.categories(), {
+            'Poterie': (Decimal('10.00'), 2, 1, 8, Decimal('40.00')),
+            None: (Decimal('0.00'), 0, 1, 4, Decimal('8.00')),
+            'Vannerie': (Decimal('21.00'), 3, 0, 0, Decimal('0.00')),
+        })
+        self.assertEqual(self.categories(artisan=self.autre.pk), {
+            'Vannerie': (Decimal('21.00'), 3, 0, 0, Decimal('0.00')),
+        })
+
+        # Ligne modifiée, produit modifié, vente supprimée
+        ligne = vente.lignes_vente.get()
+        ligne.quantity = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            ligne.save()
+            self.bol.price = Decimal('3.00')
+            self.bol.categorie = self.poterie
+            self.bol.save()
+        self.assertEqual(self.categories(), {
+            'Poterie': (Decimal('10.00'), 2, 2, 12, Decimal('52.00')),
+            'Vannerie': (Decimal('7.00'), 1, 1, 2, Decimal('14.00')),
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            vente.delete()
+            self.vannerie.delete()
+        self.assertEqual(self.categories()[None], (Decimal('0.00'), 0, 1, 2, Decimal('14.00')))
+
+        with CaptureQueriesContext(connection) as requetes:
+            category_stats()
+        self.assertEqual(len(requetes), 2)
+
+        out = StringIO()
+        call_command('reconcile_category_stats', '--check', stdout=out)
+        self.assertIn('0 écarts', out.getvalue())
+
+    def test_reconciliation_et_artisan(self):
+        self.vendre(self.vase, 2)
+        Produit.objects.filter(pk=self.bol.pk).update(stock=40)
+        with self.assertRaises(SystemExit):
+            call_command('reconcile_category_stats', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('reconcile_category_stats', stdout=out)
+        self.assertIn('2 écarts corrigés', out.getvalue())
+        self.assertEqual(self.categories()[None], (Decimal('0.00'), 0, 1, 40, Decimal('80.00')))
+
+        self.client.force_authenticate(user=self.autre.user)
+        response = self.client.get(self.url, {'artisan': self.artisan.pk})
+        self.assertEqual(response.data['artisan'], self.autre.pk)
+        self.assertEqual(response.data['total']['valeur_stock'], Decimal('21.00'))
+
+    def test_changement_de_categorie(self):
+        self.vendre(self.vase, 2)
+        self.vase.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vase.categorie = self.vannerie
+            self.vase.save()
+        # Les ventes suivent le produit dans sa nouvelle catégorie
+        self.assertEqual(self.categories()['Vannerie'], (Decimal('10.00'), 2, 2, 11, Decimal('61.00')))
+        self.assertNotIn('Poterie', self.categories())
+        out = StringIO()
+        call_command('reconcile_category_stats', '--check', stdout=out)
+        self.assertIn('0 écarts', out.getvalue())
+
+    def test_migration_remplit_les_compteurs(self):
+        self.vendre(self.vase, 2)
+        self.vendre(self.panier, 3)
+        CategoryStats.objects.all().delete()
+
+        migration = import_module('stats.migrations.0004_category_stats')
+        migration.backfill_category_stats(django_apps, None)
+        out = StringIO()
+        call_command('reconcile_category_stats', '--check', stdout=out)
+        self.assertIn('0 écarts', out.getvalue())
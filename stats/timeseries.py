@@ -0,0 +1,115 @@
+# stats/timeseries.py
+"""
+Séries temporelles des ventes (chiffre d'affaires, quantités, ventes) par
+jour, semaine ou mois, calculées sur les agrégats journaliers.
+
+Une série est un seul GROUP BY sur la colonne `day` des agrégats (indexée,
+seule ou après l'artisan ou le produit), puis les périodes sans vente sont
+complétées à zéro en Python.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyArtisanAggregate, DailySalesAggregate
+
+# Nombre maximal de périodes renvoyées par série
+MAX_BUCKETS = 1000
+
+CENTIME = Decimal('0.01')
+
+INTERVALLES = {
+    'jour': lambda: F('day'),
+    'semaine': lambda: TruncWeek('day'),
+    'mois': lambda: TruncMonth('day'),
+}
+
+# Nombre de périodes affichées quand date_debut n'est pas fourni
+PERIODES_PAR_DEFAUT = {'jour': 30, 'semaine': 12, 'mois': 12}
+
+
+def bucket_start(day, intervalle):
+    """Premier jour de la période contenant `day` (semaines commençant le lundi)."""
+    if intervalle == 'semaine':
+        return day - timedelta(days=day.weekday())
+    if intervalle == 'mois':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, intervalle):
+    if intervalle == 'semaine':
+        return start + timedelta(days=7)
+    if intervalle == 'mois':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def default_start(end, intervalle):
+    """Début de la série par défaut : les N dernières périodes jusqu'à `end`."""
+    start = bucket_start(end, intervalle)
+    for _ in range(PERIODES_PAR_DEFAUT[intervalle] - 1):
+        start = bucket_start(start - timedelta(days=1), intervalle)
+    return start
+
+
+def align_period(start, end, intervalle):
+    """Étend [start, end] aux périodes complètes qui les contiennent."""
+    last = next_bucket(bucket_start(end, intervalle), intervalle) - timedelta(days=1)
+    return bucket_start(start, intervalle), last
+
+
+def count_buckets(start, end, intervalle):
+    if intervalle == 'jour':
+        return (end - start).days + 1
+    if intervalle == 'semaine':
+        return (bucket_start(end, 'semaine') - bucket_start(start, 'semaine')).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def sales_timeseries(start, end, intervalle='jour', artisan=None, categorie=None, produit=None):
+    """
+    Série des ventes entre `start` et `end` (dates incluses, à aligner au
+    préalable sur des périodes complètes avec align_period).
+
+    Sans filtre produit ou catégorie, la série est lue dans les agrégats par
+    artisan et `ventes` est le nombre de ventes. Avec ces filtres, elle est lue
+    dans les agrégats par produit et `ventes` compte les lignes de vente
+    concernées (une vente contenant deux produits filtrés compte deux fois).
+    """
+    if produit is not None or categorie is not None:
+        queryset = DailySalesAggregate.objects.all()
+        ventes = 'lines_count'
+    else:
+        queryset = DailyArtisanAggregate.objects.all()
+        ventes = 'sales_count'
+
+    queryset = queryset.filter(day__gte=start, day__lte=end)
+    if artisan is not None:
+        queryset = queryset.filter(artisan_id=artisan)
+    if categorie is not None:
+        queryset = queryset.filter(product__categorie_id=categorie)
+    if produit is not None:
+        queryset = queryset.filter(product_id=produit)
+
+    rows = queryset.annotate(bucket=INTERVALLES[intervalle]()).values('bucket').annotate(
+        chiffre_affaires=Sum('revenue'),
+        quantite=Sum('quantity'),
+        ventes=Sum(ventes)
+    ).order_by('bucket')
+    par_periode = {row['bucket']: row for row in rows}
+
+    series = []
+    bucket = bucket_start(start, intervalle)
+    while bucket <= end:
+        row = par_periode.get(bucket, {})
+        series.append({
+            'debut': bucket,
+            'chiffre_affaires': Decimal(row.get('chiffre_affaires') or 0).quantize(CENTIME),
+            'quantite': row.get('quantite') or 0,
+            'ventes': row.get('ventes') or 0,
+        })
+        bucket = next_bucket(bucket, intervalle)
+    return series
@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import StatsView, ReportCardView, DashboardStatsView
+from .views import (
+    StatsView, ReportCardView, DashboardStatsView, TimeseriesView, TopProduitsView,
+    AnalyticsView, ComparaisonView, CategoriesView
+)
 
 urlpatterns = [
     path('dashboard/', StatsView.as_view(), name='dashboard-stats'),
     path('report-card/', ReportCardView.as_view(), name='report-card'),
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('timeseries/', TimeseriesView.as_view(), name='stats-timeseries'),
+    path('top-produits/', TopProduitsView.as_view(), name='stats-top-produits'),
+    path('analytics/', AnalyticsView.as_view(), name='stats-analytics'),
+    path('comparaison/', ComparaisonView.as_view(), name='stats-comparaison'),
+    path('categories/', CategoriesView.as_view(), name='stats-categories'),
 ]
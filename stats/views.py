@@ -1,20 +1,74 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, permissions
-from django.db.models import Sum, Count, F
+from rest_framework import status
+from django.db.models import Sum, F
 from artisans.models import Artisan
 from produits.models import Produit
-from ventes.models import Vente
-from users.permissions import IsAdminUser, IsSecondaryAdminUser
+from users.permissions import IsAdminUser, IsArtisanUser, IsSecondaryAdminUser
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
-from ventes.models import Vente, LigneVente
+from datetime import datetime, timezone as dt_timezone
+import time
+from ventes.filters import _parse_jour
+from .analytics import (
+    DIMENSIONS, MEASURES, VALUES, PivotTooLarge, filter_mask, group_by, load_frame, measure, percentiles,
+    pivot
+)
+from .cache import cached_stats_view
+from .categories import category_stats
+from .comparison import DIMENSIONS as COMPARAISON_DIMENSIONS, PERIODES, compare_periods, comparison_periods
+from .dashboard import dashboard_stats
+from .leaderboard import MAX_LIMIT, WINDOWS, top_products
+from .models import DailyArtisanAggregate, ProductLeaderboard
+from .report_card import REPORT_FORMATS, snapshot_path, stream_report_card
+from .timeseries import (
+    INTERVALLES, MAX_BUCKETS, align_period, count_buckets, default_start, sales_timeseries
+)
+
+
+def _parse_id(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    if not str(value).isdigit():
+        raise ValidationError({name: "Identifiant invalide."})
+    return int(value)
+
+
+ANALYSES = ('groupement', 'pivot', 'percentiles')
+
+
+def _parse_choice(params, name, choices, default):
+    value = params.get(name) or default
+    if value is not None and value not in choices:
+        raise ValidationError({name: f"Valeurs possibles : {', '.join(choices)}."})
+    return value
+
+
+def _parse_percentiles(params):
+    try:
+        q = [float(value) for value in params.get('q', '50,90,95,99').split(',')]
+    except ValueError:
+        q = None
+    if not q or not all(0 <= value <= 100 for value in q):
+        raise ValidationError({'q': "Percentiles entre 0 et 100 séparés par des virgules."})
+    return q
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
 
 class StatsView(APIView):
     """
     API endpoint to retrieve general statistics for the GestiArt application.
     Accessible by Admin and Secondary Admin users.
 
+    Sales figures are read from the daily rollups (stats.models), so the cost
+    of this view depends on the number of days and products, not on the
+    number of sales.
+
     Returns:
     - total_artisans: Total number of artisans.
     - active_products: Number of products with stock greater than 0.
@@ -25,6 +79,7 @@ class StatsView(APIView):
     """
     permission_classes = [IsAdminUser | IsSecondaryAdminUser]
 
+    @cached_stats_view('sales', 'products', 'artisans')
     def get(self, request, format=None):
         """
         Handles GET requests to retrieve various statistics.
@@ -32,37 +87,44 @@ class StatsView(APIView):
         total_artisans = Artisan.objects.count()
         active_products = Produit.objects.filter(stock__gt=0).count()
 
-      # Calculer le chiffre d'affaires total à partir des lignes de vente
-        total_sales_global = LigneVente.objects.aggregate(
-            total_sum=Sum(F('quantity') * F('unit_price'))
+        # Chiffre d'affaires total à partir des agrégats journaliers
+        total_sales_global = DailyArtisanAggregate.objects.aggregate(
+            total_sum=Sum('revenue')
         )['total_sum'] or 0
 
         total_revenue = total_sales_global
 
         # Ventes par artisan
-        sales_by_artisan = LigneVente.objects.values(
-            'vente__artisan__id',
-            'vente__artisan__prenom',
-            'vente__artisan__nom'
-        ).annotate(
-            total_sales=Sum(F('quantity') * F('unit_price'))
-        ).order_by('-total_sales')
-
-  # Produits les plus vendus
-        top_selling_products = LigneVente.objects.values(
+        sales_by_artisan = [
+            {
+                'vente__artisan__id': row['artisan__id'],
+                'vente__artisan__prenom': row['artisan__prenom'],
+                'vente__artisan__nom': row['artisan__nom'],
+                'total_sales': row['total_sales'],
+            }
+            for row in DailyArtisanAggregate.objects.filter(lines_count__gt=0).values(
+                'artisan__id',
+                'artisan__prenom',
+                'artisan__nom'
+            ).annotate(
+                total_sales=Sum('revenue')
+            ).order_by('-total_sales')
+        ]
+
+        # Produits les plus vendus (classement tenu à jour à chaque vente)
+        top_selling_products = top_products(limit=5).values(
             'product__id',
-            'product__name'
-        ).annotate(
-            total_quantity_sold=Sum('quantity'),
-            total_revenue=Sum(F('quantity') * F('unit_price'))
-        ).order_by('-total_quantity_sold')[:5]
+            'product__name',
+            total_quantity_sold=F('quantity'),
+            total_revenue=F('revenue')
+        )
 
         data = {
             'total_artisans': total_artisans,
             'active_products': active_products,
             'total_sales_global': float(total_sales_global),
             'total_revenue': float(total_revenue),
-            'sales_by_artisan': list(sales_by_artisan),
+            'sales_by_artisan': sales_by_artisan,
             'top_selling_products': list(top_selling_products),
         }
         return Response(data, status=status.HTTP_200_OK)
@@ -72,7 +134,14 @@ class ReportCardView(APIView):
     API endpoint to generate a tabular report card for all artisans, their products, and sales.
     Accessible by Admin and Secondary Admin users.
 
-    Returns a list of dictionaries, where each dictionary represents a row in the report table.
+    The report is built by a single query (see stats.report_card) and streamed,
+    so it takes the same number of queries for 10 or 10,000 artisans.
+
+    Query parameters:
+    - export: 'json' (default) or 'csv'.
+    - snapshot: '1' to serve the precomputed snapshot written by
+      `manage.py snapshot_report_card` instead of querying the database.
+
     Each row contains:
     - artisan_name: Full name of the artisan.
     - speciality: Artisan's speciality.
@@ -85,96 +154,328 @@ class ReportCardView(APIView):
     """
     permission_classes = [IsAdminUser | IsSecondaryAdminUser]
 
+    @cached_stats_view('sales', 'products', 'artisans')
     def get(self, request, format=None):
         """
         Handles GET requests to generate the report card.
         """
-        report_data = []
-        artisans = Artisan.objects.all()
-
-        for artisan in artisans:
-            products = Produit.objects.filter(artisan=artisan)
-            if not products.exists():
-                report_data.append({
-                    'artisan_name': f'{artisan.first_name} {artisan.last_name}',
-                    'speciality': artisan.speciality,
-                    'product_name': 'N/A',
-                    'product_category': 'N/A',
-                    'product_price': 0,
-                    'product_stock': 0,
-                    'total_sales_for_product': 0,
-                    'revenue_for_product': 0,
-                })
-                continue
-
-            for product in products:
-                sales_for_product = Vente.objects.filter(product=product)
-                total_quantity_sold = sales_for_product.aggregate(Sum('quantity'))['quantity__sum'] or 0
-                revenue_for_product = sales_for_product.aggregate(total_revenue=Sum(F('quantity') * F('unit_price')))['total_revenue'] or 0
-
-                report_data.append({
-                    'artisan_name': f'{artisan.first_name} {artisan.last_name}',
-                    'speciality': artisan.speciality,
-                    'product_name': product.name,
-                    'product_category': product.category,
-                    'product_price': product.price,
-                    'product_stock': product.stock,
-                    'total_sales_for_product': total_quantity_sold,
-                    'revenue_for_product': revenue_for_product,
-                })
-        
-        return Response(report_data, status=status.HTTP_200_OK)
+        export = request.query_params.get('export', 'json')
+        if export not in REPORT_FORMATS:
+            return Response(
+                {'export': [f"Format inconnu, valeurs possibles : {', '.join(REPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.query_params.get('snapshot') in ('1', 'true'):
+            path = snapshot_path(export)
+            if not path.exists():
+                return Response(
+                    {'detail': "Aucun instantané disponible. Lancer manage.py snapshot_report_card."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            response = FileResponse(open(path, 'rb'), content_type=REPORT_FORMATS[export])
+            generated = datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc)
+            response['X-Snapshot-Date'] = generated.isoformat()
+        else:
+            response = StreamingHttpResponse(
+                stream_report_card(export),
+                content_type=REPORT_FORMATS[export]
+            )
+
+        if export == 'csv':
+            response['Content-Disposition'] = (
+                f'attachment; filename="bulletin-{timezone.localdate():%Y%m%d}.csv"'
+            )
+        return response
 
 class DashboardStatsView(APIView):
+    """
+    Tableau de bord des ventes, calculé en deux requêtes sur les agrégats
+    journaliers et les classements (voir stats/dashboard.py).
+    """
+    @cached_stats_view('sales', 'products', 'artisans')
     def get(self, request):
-        # Statistiques des ventes
-        total_ventes = Vente.objects.count()
-        
-        # Calculer le chiffre d'affaires total
-        total_sales = LigneVente.objects.aggregate(
-            total=Sum(F('quantity') * F('unit_price'))
-        )['total'] or 0
-        
-        # Produits les plus vendus
-        top_products = LigneVente.objects.values(
+        return Response(dashboard_stats())
+
+
+class TimeseriesView(APIView):
+    """
+    Série temporelle des ventes : chiffre d'affaires, quantités et nombre de
+    ventes par jour, semaine ou mois, périodes vides comprises (à zéro).
+
+    Paramètres :
+    - intervalle : jour (défaut), semaine ou mois ;
+    - date_debut, date_fin : AAAA-MM-JJ, bornes incluses et étendues aux
+      périodes complètes (défaut : les 30 derniers jours, 12 dernières
+      semaines ou 12 derniers mois) ;
+    - artisan, categorie, produit : identifiants pour filtrer la série.
+
+    Un artisan ne voit que ses propres ventes.
+    """
+    permission_classes = [IsAdminUser | IsSecondaryAdminUser | IsArtisanUser]
+
+    @cached_stats_view('sales', 'products')
+    def get(self, request, format=None):
+        params = request.query_params
+        intervalle = params.get('intervalle', 'jour')
+        if intervalle not in INTERVALLES:
+            raise ValidationError({
+                'intervalle': f"Valeurs possibles : {', '.join(INTERVALLES)}."
+            })
+
+        date_fin = _parse_jour(params, 'date_fin') or timezone.localdate()
+        date_debut = _parse_jour(params, 'date_debut') or default_start(date_fin, intervalle)
+        if date_debut > date_fin:
+            raise ValidationError({'date_debut': "date_debut doit précéder date_fin."})
+        date_debut, date_fin = align_period(date_debut, date_fin, intervalle)
+        if count_buckets(date_debut, date_fin, intervalle) > MAX_BUCKETS:
+            raise ValidationError({
+                'date_debut': f"Période trop longue : {MAX_BUCKETS} périodes au maximum."
+            })
+
+        filtres = {name: _parse_id(params, name) for name in ('artisan', 'categorie', 'produit')}
+        if request.user.user_type == 'artisan':
+            filtres['artisan'] = request.user.artisan_shop.pk
+
+        return Response({
+            'intervalle': intervalle,
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'series': sales_timeseries(date_debut, date_fin, intervalle, **filtres),
+        })
+
+
+class TopProduitsView(APIView):
+    """
+    Produits les plus vendus, lus dans les classements tenus à jour à chaque vente.
+
+    Paramètres :
+    - portee : global (défaut), artisan ou categorie ;
+    - id : identifiant de l'artisan ou de la catégorie (requis hors portée globale) ;
+    - fenetre : tout (défaut), 7j ou 30j ;
+    - limite : nombre de produits (défaut 10, 100 au maximum).
+
+    Un artisan ne voit que son propre classement.
+    """
+    permission_classes = [IsAdminUser | IsSecondaryAdminUser | IsArtisanUser]
+
+    @cached_stats_view('sales', 'products')
+    def get(self, request, format=None):
+        params = request.query_params
+        scopes = [scope for scope, _ in ProductLeaderboard.SCOPE_CHOICES]
+        portee = params.get('portee', ProductLeaderboard.SCOPE_GLOBAL)
+        if portee not in scopes:
+            raise ValidationError({'portee': f"Valeurs possibles : {', '.join(scopes)}."})
+        fenetre = params.get('fenetre', 'tout')
+        if fenetre not in WINDOWS:
+            raise ValidationError({'fenetre': f"Valeurs possibles : {', '.join(WINDOWS)}."})
+        limite = params.get('limite', '10')
+        if not limite.isdigit() or not 1 <= int(limite) <= MAX_LIMIT:
+            raise ValidationError({'limite': f"Nombre entre 1 et {MAX_LIMIT} attendu."})
+
+        if request.user.user_type == 'artisan':
+            portee, scope_id = ProductLeaderboard.SCOPE_ARTISAN, request.user.artisan_shop.pk
+        elif portee == ProductLeaderboard.SCOPE_GLOBAL:
+            scope_id = 0
+        else:
+            scope_id = _parse_id(params, 'id')
+            if scope_id is None:
+                raise ValidationError({'id': "Identifiant requis pour cette portée."})
+
+        classement = top_products(portee, scope_id, fenetre, int(limite)).values(
             'product__id',
-            'product__name'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_sales=Sum(F('quantity') * F('unit_price'))
-        ).order_by('-total_quantity')[:5]  # Top 5 des produits
-        
-        # Statistiques par artisan
-        stats_artisans = Vente.objects.values(
-            'artisan__id',
-            'artisan__prenom',
-            'artisan__nom'
-        ).annotate(
-            total_ventes=Count('id'),
-            chiffre_affaires=Sum('lignes_vente__quantity') * F('lignes_vente__unit_price')
+            'product__name',
+            'quantity',
+            'revenue'
         )
-        
-        # Statistiques mensuelles
-        start_date = timezone.now().replace(day=1, hour=0, minute=0, second=0)
-        end_date = (start_date + timedelta(days=32)).replace(day=1)
-        
-        stats_mensuelles = LigneVente.objects.filter(
-            vente__sale_date__gte=start_date,
-            vente__sale_date__lt=end_date
-        ).aggregate(
-            total_ventes=Count('vente', distinct=True),
-            total_produits=Sum('quantity'),
-            chiffre_affaires=Sum(F('quantity') * F('unit_price'))
+        return Response({
+            'portee': portee,
+            'id': scope_id,
+            'fenetre': fenetre,
+            'produits': [
+                {
+                    'rang': rang,
+                    'produit_id': row['product__id'],
+                    'produit': row['product__name'],
+                    'quantite': row['quantity'],
+                    'chiffre_affaires': row['revenue'],
+                }
+                for rang, row in enumerate(classement, start=1)
+            ],
+        })
+
+
+class AnalyticsView(APIView):
+    """
+    Analyses ad hoc des lignes de vente, calculées en colonnes (stats/analytics.py).
+
+    Paramètres :
+    - type : groupement (défaut), pivot ou percentiles ;
+    - groupement : par (dimensions séparées par des virgules, défaut artisan) ;
+    - pivot : lignes et colonnes (une dimension chacune) ;
+    - groupement et pivot : valeur, chiffre_affaires (défaut), quantite ou lignes ;
+    - percentiles : mesure, panier_montant (défaut), panier_quantite ou
+      prix_unitaire, et q (défaut 50,90,95,99) ;
+    - date_debut, date_fin, artisan, categorie, produit : filtres des lignes.
+
+    Dimensions : artisan, categorie, produit, jour, mois, annee.
+    """
+    permission_classes = [IsAdminUser | IsSecondaryAdminUser]
+
+    @cached_stats_view('sales', 'products')
+    def get(self, request, format=None):
+        params = request.query_params
+        type_analyse = params.get('type', 'groupement')
+        if type_analyse not in ANALYSES:
+            raise ValidationError({'type': f"Valeurs possibles : {', '.join(ANALYSES)}."})
+
+        debut = time.perf_counter()
+        frame = load_frame()
+        mask = filter_mask(
+            frame,
+            date_debut=_parse_jour(params, 'date_debut'),
+            date_fin=_parse_jour(params, 'date_fin'),
+            **{name: _parse_id(params, name) for name in ('artisan', 'categorie', 'produit')}
         )
-        
+        data = {'type': type_analyse}
+
+        if type_analyse == 'percentiles':
+            mesure = _parse_choice(params, 'mesure', MEASURES, 'panier_montant')
+            q = _parse_percentiles(params)
+            valeurs = measure(frame, mesure, mask)
+            data.update({
+                'mesure': mesure,
+                'effectif': len(valeurs),
+                'percentiles': [
+                    {'q': rang, 'valeur': _round(valeur)}
+                    for rang, valeur in zip(q, percentiles(valeurs, q))
+                ],
+            })
+        else:
+            valeur = _parse_choice(params, 'valeur', VALUES, 'chiffre_affaires')
+            data['valeur'] = valeur
+            if type_analyse == 'pivot':
+                lignes = _parse_choice(params, 'lignes', DIMENSIONS, None)
+                colonnes = _parse_choice(params, 'colonnes', DIMENSIONS, None)
+                if lignes is None or colonnes is None or lignes == colonnes:
+                    raise ValidationError({
+                        'colonnes': "Deux dimensions différentes sont requises (lignes, colonnes)."
+                    })
+                try:
+                    row_labels, col_labels, matrix = pivot(frame, lignes, colonnes, valeur, mask)
+                except PivotTooLarge as e:
+                    raise ValidationError({
+                        'colonnes': f"Tableau croisé trop grand ({e.cells} cellules, "
+                                    f"{e.max_cells} au maximum) : filtrer ou choisir "
+                                    "des dimensions moins détaillées."
+                    })
+                data.update({
+                    'lignes': {'dimension': lignes, 'valeurs': row_labels},
+                    'colonnes': {'dimension': colonnes, 'valeurs': col_labels},
+                    'matrice': [[_round(cell) for cell in row] for row in matrix.tolist()],
+                })
+            else:
+                par = params.get('par', 'artisan').split(',')
+                if not par or len(set(par)) != len(par) or not set(par) <= set(DIMENSIONS):
+                    raise ValidationError({
+                        'par': f"Dimensions distinctes parmi : {', '.join(DIMENSIONS)}."
+                    })
+                labels, sums = group_by(frame, par, valeur, mask)
+                data.update({
+                    'par': par,
+                    'groupes': [
+                        {**dict(zip(par, cles)), valeur: _round(total)}
+                        for *cles, total in zip(*labels, sums.tolist())
+                    ],
+                })
+
+        data['lignes_analysees'] = len(frame) if mask is None else int(mask.sum())
+        response = Response(data)
+        # En-tête et non donnée : une réponse servie par le cache n'en a pas
+        response['X-Duree-Ms'] = round((time.perf_counter() - debut) * 1000, 1)
+        return response
+
+
+
+class ComparaisonView(APIView):
+    """
+    Comparaison de deux périodes : indicateurs de chaque période, écarts et
+    évolutions en pourcentage, par artisan, catégorie ou produit.
+
+    Paramètres :
+    - par : artisan (défaut), categorie ou produit ;
+    - periode : mois (défaut), annee ou semaine : la période en cours jusqu'à
+      date_fin (défaut aujourd'hui) comparée à la même portion de la période
+      précédente ;
+    - ou date_debut, date_fin, reference_debut, reference_fin pour comparer
+      deux périodes quelconques ;
+    - artisan, categorie : filtres.
+
+    Un artisan ne voit que ses propres ventes.
+    """
+    permission_classes = [IsAdminUser | IsSecondaryAdminUser | IsArtisanUser]
+
+    @cached_stats_view('sales', 'products', 'artisans')
+    def get(self, request, format=None):
+        params = request.query_params
+        par = _parse_choice(params, 'par', tuple(COMPARAISON_DIMENSIONS), 'artisan')
+        periode = _parse_choice(params, 'periode', PERIODES, 'mois')
+
+        date_debut = _parse_jour(params, 'date_debut')
+        date_fin = _parse_jour(params, 'date_fin') or timezone.localdate()
+        reference = (_parse_jour(params, 'reference_debut'), _parse_jour(params, 'reference_fin'))
+        if date_debut is None and reference == (None, None):
+            actuel, reference = comparison_periods(periode, date_fin)
+        elif date_debut is None or None in reference:
+            raise ValidationError({
+                'reference_debut': "date_debut, reference_debut et reference_fin vont ensemble."
+            })
+        else:
+            actuel = (date_debut, date_fin)
+        for name, (debut, fin) in (('date_debut', actuel), ('reference_debut', reference)):
+            if debut > fin:
+                raise ValidationError({name: "Le début doit précéder la fin de la période."})
+
+        filtres = {name: _parse_id(params, name) for name in ('artisan', 'categorie')}
+        if request.user.user_type == 'artisan':
+            filtres['artisan'] = request.user.artisan_shop.pk
+
+        groupes, total = compare_periods(actuel, reference, par, **filtres)
+        return Response({
+            'par': par,
+            'actuel': {'debut': actuel[0], 'fin': actuel[1]},
+            'reference': {'debut': reference[0], 'fin': reference[1]},
+            'total': total,
+            'groupes': groupes,
+        })
+
+
+class CategoriesView(APIView):
+    """
+    Chiffre d'affaires, quantités vendues, produits (dont en stock) et valeur
+    du stock par catégorie, lus dans des compteurs tenus à jour (une ligne par
+    catégorie).
+
+    Paramètre : artisan (défaut : tous les artisans). Un artisan ne voit que
+    ses propres chiffres.
+    """
+    permission_classes = [IsAdminUser | IsSecondaryAdminUser | IsArtisanUser]
+
+    @cached_stats_view('sales', 'products')
+    def get(self, request, format=None):
+        artisan = _parse_id(request.query_params, 'artisan')
+        if request.user.user_type == 'artisan':
+            artisan = request.user.artisan_shop.pk
+
+        categories = category_stats(artisan)
         return Response({
-            'total_ventes': total_ventes,
-            'chiffre_affaires_total': float(total_sales),
-            'periode': {
-                'debut': start_date,
-                'fin': end_date
+            'artisan': artisan,
+            'categories': categories,
+            'total': {
+                name: sum(categorie[name] for categorie in categories)
+                for name in (
+                    'chiffre_affaires', 'quantite_vendue', 'produits',
+                    'produits_actifs', 'stock', 'valeur_stock'
+                )
             },
-            'top_produits': list(top_products),
-            'stats_artisans': list(stats_artisans),
-            'stats_mensuelles': stats_mensuelles
-        })
\ No newline at end of file
+        })
@@ -18,10 +18,11 @@ class LigneVenteInline(admin.TabularInline):
 @admin.register(Vente)
 class VenteAdmin(admin.ModelAdmin):
     list_display = ('numero_vente', 'artisan_display', 'designation', 'products_count', 'total_amount', 'sale_date')
+    list_select_related = ('artisan',)
     search_fields = ('numero_vente', 'designation', 'artisan__nom', 'artisan__prenom')
     list_filter = ('sale_date', 'artisan')
     raw_id_fields = ('artisan',)
-    readonly_fields = ('numero_vente', 'total_amount', 'sale_date')
+    readonly_fields = ('numero_vente', 'total_amount', 'products_count', 'total_quantity', 'sale_date')
     inlines = [LigneVenteInline]
     
     def artisan_display(self, obj):
@@ -32,7 +33,7 @@ class VenteAdmin(admin.ModelAdmin):
     def products_count(self, obj):
         return obj.products_count
     products_count.short_description = 'Nb. Produits'
-    products_count.admin_order_field = 'lignes_vente__count'
+    products_count.admin_order_field = 'products_count'
     @property
     def total_amount(self):
         return sum(ligne.montant_ligne for ligne in self.lignes_vente.all())
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VentesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventes'
+
+    def ready(self):
+        # Abonne l'index d'autocomplétion aux enregistrements des produits et artisans
+        from . import autocomplete  # noqa: F401
@@ -0,0 +1,224 @@
+# ventes/autocomplete.py
+"""
+Index d'autocomplétion de la saisie des ventes (/api/autocomplete/).
+
+Les noms des produits et des artisans (prénom et nom dans les deux ordres,
+numéro de boutique) sont normalisés comme les clés de recherche des artisans
+(minuscules, sans accents ni ponctuation) ; chaque mot d'un nom commence
+une clé, pour qu'un mot du milieu (« vase » dans « Grand vase ») soit trouvé.
+Les clés sont gardées dans des listes triées (artisans, produits, produits
+de chaque artisan) : une recherche est une bisection suivie d'un parcours
+des clés qui commencent par le texte saisi, sans requête en base.
+
+L'index est construit au premier appel dans chaque processus. Les
+enregistrements de produits et d'artisans le modifient sur place (après le
+commit) et incrémentent un numéro de version dans le cache Django ; un
+processus dont le numéro ne suit plus celui du cache a manqué une
+modification et reconstruit son index à l'appel suivant.
+
+Le stock n'est pas dans l'index : il change à chaque vente.
+"""
+import random
+import threading
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from artisans.models import Artisan
+from artisans.search import normalize_name
+from produits.models import Produit
+
+PRODUITS = 'produits'
+ARTISANS = 'artisans'
+KINDS = (PRODUITS, ARTISANS)
+
+VERSION_KEY = 'ventes:autocomplete:version'
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Nombre maximal de clés parcourues par type et par recherche
+MAX_SCAN = 10_000
+
+
+def word_keys(*names):
+    """Clés d'un ou plusieurs noms : chaque nom à partir de chacun de ses mots."""
+    keys = set()
+    for name in names:
+        words = normalize_name(name).split()
+        keys.update(' '.join(words[start:]) for start in range(len(words)))
+    return sorted(keys)
+
+
+def produit_entry(pk, name, price, artisan_id):
+    return word_keys(name), {
+        'id': pk,
+        'name': name,
+        'price': f'{Decimal(price):.2f}',
+        'artisan': artisan_id,
+    }
+
+
+def artisan_entry(pk, prenom, nom, numero_boutique):
+    return word_keys(f'{prenom} {nom}', f'{nom} {prenom}', numero_boutique), {
+        'id': pk,
+        'prenom': prenom,
+        'nom': nom,
+        'numero_boutique': numero_boutique,
+    }
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Départ aléatoire : un compteur évincé du cache ne retombe pas sur
+        # un numéro déjà vu par un processus
+        cache.add(VERSION_KEY, random.randrange(1 << 40), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    current_version()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return current_version()
+
+
+class AutocompleteIndex:
+    """
+    Données de chaque produit ou artisan et clés triées (clé, id) par
+    groupe : tous les artisans, tous les produits, produits de chaque artisan.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self.keys = {}
+        self.entries = {}
+
+    @staticmethod
+    def groups(kind, data):
+        if kind == PRODUITS:
+            return (PRODUITS, (PRODUITS, data['artisan']))
+        return (kind,)
+
+    def load(self):
+        entries = {}
+        for pk, name, price, artisan_id in Produit.objects.values_list('pk', 'name', 'price', 'artisan_id'):
+            entries[PRODUITS, pk] = produit_entry(pk, name, price, artisan_id)
+        for row in Artisan.objects.values_list('pk', 'prenom', 'nom', 'numero_boutique'):
+            entries[ARTISANS, row[0]] = artisan_entry(*row)
+        keys = {}
+        for (kind, pk), (entry_keys, data) in entries.items():
+            for group in self.groups(kind, data):
+                keys.setdefault(group, []).extend((key, pk) for key in entry_keys)
+        for group_keys in keys.values():
+            group_keys.sort()
+        return keys, entries
+
+    def ensure_current(self):
+        """Construit ou reconstruit l'index si la version du cache a changé."""
+        # Version lue avant le chargement : une écriture concurrente au
+        # chargement provoque une nouvelle reconstruction, jamais un oubli
+        version = current_version()
+        with self.lock:
+            if self.version != version:
+                self.keys, self.entries = self.load()
+                self.version = version
+
+    def search(self, q, kinds=KINDS, artisan=None, limit=DEFAULT_LIMIT):
+        """
+        Produits et artisans dont un mot du nom commence par `q`, par ordre
+        alphabétique de la clé trouvée : {type: [données]}. `artisan` limite
+        les produits à ceux de cet artisan.
+        """
+        results = {kind: [] for kind in kinds}
+        prefix = normalize_name(q)
+        if not prefix:
+            return results
+        self.ensure_current()
+        with self.lock:
+            for kind, found in results.items():
+                group = (PRODUITS, artisan) if kind == PRODUITS and artisan is not None else kind
+                keys = self.keys.get(group, ())
+                seen = set()
+                index = bisect_left(keys, (prefix,))
+                end = min(len(keys), index + MAX_SCAN)
+                while index < end and len(found) < limit:
+                    key, pk = keys[index]
+                    index += 1
+                    if not key.startswith(prefix):
+                        break
+                    if pk not in seen:
+                        seen.add(pk)
+                        found.append(self.entries[kind, pk][1])
+        return results
+
+    def apply(self, kind, pk, entry):
+        """Remplace (ou retire, si `entry` est None) un produit ou un artisan."""
+        with self.lock:
+            if self.version is not None:
+                old = self.entries.get((kind, pk))
+                if old == entry:
+                    return
+                if old is not None:
+                    for group in self.groups(kind, old[1]):
+                        keys = self.keys[group]
+                        for key in old[0]:
+                            del keys[bisect_left(keys, (key, pk))]
+                    del self.entries[kind, pk]
+                if entry is not None:
+                    for group in self.groups(kind, entry[1]):
+                        keys = self.keys.setdefault(group, [])
+                        for key in entry[0]:
+                            insort(keys, (key, pk))
+                    self.entries[kind, pk] = entry
+            version = bump_version()
+            if self.version is not None:
+                # Une autre écriture entre-temps : l'index sera rechargé
+                self.version = version if version == self.version + 1 else None
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.keys = {}
+            self.entries = {}
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def _apply_on_commit(kind, pk, entry):
+    transaction.on_commit(lambda: autocomplete_index.apply(kind, pk, entry))
+
+
+@receiver(post_save, sender=Produit, dispatch_uid='ventes_autocomplete_produit_save')
+def index_produit(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _apply_on_commit(PRODUITS, instance.pk, produit_entry(
+            instance.pk, instance.name, instance.price, instance.artisan_id
+        ))
+
+
+@receiver(post_delete, sender=Produit, dispatch_uid='ventes_autocomplete_produit_delete')
+def unindex_produit(sender, instance, **kwargs):
+    _apply_on_commit(PRODUITS, instance.pk, None)
+
+
+@receiver(post_save, sender=Artisan, dispatch_uid='ventes_autocomplete_artisan_save')
+def index_artisan(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _apply_on_commit(ARTISANS, instance.pk, artisan_entry(
+            instance.pk, instance.prenom, instance.nom, instance.numero_boutique
+        ))
+
+
+@receiver(post_delete, sender=Artisan, dispatch_uid='ventes_autocomplete_artisan_delete')
+def unindex_artisan(sender, instance, **kwargs):
+    _apply_on_commit(ARTISANS, instance.pk, None)
@@ -0,0 +1,305 @@
+# ventes/bulk_import.py
+"""
+Import en masse de ventes saisies hors ligne (fichiers CSV ou JSON Lines).
+
+Le fichier est lu ligne à ligne et traité par lots : pour chaque lot, les
+produits et artisans sont chargés en une requête chacun, les ventes sont
+validées en mémoire puis écrites dans une seule transaction (bulk_create des
+ventes et des lignes, UPDATE groupé des stocks, agrégats de statistiques). Une vente invalide est
+signalée dans le rapport sans bloquer le reste du fichier.
+
+Formats acceptés :
+
+- CSV avec en-tête ``reference,artisan,nom_du_client,designation,product_id,quantity`` ;
+  les lignes consécutives de même ``reference`` forment une seule vente
+  (une référence vide donne une vente par ligne).
+- JSON Lines : un objet par ligne
+  ``{"reference": ..., "artisan": 1, "nom_du_client": ..., "designation": ...,
+  "lignes_vente": [{"product_id": 3, "quantity": 2}]}``.
+"""
+import csv
+import io
+import json
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+
+from artisans.models import Artisan
+from produits.models import Produit
+from .models import (
+    InsufficientStockError,
+    LigneVente,
+    Vente,
+    notify_lignes_changed,
+    notify_ventes_created,
+    reserve_stock_bulk,
+    sale_number_allocator,
+)
+
+CSV_COLUMNS = ('reference', 'artisan', 'nom_du_client', 'designation', 'product_id', 'quantity')
+
+# Nombre de produits par UPDATE groupé (2 paramètres SQL par produit)
+STOCK_UPDATE_BATCH = 300
+
+
+class ImportReport:
+    """Résultat d'un import : compteurs, erreurs par ligne et débit."""
+
+    def __init__(self):
+        self.ventes_importees = 0
+        self.lignes_importees = 0
+        self.erreurs = []
+        self.debut = time.perf_counter()
+        self.duree = 0
+
+    def add_error(self, vente, messages):
+        self.erreurs.append({
+            'ligne': vente['row'],
+            'reference': vente.get('reference') or None,
+            'erreurs': messages,
+        })
+
+    def finish(self):
+        self.duree = time.perf_counter() - self.debut
+        return self
+
+    @property
+    def ventes_par_seconde(self):
+        return round(self.ventes_importees / self.duree, 1) if self.duree else 0
+
+    def as_dict(self):
+        return {
+            'ventes_importees': self.ventes_importees,
+            'lignes_importees': self.lignes_importees,
+            'ventes_rejetees': len(self.erreurs),
+            'duree_secondes': round(self.duree, 3),
+            'ventes_par_seconde': self.ventes_par_seconde,
+            'erreurs': self.erreurs,
+        }
+
+
+def _new_sale(row, data):
+    return {
+        'row': row,
+        'reference': (data.get('reference') or '').strip(),
+        'artisan': data.get('artisan'),
+        'nom_du_client': (data.get('nom_du_client') or '').strip(),
+        'designation': (data.get('designation') or '').strip(),
+        'lignes': [],
+        'errors': [],
+    }
+
+
+def iter_sales_csv(stream):
+    """Regroupe les lignes CSV consécutives de même référence en ventes."""
+    reader = csv.DictReader(stream)
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"Colonnes manquantes dans le CSV : {', '.join(missing)}")
+
+    current = None
+    for data in reader:
+        reference = (data.get('reference') or '').strip()
+        if current is None or not reference or reference != current['reference']:
+            if current is not None:
+                yield current
+            current = _new_sale(reader.line_num, data)
+        current['lignes'].append({
+            'row': reader.line_num,
+            'product_id': data.get('product_id'),
+            'quantity': data.get('quantity'),
+        })
+    if current is not None:
+        yield current
+
+
+def iter_sales_jsonl(stream):
+    """Une vente par ligne JSON ; les lignes vides sont ignorées."""
+    for row, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            sale = _new_sale(row, {})
+            sale['errors'].append("Ligne JSON invalide.")
+            yield sale
+            continue
+        sale = _new_sale(row, data)
+        lignes = data.get('lignes_vente') or []
+        if not isinstance(lignes, list):
+            sale['errors'].append("lignes_vente doit être une liste.")
+            lignes = []
+        for ligne in lignes:
+            ligne = ligne if isinstance(ligne, dict) else {}
+            sale['lignes'].append({
+                'row': row,
+                'product_id': ligne.get('product_id'),
+                'quantity': ligne.get('quantity'),
+            })
+        yield sale
+
+
+def iter_sales(stream, format):
+    """Choisit le lecteur selon le format ('csv' ou 'jsonl')."""
+    if format == 'csv':
+        return iter_sales_csv(stream)
+    if format in ('jsonl', 'ndjson'):
+        return iter_sales_jsonl(stream)
+    raise ValueError(f"Format d'import inconnu : {format}")
+
+
+def open_text(binary_file):
+    """Flux texte ligne à ligne sur un fichier binaire (upload ou fichier disque)."""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def _as_int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def import_sales(sales, chunk_size=500):
+    """Importe un itérable de ventes (voir iter_sales) et retourne un ImportReport."""
+    report = ImportReport()
+    sales = iter(sales)
+    while True:
+        chunk = list(islice(sales, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(chunk, report)
+    return report.finish()
+
+
+def _import_chunk(chunk, report):
+    # Conversion des identifiants, puis chargement en lot
+    for sale in chunk:
+        sale['artisan_id'] = _as_int(sale['artisan'])
+        for ligne in sale['lignes']:
+            ligne['product_id'] = _as_int(ligne['product_id'])
+            ligne['quantity'] = _as_int(ligne['quantity'])
+
+    artisan_ids = {sale['artisan_id'] for sale in chunk if sale['artisan_id'] is not None}
+    product_ids = {
+        ligne['product_id'] for sale in chunk for ligne in sale['lignes']
+        if ligne['product_id'] is not None
+    }
+    artisans = set(Artisan.objects.filter(pk__in=artisan_ids).values_list('pk', flat=True))
+    produits = {
+        produit['pk']: produit
+        for produit in Produit.objects.filter(pk__in=product_ids).values(
+            'pk', 'artisan_id', 'price', 'stock', 'name'
+        )
+    }
+
+    # Validation en mémoire, avec un stock disponible décompté vente après vente
+    stock = {pk: produit['stock'] for pk, produit in produits.items()}
+    valides = []
+    for sale in chunk:
+        errors = sale['errors']
+        if sale['artisan_id'] not in artisans:
+            errors.append(f"Artisan introuvable : {sale['artisan']}")
+        if not sale['nom_du_client']:
+            errors.append("Le nom du client est requis.")
+        if not sale['lignes']:
+            errors.append("Au moins un produit est requis pour la vente.")
+
+        demandes = {}
+        for ligne in sale['lignes']:
+            produit = produits.get(ligne['product_id'])
+            if produit is None or produit['artisan_id'] != sale['artisan_id']:
+                errors.append(
+                    f"Ligne {ligne['row']} : produit {ligne['product_id']} non trouvé pour cet artisan."
+                )
+            elif ligne['quantity'] is None or ligne['quantity'] <= 0:
+                errors.append(f"Ligne {ligne['row']} : la quantité doit être supérieure à zéro.")
+            else:
+                demandes[produit['pk']] = demandes.get(produit['pk'], 0) + ligne['quantity']
+
+        if not errors:
+            for pk, quantity in demandes.items():
+                if stock[pk] < quantity:
+                    errors.append(
+                        f"Stock insuffisant pour le produit {produits[pk]['name']}. "
+                        f"Quantité disponible : {stock[pk]}"
+                    )
+        if errors:
+            report.add_error(sale, errors)
+            continue
+
+        for pk, quantity in demandes.items():
+            stock[pk] -= quantity
+        sale['demandes'] = demandes
+        valides.append(sale)
+
+    if not valides:
+        return
+    try:
+        _write_sales(valides, produits, report)
+    except InsufficientStockError:
+        # Le stock a changé depuis la lecture du lot (ventes concurrentes) :
+        # on reprend vente par vente pour isoler celles qui ne passent plus.
+        for sale in valides:
+            try:
+                _write_sales([sale], produits, report)
+            except InsufficientStockError as e:
+                report.add_error(sale, [_stock_error(e, produits)])
+
+
+def _stock_error(error, produits):
+    # Le produit en cause n'est pas toujours connu (stock modifié entre deux lectures)
+    produit = produits.get(error.product_id)
+    if produit is None:
+        return "Stock insuffisant pour un des produits de la vente."
+    return f"Stock insuffisant pour le produit {produit['name']}."
+
+
+def _write_sales(sales, produits, report):
+    """Écrit un groupe de ventes validées dans une seule transaction."""
+    quantites = {}
+    for sale in sales:
+        for pk, quantity in sale['demandes'].items():
+            quantites[pk] = quantites.get(pk, 0) + quantity
+
+    with transaction.atomic():
+        items = list(quantites.items())
+        for start in range(0, len(items), STOCK_UPDATE_BATCH):
+            reserve_stock_bulk(dict(items[start:start + STOCK_UPDATE_BATCH]))
+
+        numeros = sale_number_allocator.take(len(sales))
+        ventes = []
+        lignes = []
+        for sale, numero in zip(sales, numeros):
+            vente = Vente(
+                artisan_id=sale['artisan_id'],
+                numero_vente=numero,
+                nom_du_client=sale['nom_du_client'],
+                designation=sale['designation'],
+                total_amount=Decimal('0'),
+                products_count=len(sale['lignes']),
+                total_quantity=sum(ligne['quantity'] for ligne in sale['lignes'])
+            )
+            for ligne in sale['lignes']:
+                produit = produits[ligne['product_id']]
+                lignes.append(LigneVente(
+                    vente=vente,
+                    product_id=produit['pk'],
+                    quantity=ligne['quantity'],
+                    unit_price=produit['price']
+                ))
+                vente.total_amount += ligne['quantity'] * produit['price']
+            ventes.append(vente)
+
+        Vente.objects.bulk_create(ventes)
+        LigneVente.objects.bulk_create(lignes)
+        notify_ventes_created(ventes)
+        notify_lignes_changed(lignes, created=True)
+
+    report.ventes_importees += len(ventes)
+    report.lignes_importees += len(lignes)
@@ -0,0 +1,55 @@
+# ventes/export.py
+"""
+Export CSV en flux des lignes de vente, pour la comptabilité.
+
+Les lignes sont lues par `iterator(chunk_size=...)` sur une requête values()
+aplatie (vente, artisan, produit) : aucun objet modèle n'est construit et la
+mémoire utilisée ne dépend pas de la taille de l'export. L'en-tête CSV est
+envoyé avant l'exécution de la requête, le premier octet part donc tout de suite.
+"""
+import csv
+
+from .models import LigneVente
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (en-tête CSV, champ values())
+EXPORT_COLUMNS = (
+    ('numero_vente', 'vente__numero_vente'),
+    ('date_vente', 'vente__sale_date'),
+    ('nom_du_client', 'vente__nom_du_client'),
+    ('designation', 'vente__designation'),
+    ('montant_vente', 'vente__total_amount'),
+    ('artisan_id', 'vente__artisan_id'),
+    ('artisan_prenom', 'vente__artisan__prenom'),
+    ('artisan_nom', 'vente__artisan__nom'),
+    ('numero_boutique', 'vente__artisan__numero_boutique'),
+    ('produit_id', 'product_id'),
+    ('produit', 'product__name'),
+    ('quantite', 'quantity'),
+    ('prix_unitaire', 'unit_price'),
+)
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer : retourne la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(queryset=None):
+    """Lignes de vente aplaties, triées par date puis numéro de vente."""
+    if queryset is None:
+        queryset = LigneVente.objects.all()
+    return queryset.order_by('vente__sale_date', 'vente_id').values_list(
+        *[field for _, field in EXPORT_COLUMNS]
+    )
+
+
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Générateur des lignes CSV (en-tête compris) pour StreamingHttpResponse."""
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in EXPORT_COLUMNS] + ['sous_total'])
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield writer.writerow(row + (row[-2] * row[-1],))
@@ -0,0 +1,63 @@
+# ventes/filters.py
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def _parse_jour(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        jour = parse_date(value)
+    except ValueError:  # format correct mais date inexistante (2025-13-01)
+        jour = None
+    if jour is None:
+        raise ValidationError({name: "Date invalide, format attendu : AAAA-MM-JJ."})
+    return jour
+
+
+def _debut_du_jour(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def filter_ventes(queryset, params, prefix=''):
+    """
+    Applique les filtres de liste des ventes passés en paramètres de requête :
+    - date_debut, date_fin : période (AAAA-MM-JJ, bornes incluses)
+    - artisan : id de l'artisan
+    - client : partie du nom du client
+    - montant_min : montant total minimum
+
+    Les bornes de dates sont converties en intervalle sur sale_date pour
+    rester utilisables par l'index (artisan, sale_date). `prefix` permet de
+    filtrer un queryset lié, par exemple 'vente__' pour les lignes de vente.
+    """
+    date_debut = _parse_jour(params, 'date_debut')
+    date_fin = _parse_jour(params, 'date_fin')
+    if date_debut:
+        queryset = queryset.filter(**{f'{prefix}sale_date__gte': _debut_du_jour(date_debut)})
+    if date_fin:
+        queryset = queryset.filter(**{f'{prefix}sale_date__lt': _debut_du_jour(date_fin + timedelta(days=1))})
+
+    artisan = params.get('artisan')
+    if artisan:
+        if not str(artisan).isdigit():
+            raise ValidationError({'artisan': "Identifiant d'artisan invalide."})
+        queryset = queryset.filter(**{f'{prefix}artisan_id': int(artisan)})
+
+    client = params.get('client')
+    if client:
+        queryset = queryset.filter(**{f'{prefix}nom_du_client__icontains': client})
+
+    montant_min = params.get('montant_min')
+    if montant_min:
+        try:
+            queryset = queryset.filter(**{f'{prefix}total_amount__gte': Decimal(montant_min)})
+        except InvalidOperation:
+            raise ValidationError({'montant_min': "Montant invalide."})
+
+    return queryset
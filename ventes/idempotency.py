@@ -0,0 +1,56 @@
+# ventes/idempotency.py
+"""
+Clés d'idempotence pour la création de ventes (en-tête `Idempotency-Key`).
+
+La clé est enregistrée sur la vente créée (colonne unique, donc indexée) et
+la réponse 201 est gardée quelques minutes dans le cache local. Un client qui
+rejoue la même requête reçoit la réponse d'origine : depuis le cache si elle
+y est encore, sinon par une seule recherche sur l'index de la clé. Les clés
+anciennes sont effacées en masse par `manage.py purge_idempotency_keys`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 100
+CACHE_PREFIX = 'ventes:idempotency:'
+
+
+def get_idempotency_key(request):
+    """
+    Retourne la clé de la requête, préfixée par l'utilisateur pour que deux
+    comptes ne puissent pas partager une clé. None si l'en-tête est absent.
+    Lève ValueError si la clé est trop longue.
+    """
+    key = request.META.get(HEADER, '').strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"L'en-tête Idempotency-Key ne doit pas dépasser {MAX_KEY_LENGTH} caractères.")
+    return f'{request.user.pk}:{key}'
+
+
+def get_cached_response(key):
+    return cache.get(CACHE_PREFIX + key)
+
+
+def cache_response(key, data):
+    cache.set(CACHE_PREFIX + key, data, getattr(settings, 'IDEMPOTENCY_CACHE_TIMEOUT', 300))
+
+
+def purge_expired_keys(retention=None):
+    """
+    Efface en un seul UPDATE les clés des ventes plus anciennes que la durée
+    de rétention. Retourne le nombre de ventes concernées.
+    """
+    from .models import Vente
+
+    if retention is None:
+        retention = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_RETENTION_HOURS', 24))
+    return Vente.objects.filter(
+        idempotency_key__isnull=False,
+        sale_date__lt=timezone.now() - retention
+    ).update(idempotency_key=None)
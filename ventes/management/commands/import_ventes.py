@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ventes.bulk_import import import_sales, iter_sales, open_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des ventes depuis un fichier CSV ou JSON Lines, lu en flux et "
+        "écrit par lots. Affiche le débit et les erreurs ligne par ligne."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help='Chemin du fichier à importer.')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help="Format du fichier (déduit de l'extension par défaut)."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Nombre de ventes écrites par transaction (défaut : 500).'
+        )
+
+    def handle(self, *args, **options):
+        path = options['fichier']
+        format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        try:
+            with open(path, 'rb') as binary:
+                report = import_sales(
+                    iter_sales(open_text(binary), format),
+                    chunk_size=max(1, options['chunk_size'])
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for erreur in report.erreurs:
+            reference = f" ({erreur['reference']})" if erreur['reference'] else ''
+            self.stderr.write(f"Ligne {erreur['ligne']}{reference} : {' ; '.join(erreur['erreurs'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.ventes_importees} ventes ({report.lignes_importees} lignes) importées, "
+            f"{len(report.erreurs)} rejetées en {report.duree:.2f}s "
+            f"({report.ventes_par_seconde} ventes/s)."
+        ))
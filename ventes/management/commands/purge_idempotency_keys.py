@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from ventes.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Efface les clés d'idempotence des ventes plus anciennes que la durée de rétention."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            help='Durée de rétention en heures (défaut : IDEMPOTENCY_KEY_RETENTION_HOURS).'
+        )
+
+    def handle(self, *args, **options):
+        retention = timedelta(hours=options['hours']) if options['hours'] is not None else None
+        purged = purge_expired_keys(retention)
+        self.stdout.write(self.style.SUCCESS(f"{purged} clés d'idempotence effacées."))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from ventes.models import LigneVente, Vente
+from ventes.totals import sync_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les totaux dénormalisés des ventes (total_amount, products_count, "
+        "total_quantity) à partir des lignes, par lots. Avec --check, signale les "
+        "écarts sans rien modifier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Nombre de ventes traitées par lot (défaut : 1000).'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Vérifie seulement ; code de sortie 1 si des écarts sont trouvés.'
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+
+        def report(vente, actuel, attendu):
+            if check_only:
+                self.stdout.write(f"{vente.numero_vente} : stocké {actuel}, attendu {attendu}")
+
+        checked, drifted = sync_totals(
+            Vente, LigneVente,
+            chunk_size=options['chunk_size'],
+            fix=not check_only,
+            on_drift=report
+        )
+
+        verbe = 'à corriger' if check_only else 'corrigées'
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} ventes vérifiées, {drifted} {verbe}."
+        ))
+        if check_only and drifted:
+            raise SystemExit(1)
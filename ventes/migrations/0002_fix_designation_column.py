@@ -3,6 +3,23 @@
 from django.db import migrations
 
 
+def add_designation_column(apps, schema_editor):
+    """
+    Ajoute la colonne designation sur les bases créées avant qu'elle ne soit
+    présente dans 0001_initial (les bases récentes l'ont déjà).
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        columns = [
+            column.name
+            for column in connection.introspection.get_table_description(cursor, 'ventes_vente')
+        ]
+    if 'designation' not in columns:
+        schema_editor.execute(
+            "ALTER TABLE ventes_vente ADD COLUMN designation VARCHAR(255) DEFAULT '';"
+        )
+
+
 class Migration(migrations.Migration):
 
     dependencies = [
@@ -10,9 +27,5 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.RunSQL(
-            "ALTER TABLE ventes_vente ADD COLUMN designation VARCHAR(255) DEFAULT '';",
-            "ALTER TABLE ventes_vente DROP COLUMN designation;"
-        ),
+        migrations.RunPython(add_designation_column, migrations.RunPython.noop),
     ]
-
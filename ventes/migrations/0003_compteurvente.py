@@ -0,0 +1,24 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0002_fix_designation_column'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurVente',
+            fields=[
+                ('jour', models.DateField(primary_key=True, serialize=False, verbose_name='Jour')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+            ],
+            options={
+                'verbose_name': 'Compteur de ventes',
+                'verbose_name_plural': 'Compteurs de ventes',
+            },
+        ),
+    ]
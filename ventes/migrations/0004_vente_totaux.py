@@ -0,0 +1,36 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+from ventes.totals import sync_totals
+
+
+def backfill_totals(apps, schema_editor):
+    # Ventes existantes : totaux calculés à partir de leurs lignes
+    sync_totals(apps.get_model('ventes', 'Vente'), apps.get_model('ventes', 'LigneVente'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0003_compteurvente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de lignes'),
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Montant total'),
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantité totale'),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
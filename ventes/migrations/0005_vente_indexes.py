@@ -0,0 +1,21 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0004_vente_totaux'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['sale_date', 'id'], name='vente_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['artisan', 'sale_date'], name='vente_artisan_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.22 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0005_vente_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='Utilisateur et en-tête Idempotency-Key de la requête de création', max_length=150, null=True, unique=True, verbose_name="Clé d'idempotence"),
+        ),
+    ]
@@ -1,33 +1,241 @@
-from django.db import models
-from django.db.models import Max, Sum
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from produits.models import Produit
 from artisans.models import Artisan
+from .signals import LineDelta, SaleDelta, sale_day, send_sales_changed, send_stock_changed
+from decimal import Decimal
+from functools import partial
+import threading
 import uuid
 
 
+NUMERO_VENTE_TEMPORAIRE = 'TEMP-0000'
+
+
+def format_sale_number(day, number):
+    """Formate un numéro de vente V-YYYYMMDD-XXXX."""
+    return f'V-{day:%Y%m%d}-{number:04d}'
+
+
+def _last_scanned_sale_number(day):
+    """
+    Dernier numéro de vente existant pour un jour, trouvé par balayage.
+    Sert uniquement à initialiser le compteur d'un jour (ventes créées avant
+    l'introduction de CompteurVente).
+    """
+    prefix = f'V-{day:%Y%m%d}-'
+    last_sale = Vente.objects.filter(numero_vente__startswith=prefix).order_by('-numero_vente').first()
+    if not last_sale:
+        return 0
+    try:
+        return int(last_sale.numero_vente.split('-')[-1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def allocate_sale_numbers(day, count=1):
+    """
+    Réserve `count` numéros consécutifs dans le compteur du jour et retourne
+    le premier. L'UPDATE atomique sur la ligne du jour sérialise les ventes
+    concurrentes sur cette seule ligne, sans balayer la table des ventes.
+    """
+    with transaction.atomic():
+        updated = CompteurVente.objects.filter(jour=day).update(
+            dernier_numero=F('dernier_numero') + count
+        )
+        if not updated:
+            # Première vente du jour : créer le compteur
+            try:
+                with transaction.atomic():
+                    CompteurVente.objects.create(
+                        jour=day,
+                        dernier_numero=_last_scanned_sale_number(day) + count
+                    )
+            except IntegrityError:
+                # Un autre processus vient de le créer
+                CompteurVente.objects.filter(jour=day).update(
+                    dernier_numero=F('dernier_numero') + count
+                )
+        last = CompteurVente.objects.filter(jour=day).values_list('dernier_numero', flat=True).get()
+    return last - count + 1
+
+
+class SaleNumberAllocator:
+    """
+    Distribue les numéros de vente du processus courant.
+
+    Avec block_size > 1, chaque réservation en base prend un bloc de numéros
+    que le processus distribue ensuite en mémoire, sans aucune requête.
+    Les numéros restent uniques mais ne sont plus strictement croissants
+    d'un processus à l'autre. Le reste d'un bloc n'est conservé qu'une fois
+    la transaction de réservation validée : après un rollback, le compteur
+    revient en arrière et ces numéros pourraient être réattribués ailleurs.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 0
+        self._end = -1
+
+    def get_block_size(self):
+        if self.block_size is not None:
+            return self.block_size
+        return max(1, int(getattr(settings, 'SALE_NUMBER_BLOCK_SIZE', 1)))
+
+    def take(self, count=1):
+        """Retourne `count` numéros de vente pour aujourd'hui."""
+        day = timezone.localdate()
+        with self._lock:
+            if self._day == day and self._end - self._next + 1 >= count:
+                first = self._next
+                self._next += count
+                return [format_sale_number(day, n) for n in range(first, first + count)]
+
+        size = max(count, self.get_block_size())
+        first = allocate_sale_numbers(day, size)
+        if size > count:
+            transaction.on_commit(
+                partial(self._adopt_block, day, first + count, first + size - 1)
+            )
+        return [format_sale_number(day, n) for n in range(first, first + count)]
+
+    def next(self):
+        return self.take(1)[0]
+
+    def reset(self):
+        """Oublie le bloc en mémoire (tests, changement de configuration)."""
+        with self._lock:
+            self._day, self._next, self._end = None, 0, -1
+
+    def _adopt_block(self, day, start, end):
+        with self._lock:
+            self._day, self._next, self._end = day, start, end
+
+
+sale_number_allocator = SaleNumberAllocator()
+
+
 def generate_sale_number():
     """
     Génère un numéro de vente unique au format V-YYYYMMDD-XXXX
     où XXXX est un numéro séquentiel
     """
-    from datetime import datetime
-    today = datetime.now().strftime('%Y%m%d')
-    prefix = f'V-{today}'
-    
-    # Trouver le dernier numéro de vente pour aujourd'hui
-    last_sale = Vente.objects.filter(numero_vente__startswith=prefix).order_by('-numero_vente').first()
-    
-    if last_sale:
-        try:
-            last_number = int(last_sale.numero_vente.split('-')[-1])
-            next_number = last_number + 1
-        except (IndexError, ValueError):
-            next_number = 1
-    else:
-        next_number = 1
-        
-    return f'{prefix}-{next_number:04d}'
+    return sale_number_allocator.next()
+
+
+class InsufficientStockError(ValueError):
+    """Levée lorsque le stock d'un produit ne suffit pas pour une vente."""
+
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(
+            f"Stock insuffisant pour le produit {product_id} (quantité demandée : {quantity})"
+        )
+
+
+def reserve_stock(product_id, quantity):
+    """
+    Décrémente le stock d'un produit directement en base de données.
+
+    La mise à jour est conditionnelle (stock >= quantité) : aucune lecture
+    préalable n'est nécessaire et deux ventes simultanées ne peuvent pas
+    vendre la même unité. Lève InsufficientStockError si le stock ne suffit pas.
+    """
+    updated = Produit.objects.filter(
+        pk=product_id,
+        stock__gte=quantity
+    ).update(stock=F('stock') - quantity)
+    if not updated:
+        raise InsufficientStockError(product_id, quantity)
+    send_stock_changed(Produit, {product_id: -quantity})
+
+
+def reserve_stock_bulk(quantities):
+    """
+    Décrémente le stock de plusieurs produits en un seul UPDATE.
+
+    `quantities` associe un id de produit à la quantité à retirer. L'UPDATE
+    n'est appliqué qu'aux produits dont le stock suffit ; si un seul produit
+    manque de stock, rien n'est modifié et InsufficientStockError est levée.
+    """
+    if not quantities:
+        return
+    delta = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+    try:
+        with transaction.atomic():
+            updated = Produit.objects.filter(
+                pk__in=list(quantities),
+                stock__gte=delta
+            ).update(stock=F('stock') - delta)
+            if updated != len(quantities):
+                raise InsufficientStockError(None, None)
+            send_stock_changed(Produit, {
+                product_id: -quantity for product_id, quantity in quantities.items()
+            })
+    except InsufficientStockError:
+        # Chemin d'erreur uniquement : retrouver le produit en cause
+        stocks = dict(Produit.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock'))
+        for product_id, quantity in quantities.items():
+            if stocks.get(product_id, 0) < quantity:
+                raise InsufficientStockError(product_id, quantity)
+        raise
+
+
+def increment_vente_totals(vente_id, amount=0, count=0, quantity=0):
+    """
+    Ajoute une variation aux totaux dénormalisés d'une vente en un UPDATE.
+    À appeler dans la transaction qui modifie les lignes de la vente.
+    """
+    if not (amount or count or quantity):
+        return
+    Vente.objects.filter(pk=vente_id).update(
+        total_amount=F('total_amount') + amount,
+        products_count=F('products_count') + count,
+        total_quantity=F('total_quantity') + quantity
+    )
+
+
+def release_stock(product_id, quantity):
+    """Remet en stock les unités d'un produit (annulation ou correction de vente)."""
+    if Produit.objects.filter(pk=product_id).update(stock=F('stock') + quantity):
+        send_stock_changed(Produit, {product_id: quantity})
+
+
+def notify_lignes_changed(lignes, sign=1, created=False):
+    """
+    Signale l'ajout (sign=1) ou le retrait (sign=-1) de lignes de vente
+    aux abonnés de sales_changed. La vente de chaque ligne doit être chargée ;
+    `created` indique des lignes de ventes créées dans la même transaction.
+    """
+    send_sales_changed(LigneVente, created=created, lines=[
+        LineDelta(
+            sale_day(ligne.vente.sale_date),
+            ligne.vente.artisan_id,
+            ligne.product_id,
+            sign * ligne.quantity,
+            sign * ligne.get_sous_total(),
+            sign
+        )
+        for ligne in lignes
+    ])
+
+
+def notify_ventes_created(ventes):
+    """Signale la création de ventes (nombre de ventes par jour et artisan)."""
+    send_sales_changed(Vente, created=True, sales=[
+        SaleDelta(sale_day(vente.sale_date), vente.artisan_id, 1) for vente in ventes
+    ])
+
 
 class LigneVente(models.Model):
     """
@@ -65,29 +273,76 @@ class LigneVente(models.Model):
     def __str__(self):
         return f'{self.quantity}x {self.product.name} - {self.unit_price}€'
 
+    def get_sous_total(self):
+        """Retourne le montant de la ligne (quantité x prix unitaire)."""
+        return self.quantity * self.unit_price
+
     def save(self, *args, **kwargs):
-        # S'assurer que le prix unitaire est bien celui du produit
-        if not self.pk:  # Nouvelle vente
-            for ligne in self.lignes_vente.all():
-                produit = ligne.produit
-                produit.stock -= ligne.quantite
-                produit.save()
-        super().save(*args, **kwargs)
-        # Mettre à jour le stock du produit
-        if self.pk:  # Si la ligne existe déjà
-            old_quantity = LigneVente.objects.get(pk=self.pk).quantity
-            self.product.stock += old_quantity  # On remet l'ancienne quantité
-        
-        # On soustrait la nouvelle quantité
-        self.product.stock -= self.quantity
-        self.product.save()
+        """
+        Sauvegarde la ligne et répercute la variation de quantité sur le stock
+        du produit et sur les totaux de la vente, dans la même transaction.
+        """
+        # Les prix peuvent arriver sous forme de chaîne (formulaires, tests)
+        self.unit_price = self._meta.get_field('unit_price').to_python(self.unit_price)
+        with transaction.atomic():
+            if self._state.adding:
+                old_product_id, old_quantity, old_unit_price = None, 0, 0
+            else:
+                old_product_id, old_quantity, old_unit_price = LigneVente.objects.filter(
+                    pk=self.pk
+                ).values_list('product_id', 'quantity', 'unit_price').get()
+            old_amount = old_quantity * old_unit_price
+            quantity_delta = self.quantity - old_quantity
+
+            if old_product_id is not None and old_product_id != self.product_id:
+                # Changement de produit : on rend l'ancien stock en entier
+                release_stock(old_product_id, old_quantity)
+                old_quantity = 0
+
+            delta = self.quantity - old_quantity
+            if delta > 0:
+                reserve_stock(self.product_id, delta)
+            elif delta < 0:
+                release_stock(self.product_id, -delta)
+
+            super().save(*args, **kwargs)
+            increment_vente_totals(
+                self.vente_id,
+                amount=self.get_sous_total() - old_amount,
+                count=1 if old_product_id is None else 0,
+                quantity=quantity_delta
+            )
+            self._notify_change(old_product_id, quantity_delta, old_amount)
+
+    def _notify_change(self, old_product_id, quantity_delta, old_amount):
+        """Reporte la modification de la ligne sur les abonnés de sales_changed."""
+        day = sale_day(self.vente.sale_date)
+        artisan_id = self.vente.artisan_id
+        amount = self.get_sous_total()
+        if old_product_id is None or old_product_id == self.product_id:
+            lines = [LineDelta(
+                day, artisan_id, self.product_id,
+                quantity_delta, amount - old_amount, 1 if old_product_id is None else 0
+            )]
+        else:
+            old_quantity = self.quantity - quantity_delta
+            lines = [
+                LineDelta(day, artisan_id, old_product_id, -old_quantity, -old_amount, -1),
+                LineDelta(day, artisan_id, self.product_id, self.quantity, amount, 1),
+            ]
+        send_sales_changed(LigneVente, lines=lines)
 
     def delete(self, *args, **kwargs):
-        for ligne in self.lignes_vente.all():
-            produit = ligne.produit
-            produit.stock += ligne.quantite
-            produit.save()
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            release_stock(self.product_id, self.quantity)
+            increment_vente_totals(
+                self.vente_id,
+                amount=-self.get_sous_total(),
+                count=-1,
+                quantity=-self.quantity
+            )
+            notify_lignes_changed([self], sign=-1)
+            return super().delete(*args, **kwargs)
 
 
 class Vente(models.Model):
@@ -108,7 +363,7 @@ class Vente(models.Model):
     numero_vente = models.CharField(
         max_length=50,
         unique=True,
-        default='TEMP-0000',
+        default=NUMERO_VENTE_TEMPORAIRE,
         verbose_name='Numéro de vente'
     )
     nom_du_client = models.CharField(
@@ -126,50 +381,73 @@ class Vente(models.Model):
         default=''   
     )
     
-    # Champs calculés (propriétés)
-    @property
-    def total_amount(self):
-        """Calcule le montant total de la vente."""
+    idempotency_key = models.CharField(
+        max_length=150,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Clé d'idempotence",
+        help_text="Utilisateur et en-tête Idempotency-Key de la requête de création"
+    )
+
+    # Totaux dénormalisés, tenus à jour à chaque écriture de lignes
+    # (voir increment_vente_totals et la commande sync_vente_totals)
+    total_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Montant total'
+    )
+    products_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Nombre de lignes'
+    )
+    total_quantity = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Quantité totale'
+    )
+
+    def compute_totals(self):
+        """Recalcule les totaux à partir des lignes (vérification uniquement)."""
         return self.lignes_vente.aggregate(
-            total=Sum(models.F('quantity') * models.F('unit_price'))
-        )['total'] or 0
-    
-    @property
-    def products_count(self):
-        """Retourne le nombre de produits différents dans la vente."""
-        return self.lignes_vente.count()
+            total_amount=Coalesce(
+                Sum(F('quantity') * F('unit_price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0'))
+            ),
+            products_count=Count('id'),
+            total_quantity=Coalesce(Sum('quantity'), Value(0))
+        )
 
     def generate_sale_number(self):
         """
         Génère un numéro de vente unique au format V-YYYYMMDD-XXXX
         où XXXX est un numéro séquentiel
         """
-        from datetime import datetime
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = f'V-{today}'
-        
-        # Trouver le dernier numéro de vente pour aujourd'hui
-        last_sale = Vente.objects.filter(
-            numero_vente__startswith=prefix
-        ).order_by('-numero_vente').first()
-        
-        if last_sale:
-            try:
-                last_number = int(last_sale.numero_vente.split('-')[-1])
-                next_number = last_number + 1
-            except (IndexError, ValueError):
-                next_number = 1
-        else:
-            next_number = 1
-            
-        return f'{prefix}-{next_number:04d}'
+        return generate_sale_number()
 
     def save(self, *args, **kwargs):
         """Sauvegarde la vente en générant un numéro unique si nécessaire."""
         is_new = self._state.adding
-        if is_new and not self.numero_vente:
+        if is_new and self.numero_vente in (None, '', NUMERO_VENTE_TEMPORAIRE):
             self.numero_vente = self.generate_sale_number()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                notify_ventes_created([self])
+
+    def delete(self, *args, **kwargs):
+        """
+        Supprime la vente et ses lignes (cascade) en retirant leurs montants
+        des abonnés de sales_changed.
+        """
+        with transaction.atomic():
+            lignes = list(self.lignes_vente.all())
+            for ligne in lignes:
+                ligne.vente = self
+            notify_lignes_changed(lignes, sign=-1)
+            send_sales_changed(Vente, sales=[SaleDelta(sale_day(self.sale_date), self.artisan_id, -1)])
+            return super().delete(*args, **kwargs)
 
     def get_artisan_details(self):
         """Retourne les détails de l'artisan pour la facturation."""
@@ -200,7 +478,34 @@ class Vente(models.Model):
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-sale_date']
+        indexes = [
+            # Pagination par curseur (sale_date, id) et filtres par artisan/période
+            models.Index(fields=['sale_date', 'id'], name='vente_date_id_idx'),
+            models.Index(fields=['artisan', 'sale_date'], name='vente_artisan_date_idx'),
+        ]
 
     def __str__(self):
         """Représentation textuelle de la vente."""
         return f"{self.numero_vente} - {self.products_count} produits - {self.total_amount}FCFA"
+
+
+class CompteurVente(models.Model):
+    """
+    Compteur journalier des numéros de vente.
+    Une ligne par jour, incrémentée atomiquement par allocate_sale_numbers.
+    """
+    jour = models.DateField(
+        primary_key=True,
+        verbose_name='Jour'
+    )
+    dernier_numero = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Dernier numéro attribué'
+    )
+
+    class Meta:
+        verbose_name = 'Compteur de ventes'
+        verbose_name_plural = 'Compteurs de ventes'
+
+    def __str__(self):
+        return f'{self.jour:%Y-%m-%d} : {self.dernier_numero}'
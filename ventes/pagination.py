@@ -0,0 +1,100 @@
+# ventes/pagination.py
+import base64
+import json
+import uuid
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class VenteCursorPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) sur (sale_date, id), du plus récent au plus ancien.
+
+    Chaque page est obtenue par un WHERE (sale_date, id) < (curseur) suivi
+    d'un LIMIT, servi par les index (sale_date, id) et (artisan, sale_date) :
+    le coût d'une page ne dépend pas de sa position dans la table, contrairement
+    à un OFFSET. Le curseur est opaque pour le client, qui suit le lien `next`.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-sale_date', '-id')
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            sale_date, pk = position
+            queryset = queryset.filter(
+                Q(sale_date__lt=sale_date) | Q(sale_date=sale_date, id__lt=pk)
+            )
+
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            sale_date = parse_datetime(raw)
+            # Un identifiant mal formé lèverait une ValidationError dans le filtre
+            pk = uuid.UUID(pk)
+        except (TypeError, ValueError, AttributeError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if sale_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return sale_date, pk
+
+    def encode_cursor(self, vente):
+        # Les listes compactes paginent des dictionnaires issus de values()
+        if isinstance(vente, dict):
+            sale_date, pk = vente['sale_date'], vente['id']
+        else:
+            sale_date, pk = vente.sale_date, vente.pk
+        raw = json.dumps([sale_date.isoformat(), str(pk)])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
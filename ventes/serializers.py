@@ -2,11 +2,15 @@ import json
 import logging
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from django.db.models import Q
-from .models import Vente, LigneVente
+from django.db import transaction
+from .models import (
+    Vente, LigneVente, InsufficientStockError, increment_vente_totals, notify_lignes_changed,
+    reserve_stock_bulk
+)
 from produits.models import Produit
 from produits.serializers import ProduitSerializer
 from artisans.models import Artisan
+from artisans.search import resolve_artisan
 from artisans.serializers import ArtisanSerializer
 from produits.serializers import ProduitSerializer as ProduitVenteSerializer
 
@@ -18,7 +22,7 @@ class LigneVenteSerializer(serializers.ModelSerializer):
     Sérialiseur pour les lignes de vente.
     Permet de gérer les produits d'une vente par leur ID.
     """
-    product_id = serializers.UUIDField(write_only=True, required=True)
+    product_id = serializers.IntegerField(write_only=True, required=True)
     product_details = ProduitSerializer(source='product', read_only=True)
     sous_total = serializers.DecimalField(
         max_digits=10, 
@@ -31,59 +35,25 @@ class LigneVenteSerializer(serializers.ModelSerializer):
     class Meta:
         model = LigneVente
         fields = [
-            'id', 'designation', 'product', 'product_id', 'product_name', 'product_details', 
+            'id', 'product', 'product_id', 'product_name', 'product_details', 
             'quantity', 'unit_price', 'sous_total'
         ]
         read_only_fields = ['product', 'unit_price', 'sous_total', 'product_name']
 
     def validate(self, data):
-        """Valide que le produit existe et appartient à l'artisan"""
-        artisan = self.context.get('artisan')
-        product_id = data.get('product_id')
-        
-        if not product_id:
+        """
+        Valide la forme de la ligne uniquement.
+        Le produit et le stock sont contrôlés en lot par VenteSerializer.validate,
+        en une seule requête pour toutes les lignes de la vente.
+        """
+        if not data.get('product_id'):
             raise ValidationError({"product_id": "L'ID du produit est requis."})
-            
-        try:
-            # Récupérer le produit par ID
-            product = Produit.objects.get(
-                id=product_id,
-                artisan=artisan
-            )
-            
-            # Vérifier la quantité
-            quantity = data.get('quantity', 0)
-            if quantity <= 0:
-                raise ValidationError({
-                    "quantity": "La quantité doit être supérieure à zéro."
-                })
-                
-            # Vérifier le stock
-            if product.stock < quantity:
-                raise ValidationError({
-                    "quantity": f"Stock insuffisant. Quantité disponible : {product.stock}"
-                })
-                
-            # Ajouter le produit et son prix aux données validées
-            data['product'] = product
-            data['unit_price'] = product.price
-            
-            return data
-            
-        except Produit.DoesNotExist:
+        
+        if data.get('quantity', 0) <= 0:
             raise ValidationError({
-                "product_id": "Produit non trouvé ou n'appartenant pas à l'artisan."
+                "quantity": "La quantité doit être supérieure à zéro."
             })
         
-    def to_internal_value(self, data):
-        """Convertit les noms en instances"""
-        data = data.copy()
-        validated_data = super().to_internal_value(data)
-        
-        # Ajouter le produit validé aux données
-        if 'product' in validated_data:
-            data['product'] = validated_data['product'].id
-            
         return data
 
     def validate_quantity(self, value):
@@ -92,6 +62,41 @@ class LigneVenteSerializer(serializers.ModelSerializer):
         return value
 
 
+class VenteListSerializer(serializers.Serializer):
+    """
+    Représentation compacte d'une vente pour les listes.
+
+    Lit des dictionnaires issus de `Vente.objects.values(*LIST_FIELDS)` :
+    une seule requête par page, sans détails d'artisan ni de produits.
+    Les lignes peuvent être ajoutées avec `?expand=lignes` (voir VenteViewSet).
+    """
+    LIST_FIELDS = (
+        'id', 'numero_vente', 'sale_date', 'nom_du_client', 'designation',
+        'total_amount', 'products_count', 'total_quantity',
+        'artisan_id', 'artisan__prenom', 'artisan__nom',
+    )
+
+    id = serializers.UUIDField()
+    numero_vente = serializers.CharField()
+    sale_date = serializers.DateTimeField()
+    nom_du_client = serializers.CharField(allow_null=True)
+    designation = serializers.CharField()
+    total_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    products_count = serializers.IntegerField()
+    total_quantity = serializers.IntegerField()
+    artisan = serializers.IntegerField(source='artisan_id')
+    artisan_nom = serializers.SerializerMethodField()
+
+    def get_artisan_nom(self, row):
+        return f"{row['artisan__prenom']} {row['artisan__nom']}"
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        if 'lignes' in row:
+            data['lignes'] = row['lignes']
+        return data
+
+
 class VenteSerializer(serializers.ModelSerializer):
     """
     Sérialiseur pour les ventes.
@@ -130,7 +135,7 @@ class VenteSerializer(serializers.ModelSerializer):
     
     # Champ pour la sélection des produits (écriture)
     produits_selectionnes = serializers.ListField(
-        child=serializers.UUIDField(),
+        child=serializers.IntegerField(),
         write_only=True,
         required=False,
         help_text="Liste des IDs des produits sélectionnés"
@@ -183,19 +188,15 @@ class VenteSerializer(serializers.ModelSerializer):
         
         # Pour les artisans, on utilise automatiquement leur profil
         if request and request.user.user_type == 'artisan':
-            return request.user.artisan_profile
+            return request.user.artisan_shop
             
         # Pour les autres utilisateurs, on vérifie que le nom est fourni
         if not value:
             raise serializers.ValidationError("Le nom de l'artisan est requis.")
             
-        # Recherche de l'artisan par nom/prénom/raison sociale
+        # Recherche de l'artisan par nom, prénom ou numéro de boutique (index normalisé)
         try:
-            return Artisan.objects.get(
-                Q(user__first_name__icontains=value) |
-                Q(user__last_name__icontains=value) |
-                Q(raison_sociale__icontains=value)
-            )
+            return resolve_artisan(value)
         except Artisan.DoesNotExist:
             raise serializers.ValidationError(f"Aucun artisan trouvé avec le nom '{value}'")
         except Artisan.MultipleObjectsReturned:
@@ -222,13 +223,13 @@ class VenteSerializer(serializers.ModelSerializer):
         model = Vente
         fields = [
             'id', 'numero_vente', 'artisan', 'artisan_details',
-            'nom_du_client', 'designation', 'sale_date', 'total_amount', 'products_count', 
+            'nom_du_client', 'designation', 'sale_date', 'total_amount', 'products_count', 'total_quantity',
             'lignes_vente', 'produits', 'produits_selectionnes', 'quantites',
               # Ajout du champ manquant
         ]
         read_only_fields = [
             'id', 'numero_vente', 'sale_date', 'total_amount', 
-            'products_count', 'artisan_details', 'produits', 
+            'products_count', 'total_quantity', 'artisan_details', 'produits', 
         ]
     
     def get_produits(self, obj):
@@ -242,15 +243,25 @@ class VenteSerializer(serializers.ModelSerializer):
         if obj and hasattr(obj, 'artisan') and obj.artisan:
             artisan = obj.artisan
         elif request.user.user_type == 'artisan':
-            artisan = request.user.artisan_profile
+            artisan = request.user.artisan_shop
         
         if not artisan:
             return []
             
         # Récupérer les produits en stock avec leurs catégories
-        produits = artisan.produits.filter(
-            stock__gt=0
-        ).select_related('categorie').order_by('name')
+        # (une seule fois par artisan pour toute la liste sérialisée)
+        cache = self.__dict__.setdefault('_produits_par_artisan', {})
+        if artisan.pk not in cache:
+            cache[artisan.pk] = list(artisan.produits.filter(
+                stock__gt=0
+            ).select_related('categorie').order_by('name'))
+        produits = cache[artisan.pk]
+        
+        # Quantités de la vente, lues sur les lignes préchargées
+        quantites = {}
+        if obj:
+            for ligne in obj.lignes_vente.all():
+                quantites[ligne.product_id] = quantites.get(ligne.product_id, 0) + ligne.quantity
         
         return [
             {
@@ -259,8 +270,8 @@ class VenteSerializer(serializers.ModelSerializer):
                 'price': str(p.price),
                 'stock': p.stock,
                 'categorie': p.categorie.nom if p.categorie else None,
-                'selected': obj.lignes_vente.filter(product=p).exists() if obj else False,
-                'quantite': obj.lignes_vente.get(product=p).quantity if obj and obj.lignes_vente.filter(product=p).exists() else 1
+                'selected': p.id in quantites,
+                'quantite': quantites.get(p.id, 1)
             }
             for p in produits
         ]
@@ -321,51 +332,108 @@ class VenteSerializer(serializers.ModelSerializer):
                 nom_du_client=nom_du_client
             )
             
-            # Créer les lignes de vente
-            for produit_id in produits_selectionnes:
-                try:
-                    produit = Produit.objects.get(id=produit_id, artisan=artisan)
-                except Produit.DoesNotExist:
-                    raise serializers.ValidationError({
-                        "produits_selectionnes": [f"Produit avec l'ID {produit_id} non trouvé pour cet artisan."]
-                    })
-                
-                # Récupérer la quantité (par défaut 1 si non spécifiée)
-                quantite = quantites.get(str(produit_id), 1)
-                
-                # Vérifier le stock
-                if produit.stock < quantite:
-                    raise serializers.ValidationError({
-                        "quantites": [f"Stock insuffisant pour le produit {produit.name}. Stock disponible : {produit.stock}"]
-                    })
-                
-                # Créer la ligne de vente
-                LigneVente.objects.create(
-                    vente=vente,
-                    product=produit,
-                    quantity=quantite,
-                    unit_price=produit.price
-                )
-                
-                # Mettre à jour le stock
-                produit.stock -= quantite
-                produit.save(update_fields=['stock'])
+            # Créer les lignes de vente et décrémenter les stocks en lot
+            lignes = self._resolve_lignes(
+                artisan,
+                [
+                    {'product_id': int(produit_id), 'quantity': int(quantites.get(str(produit_id), 1))}
+                    for produit_id in produits_selectionnes
+                ],
+                error_field='produits_selectionnes'
+            )
+            self._create_lignes(vente, lignes, error_field='produits_selectionnes')
         
         # Recharger la vente avec les relations
         vente.refresh_from_db()
         return vente
 
+    def _resolve_lignes(self, artisan, lignes, error_field='lignes_vente'):
+        """
+        Résout tous les produits d'une vente en une seule requête et contrôle
+        les quantités demandées par rapport au stock, en mémoire.
+
+        Retourne les lignes complétées avec le produit et son prix unitaire,
+        prêtes à être utilisées par create sans nouvelle requête.
+        """
+        produits = Produit.objects.filter(artisan=artisan).in_bulk(
+            {ligne['product_id'] for ligne in lignes}
+        )
+        demandes = {}
+        resolues = []
+        for ligne in lignes:
+            produit = produits.get(ligne['product_id'])
+            if produit is None:
+                raise ValidationError({
+                    error_field: [f"Produit avec l'ID {ligne['product_id']} non trouvé ou n'appartenant pas à l'artisan."]
+                })
+            
+            # Un même produit peut apparaître sur plusieurs lignes
+            demandes[produit.pk] = demandes.get(produit.pk, 0) + ligne['quantity']
+            if produit.stock < demandes[produit.pk]:
+                raise ValidationError({
+                    error_field: [f"Stock insuffisant pour le produit {produit.name}. Quantité disponible : {produit.stock}"]
+                })
+            
+            resolues.append({**ligne, 'product': produit, 'unit_price': produit.price})
+        return resolues
+
+    def _create_lignes(self, vente, lignes, error_field='lignes_vente'):
+        """
+        Crée les lignes d'une vente avec un nombre de requêtes fixe :
+        un UPDATE groupé pour les stocks et un bulk_create pour les lignes,
+        quel que soit le nombre de lignes.
+
+        `lignes` est la sortie de _resolve_lignes (produits déjà chargés).
+        """
+        quantites = {}
+        for ligne in lignes:
+            product_id = ligne['product'].pk
+            quantites[product_id] = quantites.get(product_id, 0) + ligne['quantity']
+        
+        try:
+            # Le stock a pu changer depuis la validation : l'UPDATE reste conditionnel
+            reserve_stock_bulk(quantites)
+        except InsufficientStockError as e:
+            # product_id vaut None si le produit en cause n'a pas pu être retrouvé
+            produit = next((l['product'] for l in lignes if l['product'].pk == e.product_id), None)
+            message = (
+                f"Stock insuffisant pour le produit {produit.name}." if produit is not None
+                else "Stock insuffisant pour un des produits de la vente."
+            )
+            raise ValidationError({error_field: [message]})
+        
+        objets = LigneVente.objects.bulk_create([
+            LigneVente(
+                vente=vente,
+                product=ligne['product'],
+                quantity=ligne['quantity'],
+                unit_price=ligne['unit_price']  # Prix du produit au moment de la validation
+            )
+            for ligne in lignes
+        ])
+        
+        # bulk_create ne passe pas par LigneVente.save : totaux mis à jour ici
+        montant = sum(ligne.get_sous_total() for ligne in objets)
+        quantite = sum(ligne.quantity for ligne in objets)
+        increment_vente_totals(vente.pk, amount=montant, count=len(objets), quantity=quantite)
+        notify_lignes_changed(objets, created=True)
+        vente.total_amount += montant
+        vente.products_count += len(objets)
+        vente.total_quantity += quantite
+        return objets
+
     def validate(self, data):
         """
         Valide les données de vente.
-        La validation des lignes de vente est faite dans le sérialiseur LigneVenteSerializer.
+        La forme des lignes est validée par LigneVenteSerializer, les produits
+        et les stocks sont contrôlés en lot par _resolve_lignes.
         """
         # Récupérer l'artisan (déjà validé dans to_internal_value)
         artisan = data.get('artisan')
         
         # Si l'utilisateur est un artisan, on utilise automatiquement son profil
         if not artisan and self.context['request'].user.user_type == 'artisan':
-            artisan = self.context['request'].user.artisan_profile
+            artisan = self.context['request'].user.artisan_shop
             data['artisan'] = artisan
         
         # Vérifier qu'un artisan est défini
@@ -375,27 +443,14 @@ class VenteSerializer(serializers.ModelSerializer):
             })
         
         # Vérifier qu'il y a au moins une ligne de vente
-        lignes_data = self.initial_data.get('lignes_vente', [])
+        lignes_data = data.get('lignes_vente')
         if not lignes_data:
             raise ValidationError({
                 'lignes_vente': "Au moins un produit est requis pour la vente."
             })
         
-        # Valider chaque ligne de vente
-        for ligne_data in lignes_data:
-            # Créer un sérialiseur pour valider la ligne
-            ligne_serializer = LigneVenteSerializer(
-                data=ligne_data,
-                context={
-                    'request': self.context['request'],
-                    'artisan': artisan
-                }
-            )
-            
-            if not ligne_serializer.is_valid():
-                raise ValidationError({
-                    'lignes_vente': ligne_serializer.errors
-                })
+        # Valider toutes les lignes en lot (une seule requête produits)
+        data['lignes_vente'] = self._resolve_lignes(artisan, lignes_data)
         
         return data
 
@@ -405,31 +460,20 @@ class VenteSerializer(serializers.ModelSerializer):
         Met à jour automatiquement les stocks des produits.
         """
         lignes_data = validated_data.pop('lignes_vente')
+        validated_data.pop('produits_selectionnes', None)
+        validated_data.pop('quantites', None)
         user = self.context['request'].user
         
         # Pour les artisans, on utilise automatiquement leur profil
         if user.user_type == 'artisan':
-            validated_data['artisan'] = user.artisan_profile
-        
-        # Créer la vente
-        vente = Vente.objects.create(**validated_data)
+            validated_data['artisan'] = user.artisan_shop
         
-        # Créer les lignes de vente et mettre à jour les stocks
-        for ligne_data in lignes_data:
-            product = ligne_data['product']
-            quantity = ligne_data['quantity']
-            
-            # Créer la ligne de vente
-            LigneVente.objects.create(
-                vente=vente,
-                product=product,
-                quantity=quantity,
-                unit_price=product.price  # Utiliser le prix actuel du produit
-            )
+        with transaction.atomic():
+            # Créer la vente
+            vente = Vente.objects.create(**validated_data)
             
-            # Mettre à jour le stock
-            product.stock -= quantity
-            product.save(update_fields=['stock'])
+            # Créer les lignes de vente et mettre à jour les stocks en lot
+            self._create_lignes(vente, lignes_data)
         
         return vente
 class ProduitVenteSerializer(serializers.ModelSerializer):
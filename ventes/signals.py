@@ -0,0 +1,52 @@
+# ventes/signals.py
+"""
+Signaux émis à chaque écriture de ventes ou de lignes de vente.
+
+Ils sont envoyés dans la transaction qui modifie les ventes, ce qui permet aux
+applications abonnées (agrégats de statistiques, caches...) de tenir leurs
+données à jour de façon atomique avec la vente elle-même.
+
+Arguments envoyés avec sales_changed :
+
+- ``lines`` : liste de ``LineDelta`` (variation par jour, artisan et produit) ;
+- ``sales`` : liste de ``SaleDelta`` (variation du nombre de ventes par jour et artisan) ;
+- ``created`` : True si les variations ne concernent que des ventes créées
+  dans la transaction en cours (aucune vente existante modifiée).
+
+stock_changed accompagne chaque UPDATE de stock fait pour une vente
+(réservation ou remise en stock), avec ``changes`` : {id de produit:
+variation du stock}. Les modifications par Produit.save n'y passent pas
+(post_save suffit).
+"""
+from collections import namedtuple
+
+from django.dispatch import Signal
+from django.utils import timezone
+
+LineDelta = namedtuple('LineDelta', 'day artisan_id product_id quantity revenue lines')
+SaleDelta = namedtuple('SaleDelta', 'day artisan_id sales')
+
+sales_changed = Signal()
+stock_changed = Signal()
+
+
+def sale_day(sale_date):
+    """Jour (fuseau local) auquel une vente est rattachée dans les agrégats."""
+    if timezone.is_aware(sale_date):
+        return timezone.localdate(sale_date)
+    return sale_date.date()
+
+
+def send_sales_changed(sender, lines=(), sales=(), created=False):
+    """Envoie sales_changed en ignorant les variations nulles."""
+    lines = [line for line in lines if line.quantity or line.revenue or line.lines]
+    sales = [sale for sale in sales if sale.sales]
+    if lines or sales:
+        sales_changed.send(sender=sender, lines=lines, sales=sales, created=created)
+
+
+def send_stock_changed(sender, changes):
+    """Envoie stock_changed en ignorant les variations nulles."""
+    changes = {product_id: delta for product_id, delta in changes.items() if delta}
+    if changes:
+        stock_changed.send(sender=sender, changes=changes)
@@ -1,3 +1,888 @@
-from django.test import TestCase
+# ventes/tests.py
+import base64
+import csv
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from artisans.models import Artisan
+from produits.models import Produit
+from .models import (
+    CompteurVente,
+    InsufficientStockError,
+    LigneVente,
+    SaleNumberAllocator,
+    Vente,
+    format_sale_number,
+    release_stock,
+    reserve_stock,
+    reserve_stock_bulk,
+)
+from .autocomplete import autocomplete_index, bump_version
+from .bulk_import import import_sales
+from .serializers import VenteSerializer
+
+User = get_user_model()
+
+
+def creer_artisan(numero='B-001', email='artisan@example.com'):
+    user = User.objects.create_user(
+        email=email,
+        password='testpass123',
+        user_type='artisan'
+    )
+    return Artisan.objects.create(
+        user=user,
+        numero_boutique=numero,
+        prenom='Test',
+        nom='Artisan',
+        telephone='000000000',
+        specialite='Poterie'
+    )
+
+
+def creer_produit(artisan, stock=10, name='Vase', price='25.00'):
+    return Produit.objects.create(
+        name=name,
+        price=price,
+        stock=stock,
+        artisan=artisan
+    )
+
+
+class ReservationStockTests(TestCase):
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.produit = creer_produit(self.artisan, stock=5)
+        self.vente = Vente.objects.create(artisan=self.artisan, numero_vente='V-TEST-0001')
+
+    def test_reserve_stock_decremente_en_base(self):
+        reserve_stock(self.produit.pk, 3)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 2)
+
+    def test_reserve_stock_refuse_un_stock_negatif(self):
+        with self.assertRaises(InsufficientStockError):
+            reserve_stock(self.produit.pk, 6)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 5)
+
+    def test_release_stock(self):
+        release_stock(self.produit.pk, 4)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 9)
+
+    def test_contrainte_stock_non_negatif(self):
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Produit.objects.filter(pk=self.produit.pk).update(stock=-1)
+
+    def test_ligne_vente_met_a_jour_le_stock(self):
+        ligne = LigneVente.objects.create(
+            vente=self.vente, product=self.produit, quantity=2, unit_price='25.00'
+        )
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 3)
+
+        ligne.quantity = 4
+        ligne.save()
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 1)
+
+        ligne.quantity = 1
+        ligne.save()
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 4)
+
+        ligne.delete()
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 5)
+
+    def test_ligne_vente_stock_insuffisant_annule_la_ligne(self):
+        with self.assertRaises(InsufficientStockError):
+            LigneVente.objects.create(
+                vente=self.vente, product=self.produit, quantity=6, unit_price='25.00'
+            )
+        self.assertFalse(LigneVente.objects.exists())
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 5)
+
+
+class CreationVenteEnLotTests(TestCase):
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.produits = [
+            creer_produit(self.artisan, stock=10, name=f'Produit {i}') for i in range(40)
+        ]
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.request = RequestFactory().post('/api/ventes/')
+        self.request.user = admin
+
+    def creer_vente(self, produits, numero, quantity=2):
+        serializer = VenteSerializer(
+            data={
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': p.pk, 'quantity': quantity} for p in produits],
+            },
+            context={'request': self.request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(numero_vente=numero)
+
+    def test_nombre_de_requetes_constant(self):
+        with CaptureQueriesContext(connection) as une_ligne:
+            self.creer_vente(self.produits[:1], 'V-LOT-0001')
+        with CaptureQueriesContext(connection) as quarante_lignes:
+            vente = self.creer_vente(self.produits, 'V-LOT-0002')
+
+        self.assertEqual(len(quarante_lignes), len(une_ligne))
+        self.assertEqual(vente.lignes_vente.count(), 40)
+        vente.refresh_from_db()
+        self.assertEqual(vente.products_count, 40)
+        self.assertEqual(vente.total_quantity, 80)
+        self.assertEqual(vente.total_amount, Decimal('2000.00'))
+        stocks = set(Produit.objects.exclude(pk=self.produits[0].pk).values_list('stock', flat=True))
+        self.assertEqual(stocks, {8})
+        self.produits[0].refresh_from_db()
+        self.assertEqual(self.produits[0].stock, 6)
+
+    def test_validation_en_lot(self):
+        donnees = lambda produits: {
+            'artisan': self.artisan.pk,
+            'nom_du_client': 'Client',
+            'lignes_vente': [{'product_id': p.pk, 'quantity': 1} for p in produits],
+        }
+        with CaptureQueriesContext(connection) as une_ligne:
+            self.assertTrue(VenteSerializer(data=donnees(self.produits[:1]), context={'request': self.request}).is_valid())
+        serializer = VenteSerializer(data=donnees(self.produits), context={'request': self.request})
+        with CaptureQueriesContext(connection) as quarante_lignes:
+            self.assertTrue(serializer.is_valid())
+
+        self.assertEqual(len(quarante_lignes), len(une_ligne))
+        lignes = serializer.validated_data['lignes_vente']
+        self.assertEqual([l['product'] for l in lignes], self.produits)
+
+    def test_validation_stock_cumule_sur_plusieurs_lignes(self):
+        serializer = VenteSerializer(
+            data={
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [
+                    {'product_id': self.produits[0].pk, 'quantity': 6},
+                    {'product_id': self.produits[0].pk, 'quantity': 5},
+                ],
+            },
+            context={'request': self.request}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('lignes_vente', serializer.errors)
+
+    def test_validation_produit_d_un_autre_artisan(self):
+        autre = creer_produit(creer_artisan('B-002', 'autre@example.com'))
+        serializer = VenteSerializer(
+            data={
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': autre.pk, 'quantity': 1}],
+            },
+            context={'request': self.request}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('lignes_vente', serializer.errors)
+
+    def test_stock_insuffisant_annule_toute_la_vente(self):
+        serializer = VenteSerializer(
+            data={
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': p.pk, 'quantity': 2} for p in self.produits[:10]],
+            },
+            context={'request': self.request}
+        )
+        serializer.is_valid(raise_exception=True)
+        # Le stock baisse entre la validation et l'écriture (vente concurrente)
+        Produit.objects.filter(pk=self.produits[5].pk).update(stock=1)
+        with self.assertRaises(ValidationError):
+            serializer.save(numero_vente='V-LOT-0003')
+        self.assertFalse(Vente.objects.filter(numero_vente='V-LOT-0003').exists())
+        self.assertFalse(LigneVente.objects.exists())
+        self.assertEqual(
+            set(Produit.objects.exclude(pk=self.produits[5].pk).values_list('stock', flat=True)),
+            {10}
+        )
+
+    def test_stock_insuffisant_sans_produit_connu(self):
+        serializer = VenteSerializer(
+            data={
+                'artisan': self.artisan.pk,
+                'nom_du_client': 'Client',
+                'lignes_vente': [{'product_id': self.produits[0].pk, 'quantity': 1}],
+            },
+            context={'request': self.request}
+        )
+        serializer.is_valid(raise_exception=True)
+        # Stock relu suffisant après l'échec de l'UPDATE (course avec une autre vente)
+        erreur = InsufficientStockError(None, None)
+        with mock.patch('ventes.serializers.reserve_stock_bulk', side_effect=erreur):
+            with self.assertRaises(ValidationError) as ctx:
+                serializer.save(numero_vente='V-LOT-0004')
+        self.assertIn('Stock insuffisant', str(ctx.exception.detail['lignes_vente'][0]))
+        self.assertFalse(Vente.objects.filter(numero_vente='V-LOT-0004').exists())
+
+    def test_reserve_stock_bulk_signale_le_produit_en_cause(self):
+        Produit.objects.filter(pk=self.produits[1].pk).update(stock=1)
+        with self.assertRaises(InsufficientStockError) as ctx:
+            reserve_stock_bulk({self.produits[0].pk: 2, self.produits[1].pk: 2})
+        self.assertEqual(ctx.exception.product_id, self.produits[1].pk)
+        self.produits[0].refresh_from_db()
+        self.assertEqual(self.produits[0].stock, 10)
+
+
+class TotauxVenteTests(TestCase):
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.produit = creer_produit(self.artisan, stock=50, price='10.00')
+        self.vente = Vente.objects.create(artisan=self.artisan)
+
+    def test_totaux_suivent_les_lignes(self):
+        ligne = LigneVente.objects.create(
+            vente=self.vente, product=self.produit, quantity=3, unit_price='10.00'
+        )
+        LigneVente.objects.create(
+            vente=self.vente, product=self.produit, quantity=1, unit_price='2.50'
+        )
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total_amount, Decimal('32.50'))
+        self.assertEqual(self.vente.products_count, 2)
+        self.assertEqual(self.vente.total_quantity, 4)
+
+        ligne.quantity = 5
+        ligne.save()
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total_amount, Decimal('52.50'))
+        self.assertEqual(self.vente.total_quantity, 6)
+
+        ligne.delete()
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total_amount, Decimal('2.50'))
+        self.assertEqual(self.vente.products_count, 1)
+        self.assertEqual(self.vente.total_quantity, 1)
+        self.assertEqual(self.vente.compute_totals(), {
+            'total_amount': Decimal('2.50'), 'products_count': 1, 'total_quantity': 1
+        })
+
+    def test_str_sans_requete(self):
+        with self.assertNumQueries(0):
+            str(self.vente)
+
+    def test_sync_vente_totals(self):
+        LigneVente.objects.create(
+            vente=self.vente, product=self.produit, quantity=2, unit_price='10.00'
+        )
+        Vente.objects.filter(pk=self.vente.pk).update(total_amount=0, products_count=0, total_quantity=0)
+        vide = Vente.objects.create(artisan=self.artisan)
+
+        sortie = StringIO()
+        with self.assertRaises(SystemExit):
+            call_command('sync_vente_totals', '--check', '--chunk-size', '1', stdout=sortie)
+        self.assertIn('1 à corriger', sortie.getvalue())
+
+        call_command('sync_vente_totals', '--chunk-size', '1', stdout=StringIO())
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total_amount, Decimal('20.00'))
+        self.assertEqual(self.vente.products_count, 1)
+        self.assertEqual(self.vente.total_quantity, 2)
+        vide.refresh_from_db()
+        self.assertEqual(vide.total_amount, 0)
+
+        sortie = StringIO()
+        call_command('sync_vente_totals', '--check', stdout=sortie)
+        self.assertIn('0 à corriger', sortie.getvalue())
+
+    def test_migration_remplit_les_totaux(self):
+        LigneVente.objects.create(
+            vente=self.vente, product=self.produit, quantity=3, unit_price='10.00'
+        )
+        Vente.objects.filter(pk=self.vente.pk).update(total_amount=0, products_count=0, total_quantity=0)
+        migration = import_module('ventes.migrations.0004_vente_totaux')
+        migration.backfill_totals(django_apps, None)
+        self.vente.refresh_from_db()
+        self.assertEqual(self.vente.total_amount, Decimal('30.00'))
+        self.assertEqual(self.vente.total_quantity, 3)
+
+
+class ListeVentesPagineeTests(APITestCase):
+    url = '/api/ventes/'
+
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.autre_artisan = creer_artisan('B-002', 'autre@example.com')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+        debut = timezone.make_aware(timezone.datetime(2025, 3, 1, 10, 0))
+        self.ventes = []
+        for i in range(25):
+            vente = Vente.objects.create(
+                artisan=self.artisan if i % 2 else self.autre_artisan,
+                nom_du_client=f'Client {i}',
+                total_amount=i * 10
+            )
+            self.ventes.append(vente)
+        # Dates contrôlées, dont des doublons pour vérifier le départage par id
+        for i, vente in enumerate(self.ventes):
+            Vente.objects.filter(pk=vente.pk).update(
+                sale_date=debut + timezone.timedelta(days=i // 2)
+            )
+
+    def parcourir(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_parcours_complet_sans_doublon(self):
+        ids, pages = self.parcourir(f'{self.url}?page_size=4')
+        self.assertEqual(pages, 7)
+        attendu = [
+            str(pk) for pk in Vente.objects.order_by('-sale_date', '-id').values_list('pk', flat=True)
+        ]
+        self.assertEqual(ids, attendu)
+
+    def test_filtres(self):
+        ids, _ = self.parcourir(
+            f'{self.url}?artisan={self.artisan.pk}&date_debut=2025-03-02&date_fin=2025-03-05'
+        )
+        attendu = {
+            str(v.pk) for i, v in enumerate(self.ventes) if i % 2 and 1 <= i // 2 <= 4
+        }
+        self.assertEqual(set(ids), attendu)
+
+        ids, _ = self.parcourir(f'{self.url}?montant_min=200&client=client')
+        self.assertEqual(set(ids), {str(v.pk) for v in self.ventes[20:]})
+
+    def test_filtre_invalide(self):
+        response = self.client.get(f'{self.url}?date_debut=hier')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'{self.url}?cursor=abc')
+        self.assertEqual(response.status_code, 404)
+
+    def test_curseur_identifiant_invalide(self):
+        for pk in ('pas-un-uuid', 42, None):
+            raw = json.dumps([timezone.now().isoformat(), pk])
+            cursor = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+            response = self.client.get(f'{self.url}?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_artisan_ne_voit_que_ses_ventes(self):
+        self.client.force_authenticate(user=self.artisan.user)
+        ids, _ = self.parcourir(self.url)
+        self.assertEqual(set(ids), {str(v.pk) for i, v in enumerate(self.ventes) if i % 2})
+
+
+class ListeVentesCompacteTests(APITestCase):
+    """
+    Compare la liste compacte et la représentation complète (?expand=details) :
+    nombre de requêtes et taille de la réponse pour 40 ventes de 5 lignes.
+    """
+    url = '/api/ventes/'
+
+    def setUp(self):
+        artisan = creer_artisan()
+        produits = [creer_produit(artisan, stock=1000, name=f'Produit {i}') for i in range(20)]
+        for _ in range(40):
+            vente = Vente.objects.create(artisan=artisan, nom_du_client='Client')
+            for produit in produits[:5]:
+                LigneVente.objects.create(vente=vente, product=produit, quantity=1, unit_price='3.00')
+        admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=admin)
+
+    def mesurer(self, query):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return response, len(requetes), len(response.content)
+
+    def test_liste_compacte(self):
+        response, requetes, taille = self.mesurer('')
+        self.assertEqual(requetes, 1)
+        vente = response.data['results'][0]
+        self.assertEqual(vente['products_count'], 5)
+        self.assertEqual(vente['total_amount'], '15.00')
+        self.assertEqual(vente['artisan_nom'], 'Test Artisan')
+        self.assertNotIn('produits', vente)
+
+        response, requetes_lignes, taille_lignes = self.mesurer('?expand=lignes')
+        self.assertEqual(requetes_lignes, 2)
+        self.assertEqual(len(response.data['results'][0]['lignes']), 5)
+
+        _, requetes_details, taille_details = self.mesurer('?expand=details')
+        self.assertLessEqual(requetes_details, 4)
+        self.assertLess(taille, taille_lignes)
+        self.assertLess(taille, taille_details)
+
+
+class ImportVentesTests(APITestCase):
+    url = '/api/ventes/import/'
+
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.vase = creer_produit(self.artisan, stock=10, name='Vase', price='5.00')
+        self.bol = creer_produit(self.artisan, stock=3, name='Bol', price='2.00')
+        self.panier = creer_produit(self.autre, stock=10, name='Panier', price='7.00')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_import_csv(self):
+        contenu = (
+            "reference,artisan,nom_du_client,designation,product_id,quantity\n"
+            f"A1,{self.artisan.pk},Awa,Marché,{self.vase.pk},2\n"
+            f"A1,{self.artisan.pk},Awa,Marché,{self.bol.pk},1\n"
+            f"A2,{self.artisan.pk},Binta,,{self.panier.pk},1\n"
+            f"A3,{self.artisan.pk},Coumba,,{self.bol.pk},5\n"
+            f",{self.autre.pk},Dado,,{self.panier.pk},3\n"
+            f",999,Eli,,{self.panier.pk},1\n"
+        )
+        fichier = SimpleUploadedFile('ventes.csv', contenu.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(self.url, {'fichier': fichier, 'chunk_size': 2}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ventes_importees'], 2)
+        self.assertEqual(response.data['lignes_importees'], 3)
+        self.assertEqual([e['ligne'] for e in response.data['erreurs']], [4, 5, 7])
+        self.assertEqual(response.data['erreurs'][0]['reference'], 'A2')
+
+        vente = Vente.objects.get(nom_du_client='Awa')
+        self.assertEqual(vente.total_amount, Decimal('12.00'))
+        self.assertEqual(vente.products_count, 2)
+        self.assertEqual(vente.total_quantity, 3)
+        self.assertEqual(vente.compute_totals()['total_amount'], Decimal('12.00'))
+        self.vase.refresh_from_db()
+        self.bol.refresh_from_db()
+        self.panier.refresh_from_db()
+        self.assertEqual((self.vase.stock, self.bol.stock, self.panier.stock), (8, 2, 7))
+        self.assertEqual(Vente.objects.values('numero_vente').distinct().count(), 2)
+
+    def test_import_reserve_aux_admins(self):
+        self.client.force_authenticate(user=self.artisan.user)
+        fichier = SimpleUploadedFile('ventes.csv', b'reference\n')
+        response = self.client.post(self.url, {'fichier': fichier}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+    def test_csv_sans_colonnes(self):
+        fichier = SimpleUploadedFile('ventes.csv', b'reference,artisan\nA1,1\n')
+        response = self.client.post(self.url, {'fichier': fichier}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_commande_jsonl(self):
+        lignes = [
+            {'reference': 'J1', 'artisan': self.artisan.pk, 'nom_du_client': 'Awa',
+             'lignes_vente': [{'product_id': self.vase.pk, 'quantity': 4}]},
+            'pas du json',
+            {'artisan': self.artisan.pk, 'nom_du_client': 'Binta',
+             'lignes_vente': [{'product_id': self.vase.pk, 'quantity': 7}]},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+            for ligne in lignes:
+                f.write((ligne if isinstance(ligne, str) else json.dumps(ligne)) + '\n')
+        self.addCleanup(os.remove, f.name)
+
+        sortie, erreurs = StringIO(), StringIO()
+        call_command('import_ventes', f.name, stdout=sortie, stderr=erreurs)
+        self.assertIn('1 ventes (1 lignes) importées, 2 rejetées', sortie.getvalue())
+        self.assertIn('Ligne 2', erreurs.getvalue())
+        self.assertIn('Stock insuffisant', erreurs.getvalue())
+        self.vase.refresh_from_db()
+        self.assertEqual(self.vase.stock, 6)
+
+    def test_stock_insuffisant_sans_produit_connu(self):
+        # reserve_stock_bulk ne désigne pas toujours le produit en cause
+        ventes = [
+            {'row': row, 'reference': ref, 'artisan': self.artisan.pk, 'nom_du_client': 'Awa',
+             'designation': '', 'errors': [],
+             'lignes': [{'row': row, 'product_id': self.vase.pk, 'quantity': 1}]}
+            for row, ref in ((2, 'S1'), (3, 'S2'))
+        ]
+        erreur = InsufficientStockError(None, None)
+        with mock.patch('ventes.bulk_import.reserve_stock_bulk', side_effect=erreur):
+            rapport = import_sales(ventes)
+        self.assertEqual(rapport.ventes_importees, 0)
+        self.assertEqual([e['ligne'] for e in rapport.erreurs], [2, 3])
+        self.assertIn('Stock insuffisant', rapport.erreurs[0]['erreurs'][0])
+
+
+class IdempotenceVenteTests(APITestCase):
+    url = '/api/ventes/'
+
+    def setUp(self):
+        cache.clear()
+        self.artisan = creer_artisan()
+        self.produit = creer_produit(self.artisan, stock=10)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.donnees = {
+            'artisan': self.artisan.pk,
+            'nom_du_client': 'Client',
+            'lignes_vente': [{'product_id': self.produit.pk, 'quantity': 3}],
+        }
+
+    def poster(self, cle='cle-123'):
+        return self.client.post(self.url, self.donnees, format='json', HTTP_IDEMPOTENCY_KEY=cle)
+
+    def test_rejeu_renvoie_la_reponse_d_origine(self):
+        premiere = self.poster()
+        self.assertEqual(premiere.status_code, 201)
+        with self.assertNumQueries(0):
+            seconde = self.poster()
+        self.assertEqual(seconde.status_code, 201)
+        self.assertEqual(seconde.data, premiere.data)
+        self.assertEqual(seconde['Idempotent-Replayed'], 'true')
+        self.assertEqual(Vente.objects.count(), 1)
+        self.produit.refresh_from_db()
+        self.assertEqual(self.produit.stock, 7)
+
+    def test_rejeu_apres_expiration_du_cache(self):
+        premiere = self.poster()
+        cache.clear()
+        seconde = self.poster()
+        self.assertEqual(seconde.status_code, 201)
+        self.assertEqual(seconde.data['id'], premiere.data['id'])
+        self.assertEqual(Vente.objects.count(), 1)
+
+    def test_cles_differentes_et_utilisateurs_differents(self):
+        self.poster('a')
+        self.poster('b')
+        autre_admin = User.objects.create_user(
+            email='admin2@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=autre_admin)
+        self.poster('a')
+        self.assertEqual(Vente.objects.count(), 3)
+
+    def test_sans_cle(self):
+        self.client.post(self.url, self.donnees, format='json')
+        self.client.post(self.url, self.donnees, format='json')
+        self.assertEqual(Vente.objects.count(), 2)
+
+    def test_purge_des_cles_expirees(self):
+        self.poster('ancienne')
+        self.poster('recente')
+        Vente.objects.filter(idempotency_key__endswith=':ancienne').update(
+            sale_date=timezone.now() - timezone.timedelta(days=2)
+        )
+        sortie = StringIO()
+        call_command('purge_idempotency_keys', stdout=sortie)
+        self.assertIn('1 clés', sortie.getvalue())
+        self.assertEqual(
+            list(Vente.objects.exclude(idempotency_key=None).values_list('idempotency_key', flat=True)),
+            [f'{self.admin.pk}:recente']
+        )
+
+
+class ExportVentesTests(APITestCase):
+    url = '/api/ventes/export/'
+
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        vase = creer_produit(self.artisan, stock=100, name='Vase', price='5.00')
+        panier = creer_produit(self.autre, stock=100, name='Panier', price='7.50')
+        for artisan, produit in ((self.artisan, vase), (self.autre, panier), (self.artisan, vase)):
+            vente = Vente.objects.create(artisan=artisan, nom_du_client='Client')
+            LigneVente.objects.create(vente=vente, product=produit, quantity=2, unit_price=produit.price)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+
+    def lire(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenu = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(StringIO(contenu)))
+
+    def test_export_complet(self):
+        self.client.force_authenticate(user=self.admin)
+        lignes = self.lire(self.client.get(self.url))
+        self.assertEqual(lignes[0][:3], ['numero_vente', 'date_vente', 'nom_du_client'])
+        self.assertEqual(lignes[0][-1], 'sous_total')
+        self.assertEqual(len(lignes), 4)
+        self.assertEqual({ligne[10] for ligne in lignes[1:]}, {'Vase', 'Panier'})
+        self.assertIn(['Panier', '2', '7.50', '15.00'], [ligne[10:] for ligne in lignes[1:]])
+
+    def test_export_filtre_et_perimetre(self):
+        self.client.force_authenticate(user=self.admin)
+        lignes = self.lire(self.client.get(f'{self.url}?artisan={self.autre.pk}'))
+        self.assertEqual(len(lignes), 2)
+
+        lignes = self.lire(self.client.get(f'{self.url}?date_fin=2000-01-01'))
+        self.assertEqual(len(lignes), 1)
+
+        self.client.force_authenticate(user=self.artisan.user)
+        lignes = self.lire(self.client.get(self.url))
+        self.assertEqual({ligne[10] for ligne in lignes[1:]}, {'Vase'})
+
+
+class NumeroVenteTests(TestCase):
+    def setUp(self):
+        self.artisan = creer_artisan()
+        self.today = timezone.localdate()
+
+    def test_numeros_sequentiels(self):
+        premiere = Vente.objects.create(artisan=self.artisan)
+        seconde = Vente.objects.create(artisan=self.artisan)
+        self.assertEqual(premiere.numero_vente, format_sale_number(self.today, 1))
+        self.assertEqual(seconde.numero_vente, format_sale_number(self.today, 2))
+        self.assertEqual(CompteurVente.objects.get(jour=self.today).dernier_numero, 2)
+
+    def test_compteur_initialise_depuis_les_ventes_existantes(self):
+        Vente.objects.create(artisan=self.artisan, numero_vente=format_sale_number(self.today, 41))
+        vente = Vente.objects.create(artisan=self.artisan)
+        self.assertEqual(vente.numero_vente, format_sale_number(self.today, 42))
+
+    def test_numero_en_une_mise_a_jour(self):
+        Vente.objects.create(artisan=self.artisan)
+        allocateur = SaleNumberAllocator(block_size=1)
+        with CaptureQueriesContext(connection) as requetes:
+            allocateur.next()
+        sql = [q['sql'] for q in requetes if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(sql), 2)
+        self.assertTrue(sql[0].startswith('UPDATE'))
+        self.assertNotIn('LIKE', ' '.join(sql))
+
+    def test_allocation_par_bloc(self):
+        allocateur = SaleNumberAllocator(block_size=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            premier = allocateur.next()
+        with CaptureQueriesContext(connection) as requetes:
+            suivants = allocateur.take(3)
+        self.assertEqual(len(requetes), 0)
+        self.assertEqual(premier, format_sale_number(self.today, 1))
+        self.assertEqual(suivants, [format_sale_number(self.today, n) for n in (2, 3, 4)])
+        self.assertEqual(CompteurVente.objects.get(jour=self.today).dernier_numero, 10)
+
+    def test_bloc_abandonne_si_transaction_annulee(self):
+        allocateur = SaleNumberAllocator(block_size=10)
+        with self.captureOnCommitCallbacks(execute=False):
+            allocateur.next()
+        # Sans commit, le reste du bloc n'est pas utilisé : nouvelle réservation
+        with self.captureOnCommitCallbacks(execute=True):
+            numero = allocateur.next()
+        self.assertEqual(numero, format_sale_number(self.today, 11))
+
+
+class ReservationStockConcurrenteTests(TransactionTestCase):
+    """
+    Test de charge : plusieurs threads vendent le même produit en parallèle.
+    Le stock ne doit jamais devenir négatif et chaque unité vendue doit
+    correspondre à exactement une ligne de vente.
+    """
+    nb_threads = 8
+    ventes_par_thread = 25
+    stock_initial = 120
+
+    def test_ventes_concurrentes_sans_survente(self):
+        artisan = creer_artisan()
+        produit = creer_produit(artisan, stock=self.stock_initial)
+        ventes = [
+            Vente.objects.create(artisan=artisan, numero_vente=f'V-STRESS-{i:04d}')
+            for i in range(self.nb_threads)
+        ]
+        reussites = []
+        echecs = []
+        erreurs = []
+        depart = threading.Barrier(self.nb_threads)
+
+        def vendeur(vente):
+            ok = ko = 0
+            try:
+                depart.wait()
+                for _ in range(self.ventes_par_thread):
+                    try:
+                        LigneVente.objects.create(
+                            vente=vente, product_id=produit.pk, quantity=1, unit_price='25.00'
+                        )
+                        ok += 1
+                    except InsufficientStockError:
+                        ko += 1
+            except Exception as exc:  # remonté au thread principal
+                erreurs.append(exc)
+            finally:
+                reussites.append(ok)
+                echecs.append(ko)
+                connections.close_all()
+
+        threads = [threading.Thread(target=vendeur, args=(v,)) for v in ventes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erreurs, [])
+        produit.refresh_from_db()
+        vendus = sum(reussites)
+        tentatives = self.nb_threads * self.ventes_par_thread
+        self.assertGreaterEqual(produit.stock, 0)
+        self.assertEqual(vendus, self.stock_initial)
+        self.assertEqual(sum(echecs), tentatives - self.stock_initial)
+        self.assertEqual(produit.stock, self.stock_initial - vendus)
+        self.assertEqual(LigneVente.objects.filter(product=produit).count(), vendus)
+
+
+class NumeroVenteConcurrentTests(TransactionTestCase):
+    nb_threads = 6
+    ventes_par_thread = 15
+
+    def tearDown(self):
+        from .models import sale_number_allocator
+        sale_number_allocator.reset()
+
+    def _ventes_concurrentes(self, artisan):
+        erreurs = []
+        depart = threading.Barrier(self.nb_threads)
+
+        def vendeur():
+            try:
+                depart.wait()
+                for _ in range(self.ventes_par_thread):
+                    Vente.objects.create(artisan=artisan)
+            except Exception as exc:  # remonté au thread principal
+                erreurs.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=vendeur) for _ in range(self.nb_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return erreurs
+
+    def test_numeros_uniques_sous_concurrence(self):
+        artisan = creer_artisan()
+        self.assertEqual(self._ventes_concurrentes(artisan), [])
+        total = self.nb_threads * self.ventes_par_thread
+        numeros = set(Vente.objects.values_list('numero_vente', flat=True))
+        self.assertEqual(len(numeros), total)
+        today = timezone.localdate()
+        self.assertEqual(numeros, {format_sale_number(today, n) for n in range(1, total + 1)})
+
+    def test_numeros_uniques_avec_blocs(self):
+        artisan = creer_artisan()
+        with self.settings(SALE_NUMBER_BLOCK_SIZE=7):
+            self.assertEqual(self._ventes_concurrentes(artisan), [])
+        total = self.nb_threads * self.ventes_par_thread
+        self.assertEqual(Vente.objects.values('numero_vente').distinct().count(), total)
+
+
+class AutocompleteTests(APITestCase):
+    url = '/api/autocomplete/'
+
+    def setUp(self):
+        cache.clear()
+        autocomplete_index.clear()
+        self.artisan = creer_artisan()
+        self.autre = creer_artisan('B-002', 'autre@example.com')
+        self.autre.prenom, self.autre.nom = 'Hélène', 'Dupont'
+        self.autre.save()
+        self.grand_vase = creer_produit(self.artisan, name='Grand vase bleu')
+        self.bol = creer_produit(self.artisan, name='Bol émaillé')
+        self.vasque = creer_produit(self.autre, name='Vasque')
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', user_type='admin'
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def suggestions(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            kind: [item.get('name') or item['numero_boutique'] for item in items]
+            for kind, items in response.data.items()
+        }
+
+    def test_suggestions_sans_requete(self):
+        self.assertEqual(self.suggestions(q='VAS'), {
+            'produits': ['Grand vase bleu', 'Vasque'], 'artisans': []
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggestions(q='emai')['produits'], ['Bol émaillé'])
+            self.assertEqual(self.suggestions(q='grand va', type='produits'), {'produits': ['Grand vase bleu']})
+            self.assertEqual(self.suggestions(q='vas', artisan=self.autre.pk)['produits'], ['Vasque'])
+            self.assertEqual(self.suggestions(q='helene d')['artisans'], ['B-002'])
+            self.assertEqual(self.suggestions(q='b-00', limit=1)['artisans'], ['B-001'])
+            self.assertEqual(self.suggestions(q=' - '), {'produits': [], 'artisans': []})
+        self.assertEqual(self.client.get(self.url, {'q': 'v', 'type': 'ventes'}).status_code, 400)
+
+        self.client.force_authenticate(user=self.artisan.user)
+        self.assertEqual(self.suggestions(q='vas'), {'produits': ['Grand vase bleu']})
+
+    def test_mise_a_jour_incrementale(self):
+        self.suggestions(q='vas')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grand_vase.name = 'Grande jarre'
+            self.grand_vase.save()
+            creer_produit(self.artisan, name='Vase à fleurs')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vasque.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggestions(q='vas')['produits'], ['Vase à fleurs'])
+            self.assertEqual(self.suggestions(q='jar')['produits'], ['Grande jarre'])
+
+    def test_modification_par_un_autre_processus(self):
+        self.suggestions(q='vas')
+        # Écriture sans signal (autre processus) : seule la version change
+        Produit.objects.bulk_create([Produit(name='Vase ancien', price='5.00', artisan=self.artisan)])
+        self.assertEqual(self.suggestions(q='vase')['produits'], ['Grand vase bleu'])
+        bump_version()
+        self.assertEqual(self.suggestions(q='vase')['produits'], ['Vase ancien', 'Grand vase bleu'])
+
+    def test_recherche_sans_requete(self):
+        Produit.objects.bulk_create([
+            Produit(name=f'{mot} {i}', price='1.00', artisan=self.artisan)
+            for i, mot in zip(range(20_000), ['Panier tressé', 'Tapis', 'Collier perles', 'Sac'] * 5_000)
+        ], batch_size=2000)
+        bump_version()
+        autocomplete_index.search('pan')
+
+        # Index chargé : les recherches suivantes ne lisent que la mémoire
+        with self.assertNumQueries(0):
+            for q in ['pa', 'tap', 'coll', 'perl', 'sac 1', 'tresse 42', 'vase', 'b-001']:
+                resultats = autocomplete_index.search(q)
+        self.assertEqual(resultats['artisans'][0]['numero_boutique'], 'B-001')
+        with self.assertNumQueries(0):
+            produits = autocomplete_index.search('tresse 42', kinds=('produits',))['produits']
+        self.assertEqual(len(produits), 10)
+        self.assertTrue(all(p['name'].startswith('Panier tressé 42') for p in produits))
 
-# Create your tests here.
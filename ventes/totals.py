@@ -0,0 +1,69 @@
+# ventes/totals.py
+"""
+Recalcul des totaux dénormalisés des ventes (total_amount, products_count,
+total_quantity) à partir de leurs lignes.
+
+Les modèles sont passés en paramètres : la même fonction sert à la commande
+sync_vente_totals et à la migration 0004, qui lui donne les modèles
+historiques.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+TOTAL_FIELDS = ['total_amount', 'products_count', 'total_quantity']
+
+
+def sync_totals(vente_model, ligne_model, chunk_size=1000, fix=True, on_drift=None):
+    """
+    Compare les totaux de chaque vente à ses lignes, par lots de `chunk_size`
+    ventes (une agrégation GROUP BY par lot). `on_drift(vente, stocké,
+    attendu)` est appelé pour chaque écart ; avec `fix`, les ventes en écart
+    sont corrigées. Retourne (ventes vérifiées, ventes en écart).
+    """
+    checked = drifted = 0
+    last_pk = None
+
+    while True:
+        ventes = vente_model.objects.order_by('pk').only('pk', 'numero_vente', *TOTAL_FIELDS)
+        if last_pk is not None:
+            ventes = ventes.filter(pk__gt=last_pk)
+        ventes = list(ventes[:chunk_size])
+        if not ventes:
+            break
+        last_pk = ventes[-1].pk
+
+        totaux = {
+            row['vente_id']: row
+            for row in ligne_model.objects.filter(
+                vente_id__in=[vente.pk for vente in ventes]
+            ).order_by().values('vente_id').annotate(
+                montant=Sum(F('quantity') * F('unit_price')),
+                lignes=Count('id'),
+                quantite=Sum('quantity')
+            )
+        }
+
+        a_corriger = []
+        for vente in ventes:
+            row = totaux.get(vente.pk, {})
+            attendu = (
+                Decimal(row.get('montant') or 0).quantize(Decimal('0.01')),
+                row.get('lignes', 0),
+                row.get('quantite') or 0,
+            )
+            actuel = (vente.total_amount, vente.products_count, vente.total_quantity)
+            if actuel != attendu:
+                drifted += 1
+                if on_drift is not None:
+                    on_drift(vente, actuel, attendu)
+                vente.total_amount, vente.products_count, vente.total_quantity = attendu
+                a_corriger.append(vente)
+        checked += len(ventes)
+
+        if a_corriger and fix:
+            with transaction.atomic():
+                vente_model.objects.bulk_update(a_corriger, TOTAL_FIELDS)
+
+    return checked, drifted
@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views_ui
+from . import views, views_ui
 
 router = DefaultRouter()
-router.register(r'ventes', views_ui.VenteViewSet, basename='vente')
+router.register(r'ventes', views.VenteViewSet, basename='vente')
 
 urlpatterns = [
     path('', include(router.urls)), 
     path('nouvelle-vente/', views_ui.create_vente_form, name='create_vente_form'),
     path('stats/', views_ui.StatsView.as_view(), name='stats'),
+    path('autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
 ]
@@ -1,12 +1,22 @@
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from .models import Vente, LigneVente
-from .serializers import VenteSerializer, LigneVenteSerializer
+from .serializers import VenteSerializer, VenteListSerializer, LigneVenteSerializer
+from .filters import filter_ventes
+from .pagination import VenteCursorPagination
+from .bulk_import import import_sales, iter_sales, open_text
+from .idempotency import cache_response, get_cached_response, get_idempotency_key
+from .export import export_queryset, stream_csv
+from .autocomplete import DEFAULT_LIMIT, KINDS, MAX_LIMIT, PRODUITS, autocomplete_index
 from produits.models import Produit
 from produits.serializers import ProduitSerializer
 import logging
@@ -23,9 +33,13 @@ class VenteViewSet(viewsets.ModelViewSet):
     - lister, récupérer : Admin, Admin Secondaire ou Artisan (pour leurs propres ventes)
     - créer : Admin ou Artisan
     - mettre à jour, mise à jour partielle, supprimer : Admin uniquement
+
+    La liste est paginée par curseur (voir VenteCursorPagination) et accepte
+    les filtres date_debut, date_fin, artisan, client et montant_min.
     """
     queryset = Vente.objects.all()
     serializer_class = VenteSerializer
+    pagination_class = VenteCursorPagination
 
     def get_permissions(self):
         """
@@ -48,7 +62,7 @@ class VenteViewSet(viewsets.ModelViewSet):
         super().check_permissions(request)
         
         # Si c'est une action d'écriture, vérifier que l'utilisateur est admin
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'importer']:
             if not request.user.is_authenticated or request.user.user_type not in ['admin', 'secondary_admin']:
                 raise PermissionDenied("Seuls les administrateurs peuvent effectuer cette action.")
 
@@ -63,22 +77,74 @@ class VenteViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Vente.objects.none()
             
-        queryset = Vente.objects.all().select_related('artisan')
+        queryset = Vente.objects.all()
+        if self.action == 'list':
+            queryset = filter_ventes(queryset, self.request.query_params)
         
         # Pour les administrateurs, retourner toutes les ventes
         if user.user_type in ['admin', 'secondary_admin']:
-            return queryset.prefetch_related('lignes_vente', 'lignes_vente__product')
-            
+            pass
         # Pour les artisans, retourner uniquement leurs ventes
-        if user.user_type == 'artisan':
-            return queryset.filter(artisan=user.artisan_profile).prefetch_related(
-                'lignes_vente', 
-                'lignes_vente__product',
-                'lignes_vente__product__categorie'
-            )
-            
+        elif user.user_type == 'artisan':
+            queryset = queryset.filter(artisan=user.artisan_shop)
         # Par défaut, ne rien retourner
-        return Vente.objects.none()
+        else:
+            return Vente.objects.none()
+        
+        # Liste compacte : une requête values(), sans objets ni préchargements
+        if self.is_compact_list():
+            return queryset.values(*VenteListSerializer.LIST_FIELDS)
+        
+        return queryset.select_related('artisan', 'artisan__user').prefetch_related(
+            'lignes_vente',
+            'lignes_vente__product',
+            'lignes_vente__product__categorie'
+        )
+
+    def get_expand(self):
+        """Ensemble des options demandées par ?expand=lignes,details"""
+        raw = self.request.query_params.get('expand', '')
+        return {option.strip() for option in raw.split(',') if option.strip()}
+
+    def is_compact_list(self):
+        return self.action == 'list' and 'details' not in self.get_expand()
+
+    def get_serializer_class(self):
+        if self.is_compact_list():
+            return VenteListSerializer
+        return VenteSerializer
+
+    def list(self, request, *args, **kwargs):
+        """
+        Liste paginée des ventes.
+        Par défaut chaque vente est compacte (VenteListSerializer) ;
+        ?expand=lignes ajoute les lignes en une requête pour toute la page,
+        ?expand=details renvoie la représentation complète de VenteSerializer.
+        """
+        if not self.is_compact_list():
+            return super().list(request, *args, **kwargs)
+        
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        if 'lignes' in self.get_expand():
+            self.attach_lignes(page)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def attach_lignes(self, rows):
+        """Ajoute à chaque vente ses lignes, chargées en une seule requête."""
+        lignes = {row['id']: [] for row in rows}
+        for ligne in LigneVente.objects.filter(vente_id__in=list(lignes)).order_by().values(
+            'vente_id', 'product_id', 'product__name', 'quantity', 'unit_price'
+        ):
+            lignes[ligne['vente_id']].append({
+                'product': ligne['product_id'],
+                'product_name': ligne['product__name'],
+                'quantity': ligne['quantity'],
+                'unit_price': str(ligne['unit_price']),
+                'sous_total': str(ligne['quantity'] * ligne['unit_price']),
+            })
+        for row in rows:
+            row['lignes'] = lignes[row['id']]
 
     def get_serializer_context(self):
         """Ajoute la requête au contexte du sérialiseur."""
@@ -102,7 +168,7 @@ class VenteViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Vérifier que l'utilisateur a le droit d'accéder aux produits de cet artisan
-        if user.user_type == 'artisan' and str(user.artisan_profile.id) != artisan_id:
+        if user.user_type == 'artisan' and str(user.artisan_shop.id) != artisan_id:
             return Response(
                 {"detail": "Vous n'avez pas la permission d'accéder à ces produits."},
                 status=status.HTTP_403_FORBIDDEN
@@ -131,6 +197,71 @@ class VenteViewSet(viewsets.ModelViewSet):
             )
 
 
+    def replay_idempotent_create(self, idempotency_key):
+        """
+        Retourne la réponse 201 d'origine pour une clé déjà utilisée :
+        depuis le cache local, sinon par une recherche sur l'index de la clé.
+        Retourne None si la clé est inconnue.
+        """
+        data = get_cached_response(idempotency_key)
+        if data is None:
+            vente = self.get_queryset().filter(idempotency_key=idempotency_key).first()
+            if vente is None:
+                return None
+            data = self.get_serializer(vente).data
+            cache_response(idempotency_key, data)
+        return Response(data, status=status.HTTP_201_CREATED, headers={'Idempotent-Replayed': 'true'})
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Export CSV en flux de toutes les lignes de vente visibles par l'utilisateur,
+        avec les noms d'artisan et de produit. Accepte les mêmes filtres que la
+        liste (date_debut, date_fin, artisan, client, montant_min).
+        """
+        user = request.user
+        lignes = LigneVente.objects.all()
+        if user.user_type == 'artisan':
+            lignes = lignes.filter(vente__artisan=user.artisan_shop)
+        elif user.user_type not in ['admin', 'secondary_admin']:
+            lignes = lignes.none()
+        lignes = filter_ventes(lignes, request.query_params, prefix='vente__')
+        
+        response = StreamingHttpResponse(
+            stream_csv(export_queryset(lignes)),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f"ventes-{timezone.localdate():%Y%m%d}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def importer(self, request):
+        """
+        Import en masse de ventes depuis un fichier CSV ou JSON Lines (champ `fichier`).
+        Le fichier est lu en flux et écrit par lots (voir ventes.bulk_import) ;
+        la réponse contient les compteurs, le débit et les erreurs ligne par ligne.
+        """
+        fichier = request.FILES.get('fichier')
+        if not fichier:
+            return Response(
+                {"fichier": ["Un fichier CSV ou JSON Lines est requis."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        format = request.data.get('format') or fichier.name.rsplit('.', 1)[-1].lower()
+        try:
+            chunk_size = max(1, int(request.data.get('chunk_size', 500)))
+            report = import_sales(iter_sales(open_text(fichier), format), chunk_size=chunk_size)
+        except ValueError as e:
+            return Response({"fichier": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        
+        logger.info(
+            f"Import de ventes : {report.ventes_importees} importées, {len(report.erreurs)} rejetées "
+            f"({report.ventes_par_seconde} ventes/s)"
+        )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
     def perform_create(self, serializer):
         vente = serializer.save()
         vente.clean()  # Valide le stock
@@ -151,6 +282,16 @@ class VenteViewSet(viewsets.ModelViewSet):
             ]
         }
         """
+        # Rejeu d'une requête déjà traitée (en-tête Idempotency-Key)
+        try:
+            idempotency_key = get_idempotency_key(request)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if idempotency_key:
+            replay = self.replay_idempotent_create(idempotency_key)
+            if replay is not None:
+                return replay
+        
         try:
             # Faire une copie mutable des données de la requête
             data = request.data.copy()
@@ -164,9 +305,9 @@ class VenteViewSet(viewsets.ModelViewSet):
             
             # Pour les artisans, définir automatiquement l'artisan
             if request.user.user_type == 'artisan':
-                data['artisan_name'] = request.user.get_full_name() or request.user.artisan_profile.raison_sociale
+                data['artisan_name'] = request.user.get_full_name() or request.user.artisan_shop.nom_complet
             # Pour les administrateurs, vérifier que l'artisan est spécifié
-            elif 'artisan_name' not in data:
+            elif 'artisan_name' not in data and 'artisan' not in data:
                 return Response(
                     {"artisan_name": ["Le nom de l'artisan est requis pour les utilisateurs non-artisans."]},
                     status=status.HTTP_400_BAD_REQUEST
@@ -177,9 +318,18 @@ class VenteViewSet(viewsets.ModelViewSet):
             serializer.is_valid(raise_exception=True)
             
             # Utiliser une transaction pour assurer l'intégrité des données
+            try:
+                with transaction.atomic():
+                    # Créer la vente
+                    vente = serializer.save(idempotency_key=idempotency_key)
+            except IntegrityError:
+                # Même clé soumise en parallèle : l'autre requête a créé la vente
+                replay = self.replay_idempotent_create(idempotency_key) if idempotency_key else None
+                if replay is None:
+                    raise
+                return replay
+            
             with transaction.atomic():
-                # Créer la vente
-                vente = serializer.save()
                 
                 # Récupérer la vente avec toutes les relations nécessaires
                 vente = Vente.objects.prefetch_related(
@@ -195,6 +345,8 @@ class VenteViewSet(viewsets.ModelViewSet):
                 # Retourner la réponse avec les données complètes
                 response_serializer = self.get_serializer(vente)
                 headers = self.get_success_headers(response_serializer.data)
+                if idempotency_key:
+                    cache_response(idempotency_key, response_serializer.data)
                 
                 return Response(
                     response_serializer.data,
@@ -217,3 +369,35 @@ class VenteViewSet(viewsets.ModelViewSet):
             )
             
 
+
+class AutocompleteView(APIView):
+    """
+    Suggestions de produits et d'artisans pour la saisie des ventes, servies
+    par l'index en mémoire (voir ventes/autocomplete.py), sans requête en base.
+
+    Paramètres :
+    - q : début d'un mot du nom (ou du numéro de boutique) ;
+    - type : produits ou artisans (défaut : les deux) ;
+    - artisan : ne propose que les produits de cet artisan ;
+    - limit : nombre de suggestions par type (10 par défaut, 50 au plus).
+
+    Un artisan ne se voit proposer que ses propres produits.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, format=None):
+        params = request.query_params
+        kinds = KINDS
+        if params.get('type'):
+            if params['type'] not in KINDS:
+                raise ValidationError({'type': f"Valeurs possibles : {', '.join(KINDS)}."})
+            kinds = (params['type'],)
+        try:
+            artisan = int(params['artisan']) if params.get('artisan') else None
+            limit = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'detail': "artisan et limit doivent être des nombres entiers."})
+        if request.user.user_type == 'artisan':
+            artisan = request.user.artisan_shop.pk
+            kinds = (PRODUITS,)
+        return Response(autocomplete_index.search(params.get('q', ''), kinds, artisan, limit))